@@ -0,0 +1,120 @@
+import hashlib
+from typing import Any
+
+# Blob hash appended.
+BLOB_KEY_PREFIX = "rl_swarm_blob"  # No subkeys. Everyone publishes.
+BLOB_REF_PREFIX = "blob:"
+
+# Output fields that are copied between peers and stages verbatim.
+BLOB_FIELDS = ("question", "stage2_prompt", "stage3_prompt")
+# Shorter values are cheaper to send inline than as a reference.
+BLOB_MIN_LENGTH = 128
+
+
+def blob_hash(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def blob_key(h: str) -> str:
+    return f"{BLOB_KEY_PREFIX}_{h}"
+
+
+def blob_ref(h: str) -> str:
+    return f"{BLOB_REF_PREFIX}{h}"
+
+
+def is_blob_ref(value: Any) -> bool:
+    return isinstance(value, str) and value.startswith(BLOB_REF_PREFIX)
+
+
+class BlobStore:
+    """
+    Content-addressed store for the large strings repeated across stage outputs.
+
+    Outputs published to the DHT carry blob references in place of the
+    question and prompt text, and each blob is published once under its hash.
+    Readers resolve references through the local store, so every blob is
+    fetched at most once until the store is cleared.
+    """
+
+    def __init__(self, fields=BLOB_FIELDS, min_length: int = BLOB_MIN_LENGTH):
+        self.fields = fields
+        self.min_length = min_length
+
+        self._blobs: dict[str, str] = {}
+        self._published: set[str] = set()
+
+    def __contains__(self, h: str) -> bool:
+        return h in self._blobs
+
+    def __len__(self) -> int:
+        return len(self._blobs)
+
+    def put(self, text: str) -> str:
+        """Adds text to the local store and returns its reference."""
+        h = blob_hash(text)
+        self._blobs.setdefault(h, text)
+        return blob_ref(h)
+
+    def dehydrate(self, outputs: dict[str, Any]) -> dict[str, Any]:
+        """Returns a copy of outputs with the blob fields replaced by references."""
+        result = dict(outputs)
+        for field in self.fields:
+            value = result.get(field)
+            if isinstance(value, str) and len(value) >= self.min_length:
+                result[field] = self.put(value)
+        return result
+
+    def publish(self, dht, outputs: dict[str, Any], expiration_time: float) -> dict[str, Any]:
+        """
+        Publishes the blobs referenced by outputs that this store has not published yet.
+
+        Returns:
+            The dehydrated outputs, to be stored in place of the originals
+        """
+        result = self.dehydrate(outputs)
+        for field in self.fields:
+            value = result.get(field)
+            if not is_blob_ref(value):
+                continue
+
+            h = value[len(BLOB_REF_PREFIX) :]
+            if h in self._published:
+                continue
+            dht.store(key=blob_key(h), value=self._blobs[h], expiration_time=expiration_time)
+            self._published.add(h)
+
+        return result
+
+    def resolve(self, dht, value: Any) -> Any | None:
+        """Returns the text behind a reference, or None if it cannot be found."""
+        if not is_blob_ref(value):
+            return value
+
+        h = value[len(BLOB_REF_PREFIX) :]
+        if h not in self._blobs:
+            wrapper = dht.get(blob_key(h), latest=False)
+            text = wrapper.value if wrapper else None
+            # Never trust a blob that does not match its address.
+            if not isinstance(text, str) or blob_hash(text) != h:
+                return None
+            self._blobs[h] = text
+
+        return self._blobs[h]
+
+    def resolve_outputs(self, dht, outputs: dict[str, Any]) -> dict[str, Any] | None:
+        """Returns a copy of outputs with every reference resolved, or None if any blob is missing."""
+        if not any(is_blob_ref(v) for v in outputs.values()):
+            return outputs
+
+        result = dict(outputs)
+        for field, value in outputs.items():
+            if is_blob_ref(value):
+                if (text := self.resolve(dht, value)) is None:
+                    return None
+                result[field] = text
+        return result
+
+    def clear(self):
+        self._blobs.clear()
+        self._published.clear()
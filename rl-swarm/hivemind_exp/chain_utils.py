@@ -1,10 +1,17 @@
 import json
 import logging
+import queue
+import random
+import threading
+import time
 from abc import ABC
+from concurrent.futures import Future, ThreadPoolExecutor
 
 import requests
+from requests.adapters import HTTPAdapter
 from eth_account import Account
 from web3 import Web3
+from web3.exceptions import Web3TypeError
 
 ALCHEMY_URL = "https://gensyn-testnet.g.alchemy.com/public"
 
@@ -18,20 +25,251 @@ SWARM_COORDINATOR_CONTRACT = "0x2fC68a233EF9E9509f034DD551FF90A79a0B8F82"
 
 MODAL_PROXY_URL = "http://localhost:3000/api/"
 
+# How long coordinator reads are served from memory.
+ROUND_STAGE_TTL_SECONDS = 5.0
+BOOTNODES_TTL_SECONDS = 300.0
+
+RPC_TIMEOUT_SECONDS = 10
+RPC_POOL_SIZE = 16
+
+# Transaction defaults: gas is used when estimation fails.
+DEFAULT_GAS = 2000000
+DEFAULT_GAS_PRICE_GWEI = 1
+GAS_ESTIMATE_MARGIN = 1.5
+TXN_MAX_ATTEMPTS = 3
+TXN_RECEIPT_TIMEOUT_SECONDS = 120
+
+# Modal proxy calls: per-call timeout and retries of transient failures.
+MODAL_PROXY_TIMEOUT_SECONDS = 30
+MODAL_PROXY_MAX_ATTEMPTS = 3
+MODAL_PROXY_RETRY_BACKOFF_SECONDS = 1.0
+MODAL_PROXY_RETRY_STATUSES = (502, 503, 504)
+
 logger = logging.getLogger(__name__)
 
 
+class SingleFlightCache:
+    """
+    TTL cache whose misses are collapsed: concurrent callers of the same key
+    wait for the one in-flight fetch instead of issuing their own.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._entries = {}  # key -> (expires_at, value)
+        self._in_flight = {}  # key -> threading.Event
+
+    def get(self, key, ttl, fetch):
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry and self.clock() < entry[0]:
+                    return entry[1]
+
+                event = self._in_flight.get(key)
+                if event is None:
+                    event = self._in_flight[key] = threading.Event()
+                    break
+
+            # Another caller is fetching; use its result, or retry if it failed.
+            event.wait()
+
+        try:
+            value = fetch()
+            with self._lock:
+                self._entries[key] = (self.clock() + ttl, value)
+            return value
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            event.set()
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+
+class TransactionFailed(Exception):
+    pass
+
+
+class TransactionManager:
+    """
+    Sends contract transactions for one account from a background thread.
+
+    Nonces are read from the chain once and then tracked locally (and read
+    again after a failed send or an unconfirmed transaction), gas is
+    estimated once per contract method and argument shape and cached, and
+    receipts are awaited
+    on a separate pool so sending never blocks on mining.
+    """
+
+    def __init__(
+        self,
+        web3: Web3,
+        account: Account,
+        chain_id=MAINNET_CHAIN_ID,
+        gas_price=None,
+        max_attempts=TXN_MAX_ATTEMPTS,
+        receipt_timeout=TXN_RECEIPT_TIMEOUT_SECONDS,
+    ):
+        self.web3 = web3
+        self.account = account
+        self.address = Web3.to_checksum_address(account.address)
+        self.chain_id = chain_id
+        self.gas_price = gas_price or web3.to_wei(DEFAULT_GAS_PRICE_GWEI, "gwei")
+        self.max_attempts = max_attempts
+        self.receipt_timeout = receipt_timeout
+
+        self.gas_estimates = {}
+        self._nonce = None
+        # Set when a sent transaction was never confirmed, so its nonce may be unused.
+        self._resync_nonce = threading.Event()
+        self._queue = queue.Queue()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+        self._receipts = ThreadPoolExecutor(max_workers=4, thread_name_prefix="txn-receipt")
+
+    def submit(self, method: str, fn) -> Future:
+        """
+        Queues a contract function call for sending.
+
+        Args:
+            method: Contract method name, part of the gas estimate cache key
+            fn: Contract function bound to its arguments
+
+        Returns:
+            A future resolved with the transaction receipt
+        """
+        future = Future()
+        future.add_done_callback(lambda f: self._log_failure(method, f))
+        self._queue.put((method, fn, future))
+        with self._worker_lock:
+            if not self._worker:
+                self._worker = threading.Thread(target=self._run, daemon=True)
+                self._worker.start()
+        return future
+
+    def _log_failure(self, method, future):
+        if e := future.exception():
+            logger.error(f"Transaction {method} failed: {e}")
+
+    def _run(self):
+        while True:
+            method, fn, future = self._queue.get()
+            try:
+                tx_hash = self._send(method, fn)
+                self._receipts.submit(self._confirm, method, fn, tx_hash, future)
+            except Exception as e:
+                future.set_exception(e)
+
+    def _next_nonce(self):
+        if self._resync_nonce.is_set():
+            self._resync_nonce.clear()
+            self._nonce = None
+        if self._nonce is None:
+            self._nonce = self.web3.eth.get_transaction_count(self.address, "pending")
+        nonce = self._nonce
+        self._nonce += 1
+        return nonce
+
+    @staticmethod
+    def _gas_key(method, fn):
+        # Gas grows with the length of array arguments, e.g. submitWinners' winners.
+        return method, tuple(
+            len(arg) if isinstance(arg, (list, tuple)) else None
+            for arg in getattr(fn, "args", ())
+        )
+
+    def _estimate_gas(self, method, fn):
+        key = self._gas_key(method, fn)
+        if key not in self.gas_estimates:
+            try:
+                gas = fn.estimate_gas({"from": self.address})
+                self.gas_estimates[key] = int(gas * GAS_ESTIMATE_MARGIN)
+            except Exception as e:
+                logger.debug(f"Could not estimate gas for {method}, using default: {e}")
+                return DEFAULT_GAS
+        return self.gas_estimates[key]
+
+    def _send(self, method, fn):
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                txn = fn.build_transaction(
+                    {
+                        "from": self.address,
+                        "chainId": self.chain_id,
+                        "nonce": self._next_nonce(),
+                        "gas": self._estimate_gas(method, fn),
+                        "gasPrice": self.gas_price,
+                    }
+                )
+                signed_txn = self.web3.eth.account.sign_transaction(
+                    txn, private_key=self.account.key
+                )
+                tx_hash = self.web3.eth.send_raw_transaction(signed_txn.raw_transaction)
+                logger.info(f"Sent {method} transaction with hash: {self.web3.to_hex(tx_hash)}")
+                return tx_hash
+            except Exception as e:
+                # The nonce may be stale or may never have been used; either
+                # way, resync it so later transactions don't leave a gap.
+                self._nonce = None
+                if attempt == self.max_attempts:
+                    raise
+                logger.warning(f"Sending {method} failed (attempt {attempt}), retrying: {e}")
+
+    def _confirm(self, method, fn, tx_hash, future):
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                receipt = self.web3.eth.wait_for_transaction_receipt(
+                    tx_hash, timeout=self.receipt_timeout
+                )
+                break
+            except Exception as e:
+                if attempt == self.max_attempts:
+                    # The transaction may have been dropped, leaving a nonce gap
+                    # that every later transaction would queue behind. The
+                    # pending count still includes it if it is merely slow.
+                    self._resync_nonce.set()
+                    future.set_exception(e)
+                    return
+                logger.debug(f"Waiting for {method} receipt (attempt {attempt}): {e}")
+
+        if receipt["status"] == 1:
+            future.set_result(receipt)
+        else:
+            # The estimate may no longer fit the method's arguments.
+            self.gas_estimates.pop(self._gas_key(method, fn), None)
+            future.set_exception(
+                TransactionFailed(f"{method} reverted: {self.web3.to_hex(tx_hash)}")
+            )
+
+
 class SwarmCoordinator(ABC):
     @staticmethod
-    def coordinator_contract(web3: Web3):
+    def coordinator_contract(web3: Web3, address=SWARM_COORDINATOR_CONTRACT):
         with open(SWARM_COORDINATOR_ABI_JSON, "r") as f:
             contract_abi = json.load(f)["abi"]
 
-        return web3.eth.contract(address=SWARM_COORDINATOR_CONTRACT, abi=contract_abi)
+        return web3.eth.contract(address=address, abi=contract_abi)
 
-    def __init__(self, web3: Web3, **kwargs) -> None:
+    def __init__(
+        self,
+        web3: Web3,
+        contract_address=SWARM_COORDINATOR_CONTRACT,
+        round_stage_ttl=ROUND_STAGE_TTL_SECONDS,
+        bootnodes_ttl=BOOTNODES_TTL_SECONDS,
+        **kwargs,
+    ) -> None:
         self.web3 = web3
-        self.contract = SwarmCoordinator.coordinator_contract(web3)
+        self.contract = SwarmCoordinator.coordinator_contract(web3, contract_address)
+        self.round_stage_ttl = round_stage_ttl
+        self.bootnodes_ttl = bootnodes_ttl
+        self.state_cache = SingleFlightCache()
         super().__init__(**kwargs)
 
     def register_peer(self, peer_id): ...
@@ -39,50 +277,58 @@ class SwarmCoordinator(ABC):
     def submit_winners(self, round_num, winners): ...
 
     def get_bootnodes(self):
-        return self.contract.functions.getBootnodes().call()
+        return self.state_cache.get(
+            "bootnodes", self.bootnodes_ttl, self._fetch_bootnodes
+        )
 
     def get_round_and_stage(self):
-        with self.web3.batch_requests() as batch:
-            batch.add(self.contract.functions.currentRound())
-            batch.add(self.contract.functions.currentStage())
-            round_num, stage_num = batch.execute()
+        return self.state_cache.get(
+            "round_and_stage", self.round_stage_ttl, self._fetch_round_and_stage
+        )
+
+    def _fetch_bootnodes(self):
+        return self.contract.functions.getBootnodes().call()
+
+    def _fetch_round_and_stage(self):
+        try:
+            with self.web3.batch_requests() as batch:
+                batch.add(self.contract.functions.currentRound())
+                batch.add(self.contract.functions.currentStage())
+                round_num, stage_num = batch.execute()
+        except (NotImplementedError, Web3TypeError):
+            # Providers without JSON-RPC batching, e.g. local test chains.
+            round_num = self.contract.functions.currentRound().call()
+            stage_num = self.contract.functions.currentStage().call()
 
         return round_num, stage_num
 
 
 class WalletSwarmCoordinator(SwarmCoordinator):
-    def __init__(self, private_key: str, **kwargs) -> None:
+    def __init__(self, private_key: str, chain_id=MAINNET_CHAIN_ID, **kwargs) -> None:
         super().__init__(**kwargs)
         self.account = setup_account(self.web3, private_key)
-
-    def _default_gas(self):
-        return {
-            "gas": 2000000,
-            "gasPrice": self.web3.to_wei("1", "gwei"),
-        }
+        self.txn_manager = TransactionManager(self.web3, self.account, chain_id)
 
     def register_peer(self, peer_id):
-        send_chain_txn(
-            self.web3,
-            self.account,
-            lambda: self.contract.functions.registerPeer(peer_id).build_transaction(
-                self._default_gas()
-            ),
+        return self.txn_manager.submit(
+            "registerPeer", self.contract.functions.registerPeer(peer_id)
         )
 
     def submit_winners(self, round_num, winners):
-        send_chain_txn(
-            self.web3,
-            self.account,
-            lambda: self.contract.functions.submitWinners(
-                round_num, winners
-            ).build_transaction(self._default_gas()),
+        return self.txn_manager.submit(
+            "submitWinners", self.contract.functions.submitWinners(round_num, winners)
         )
 
 
 class ModalSwarmCoordinator(SwarmCoordinator):
-    def __init__(self, org_id: str, **kwargs) -> None:
+    def __init__(self, org_id: str, async_submit=True, **kwargs) -> None:
         self.org_id = org_id
+        # Winners are submitted in order on one worker so training isn't blocked.
+        self.submitter = (
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix="modal-submit")
+            if async_submit
+            else None
+        )
         super().__init__(**kwargs)
 
     def register_peer(self, peer_id):
@@ -97,6 +343,18 @@ class ModalSwarmCoordinator(SwarmCoordinator):
             # logger.info(f"Peer ID [{peer_id}] is already registered! Continuing.")
 
     def submit_winners(self, round_num, winners):
+        if self.submitter:
+            return self.submitter.submit(self._submit_winners_logged, round_num, winners)
+        return self._submit_winners(round_num, winners)
+
+    def _submit_winners_logged(self, round_num, winners):
+        try:
+            self._submit_winners(round_num, winners)
+        except Exception as e:
+            logger.error(f"Failed to submit winners for round {round_num}: {e}")
+            raise
+
+    def _submit_winners(self, round_num, winners):
         try:
             args = (
                 self.org_id,
@@ -115,20 +373,72 @@ class ModalSwarmCoordinator(SwarmCoordinator):
             # logger.info("Winners already submitted for this round! Continuing.")
 
 
-def send_via_api(org_id, method, args):
+_proxy_session = None
+_proxy_session_lock = threading.Lock()
+
+
+def proxy_session() -> requests.Session:
+    """Shared session for the modal proxy, created on first use."""
+    global _proxy_session
+    with _proxy_session_lock:
+        if _proxy_session is None:
+            _proxy_session = pooled_session()
+        return _proxy_session
+
+
+def send_via_api(
+    org_id,
+    method,
+    args,
+    timeout=MODAL_PROXY_TIMEOUT_SECONDS,
+    max_attempts=MODAL_PROXY_MAX_ATTEMPTS,
+    session=None,
+):
     # Construct URL and payload.
     url = MODAL_PROXY_URL + method
     payload = {"orgId": org_id} | args
+    session = session or proxy_session()
+
+    for attempt in range(1, max_attempts + 1):
+        try:
+            # Send the POST request.
+            response = session.post(url, json=payload, timeout=timeout)
+            if (
+                response.status_code not in MODAL_PROXY_RETRY_STATUSES
+                or attempt == max_attempts
+            ):
+                response.raise_for_status()  # Raise an exception for HTTP errors
+                return response.json()
+            error = f"HTTP {response.status_code}"
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            if attempt == max_attempts:
+                raise
+            error = e
 
-    # Send the POST request.
-    response = requests.post(url, json=payload)
-    response.raise_for_status()  # Raise an exception for HTTP errors
-    return response.json()
+        # Exponential backoff with jitter so peers don't retry in lockstep.
+        delay = MODAL_PROXY_RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+        logger.debug(f"Calling {method} failed ({error}), retrying in {delay:.1f}s")
+        time.sleep(delay)
+
+
+def pooled_session(pool_size=RPC_POOL_SIZE) -> requests.Session:
+    """HTTP session that keeps connections alive across calls."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
 
 
 def setup_web3() -> Web3:
     # Check testnet connection.
-    web3 = Web3(Web3.HTTPProvider(ALCHEMY_URL))
+    web3 = Web3(
+        Web3.HTTPProvider(
+            ALCHEMY_URL,
+            request_kwargs={"timeout": RPC_TIMEOUT_SECONDS},
+            session=pooled_session(),
+        )
+    )
     if web3.is_connected():
         logger.info("✅ Connected to Gensyn Testnet")
     else:
@@ -144,19 +454,3 @@ def setup_account(web3: Web3, private_key) -> Account:
     logger.info(f"💰 Wallet Balance: {eth_balance} ETH")
     return account
 
-
-def send_chain_txn(
-    web3: Web3, account: Account, txn_factory, chain_id=MAINNET_CHAIN_ID
-):
-    checksummed = Web3.to_checksum_address(account.address)
-    txn = txn_factory() | {
-        "chainId": chain_id,
-        "nonce": web3.eth.get_transaction_count(checksummed),
-    }
-
-    # Sign the transaction
-    signed_txn = web3.eth.account.sign_transaction(txn, private_key=account.key)
-
-    # Send the transaction
-    tx_hash = web3.eth.send_raw_transaction(signed_txn.raw_transaction)
-    logger.info(f"Sent transaction with hash: {web3.to_hex(tx_hash)}")
@@ -1,5 +1,9 @@
 import sys
 import platform
+import threading
+import time
+from contextlib import contextmanager
+
 import psutil
 
 DIVIDER = "[---------] SYSTEM INFO [---------]"
@@ -45,3 +49,35 @@ def print_system_info():
 
     print()
     print(DIVIDER)
+
+
+class PhaseTimer:
+    """Records how long named phases take; phases may run concurrently."""
+
+    def __init__(self):
+        self.start_time = time.monotonic()
+        self.phases: list[tuple[str, float, float]] = []  # (name, start, duration)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.phases.append((name, start - self.start_time, time.monotonic() - start))
+
+    def timed(self, name, fn):
+        def wrapper(*args, **kwargs):
+            with self.phase(name):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    def report(self, title="Startup timing") -> str:
+        total = time.monotonic() - self.start_time
+        lines = [f"{title} ({total:.2f}s total):"]
+        for name, start, duration in sorted(self.phases, key=lambda p: p[1]):
+            lines.append(f"  {name:<24} +{start:6.2f}s  {duration:6.2f}s")
+        return "\n".join(lines)
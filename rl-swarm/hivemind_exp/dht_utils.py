@@ -6,6 +6,7 @@ from hivemind.dht import DHT
 from hivemind.utils import ValueWithExpiration
 
 from hivemind_exp.hivemind_utils import HivemindNode
+from hivemind_exp.wire_utils import decode_stage_outputs
 
 ROUND_STAGE_NUMBER_KEY = "rl_swarm_rs"  # No subkeys. Coordinator publishes.
 
@@ -57,7 +58,7 @@ def get_outputs(
 
     # Try from DHT next to include peered outputs.
     if outputs := get_dht_value(dht, key=outputs_key(node_key, r, s), latest=False):
-        return hash_keys(outputs)
+        return hash_keys(decode_stage_outputs(outputs))
 
     raise ValueError(
         f"could not retrieve stage outputs for {node_key} at round {r} stage {s}"
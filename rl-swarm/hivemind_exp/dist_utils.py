@@ -0,0 +1,79 @@
+import os
+from datetime import timedelta
+from typing import Any
+
+import torch.distributed as dist
+
+# Replicas wait on rank 0 while it polls the DHT between rounds, which can take
+# far longer than the default collective timeout.
+CONTROL_TIMEOUT = timedelta(hours=24)
+
+
+class DistributedContext:
+    """
+    Rank information for a swarm node whose training spans several local
+    processes (e.g. one per GPU under accelerate launch or torchrun).
+
+    Rank 0 owns the node's DHT and chain connections and drives the round and
+    stage schedule; the other ranks only train. Control messages go over a
+    separate gloo group with a long timeout. With a single process every
+    collective is a no-op.
+    """
+
+    def __init__(self, rank: int = 0, world_size: int = 1, local_rank: int = 0):
+        self.rank = rank
+        self.world_size = world_size
+        self.local_rank = local_rank
+        self._group = None
+
+        if self.is_distributed:
+            if not (dist.is_available() and dist.is_initialized()):
+                raise RuntimeError(
+                    "WORLD_SIZE > 1 but torch.distributed is not initialized; "
+                    "launch with accelerate launch or torchrun"
+                )
+            self._group = dist.new_group(backend="gloo", timeout=CONTROL_TIMEOUT)
+
+    @staticmethod
+    def from_env() -> "DistributedContext":
+        if dist.is_available() and dist.is_initialized():
+            rank, world_size = dist.get_rank(), dist.get_world_size()
+        else:
+            rank = int(os.environ.get("RANK", 0))
+            world_size = int(os.environ.get("WORLD_SIZE", 1))
+        return DistributedContext(rank, world_size, int(os.environ.get("LOCAL_RANK", 0)))
+
+    @property
+    def is_main(self) -> bool:
+        return self.rank == 0
+
+    @property
+    def is_distributed(self) -> bool:
+        return self.world_size > 1
+
+    def broadcast_object(self, obj: Any = None) -> Any:
+        """Returns rank 0's obj on every rank."""
+        if not self.is_distributed:
+            return obj
+        objects = [obj]
+        dist.broadcast_object_list(objects, src=0, group=self._group)
+        return objects[0]
+
+    def gather_object(self, obj: Any) -> list[Any] | None:
+        """Returns every rank's obj on rank 0, in rank order, and None elsewhere."""
+        if not self.is_distributed:
+            return [obj]
+        gathered = [None] * self.world_size if self.is_main else None
+        dist.gather_object(obj, gathered, dst=0, group=self._group)
+        return gathered
+
+    def all_gather_object(self, obj: Any) -> list[Any]:
+        if not self.is_distributed:
+            return [obj]
+        gathered = [None] * self.world_size
+        dist.all_gather_object(gathered, obj, group=self._group)
+        return gathered
+
+    def barrier(self):
+        if self.is_distributed:
+            dist.barrier(group=self._group)
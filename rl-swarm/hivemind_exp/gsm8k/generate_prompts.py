@@ -1,5 +1,6 @@
 #For geting top-k ranking for subsampling
 import hashlib
+import logging
 import os
 import random
 import re
@@ -10,6 +11,8 @@ from datasets import Dataset, load_dataset
 import hivemind_exp.gsm8k.stage1_rewards as stage1_rewards
 import hivemind_exp.gsm8k.stage2_rewards as stage2_rewards
 
+logger = logging.getLogger(__name__)
+
 #############################################################################################################
 # TODO: Lots of repitition across stages, so would be good to fold them into one another and simplify things.#
 #############################################################################################################
@@ -190,19 +193,52 @@ def pick_k_cols(cols, datum, current_stage, default_k=15, method='top_k'):
         subsampled_cols = valid_cols[-k:]
     return subsampled_cols
 
-def generate_stage2_user_prompt(datum, cols):
+# Share of a stage 3 prompt's budget kept for supervisor opinions; the stage 2
+# prompt it embeds is packed into the rest.
+OPINION_BUDGET_SHARE = 0.5
+THERAPIST_RESPONSE_START = re.compile(r"(?=<therapist>Therapist #\d+</therapist> said)")
+
+
+def pack_cols(prompt_packer, fixed, datum, cols, item_overhead, budget=None, extra_fn=None):
+    # pick_k_cols orders columns worst to best.
+    ranked = [c for c in reversed(cols) if c in datum]
+    if not prompt_packer:
+        return {c: datum[c] for c in ranked}
+    extras = [extra_fn(datum[c]) for c in ranked] if extra_fn else None
+    packed = prompt_packer.pack(
+        fixed, [datum[c] for c in ranked], item_overhead, extras=extras, budget=budget
+    )
+    return {c: text for c, text in zip(ranked, packed) if text is not None}
+
+
+def pack_stage2_prompt(prompt_packer, stage2_prompt, budget):
+    """Packs the therapist responses embedded in a stage 2 prompt, in prompt order."""
+    header, *responses = THERAPIST_RESPONSE_START.split(stage2_prompt)
+    packed = prompt_packer.pack(header, responses, budget=budget)
+    return header + "".join(r for r in packed if r is not None)
+
+
+def generate_stage2_user_prompt(datum, cols, prompt_packer=None, system_prompt=""):
     sp = []
     sp.append(f"The client concern we received is: {datum['question']}" + "  \n\n")
     sp.append(f"The following therapeutic responses were provided:" + " \n")
     subsampled_cols = pick_k_cols(cols, datum, 2) #Subsample columns to stop prompt bloating
-    agentID_to_therapistID = get_unique_student_ids(subsampled_cols)
+    texts = pack_cols(
+        prompt_packer,
+        "".join(sp),
+        datum,
+        subsampled_cols,
+        "<therapist>Therapist #0</therapist> said \n\n\n\n",
+        budget=prompt_packer.budget(system_prompt) if prompt_packer else None,
+    )
+    agentID_to_therapistID = get_unique_student_ids(texts)
     for agentID in agentID_to_therapistID:
         feature = f"agent_answers_{agentID}"
-        if feature in datum:
+        if feature in texts:
             sp.append(
                 f"<therapist>Therapist #{agentID_to_therapistID[agentID]}</therapist> said \n"
             )
-            sp.append(datum[feature])
+            sp.append(texts[feature])
             sp.append("\n\n\n")
     return "".join(sp)
 
@@ -246,16 +282,39 @@ def extract_supervisor_content(text, record_raw_response=True):
     return ""
 
 
-def generate_stage3_user_prompt(datum, cols):
+def supervisor_content_line(feedback_text):
+    content = extract_supervisor_content(feedback_text, record_raw_response=False)
+    return f"{content}\n" if content else ""
+
+
+def generate_stage3_user_prompt(datum, cols, prompt_packer=None, system_prompt=""):
+    stage2_prompt = datum['stage2_prompt']
+    budget = None
+    if prompt_packer:
+        budget = prompt_packer.budget(system_prompt)
+        stage2_prompt = pack_stage2_prompt(
+            prompt_packer, stage2_prompt, int(budget * (1 - OPINION_BUDGET_SHARE))
+        )
+
     sp = []
-    sp.append(f"{datum['stage2_prompt']}" + "  \n")
+    sp.append(f"{stage2_prompt}" + "  \n")
     sp.append(
         f"After comparing these therapeutic responses, the following supervision feedback was provided:"
         + " \n"
     )
     subsampled_cols = pick_k_cols(cols, datum, 3) #Subsample columns to stop prompt bloating
+    texts = pack_cols(
+        prompt_packer,
+        # Extracted contents of the kept opinions follow them; see below.
+        "".join(sp) + "\n\n\n\n\n",
+        datum,
+        subsampled_cols,
+        "<supervisor>Supervisor #0</supervisor> provided \n\n\n\n",
+        budget=budget,
+        extra_fn=supervisor_content_line,
+    )
     # TODO: Why is this different from shared_fs_experiments?
-    agentID_to_supervisorID = get_unique_critic_ids(subsampled_cols)
+    agentID_to_supervisorID = get_unique_critic_ids(texts)
     
     # Store extracted contents
     supervisor_contents = []
@@ -294,7 +353,7 @@ def generate_stage3_user_prompt(datum, cols):
     
     for agentID in agentID_to_supervisorID:
         feature = f"agent_opinion_{agentID}"
-        if feature in datum:
+        if feature in texts:
             feedback_text = datum[feature]
             
             # Record the supervisor feedback with ID and entry number
@@ -311,7 +370,7 @@ def generate_stage3_user_prompt(datum, cols):
             sp.append(
                 f"<supervisor>Supervisor #{agentID_to_supervisorID[agentID]}</supervisor> provided \n"
             )
-            sp.append(feedback_text)
+            sp.append(texts[feature])
             sp.append("\n\n\n")
     
     # Add all extracted contents at the very end
@@ -339,14 +398,14 @@ def get_gsm8k_questions(data) -> Dataset:
     return data
 
 
-def get_gsm8k_questions_with_stage1_answers(data) -> Dataset:
+def get_gsm8k_questions_with_stage1_answers(data, prompt_packer=None) -> Dataset:
     sys_prompt = generate_system_prompt(STAGE2_SYSTEM_PROMPT)
     cols = data.column_names
     data = data.map(
         lambda x: {  # type: ignore
             "prompt": [
                 {"role": "system", "content": sys_prompt},
-                {"role": "user", "content": generate_stage2_user_prompt(x, cols)},
+                {"role": "user", "content": generate_stage2_user_prompt(x, cols, prompt_packer, sys_prompt)},
             ],
             "answer": x["answer"],
         }
@@ -354,14 +413,14 @@ def get_gsm8k_questions_with_stage1_answers(data) -> Dataset:
     return data
 
 
-def get_gsm8k_questions_with_stage1and2_answers(data) -> Dataset:
+def get_gsm8k_questions_with_stage1and2_answers(data, prompt_packer=None) -> Dataset:
     sys_prompt = generate_system_prompt(STAGE3_SYSTEM_PROMPT)
     cols = data.column_names
     data = data.map(
         lambda x: {  # type: ignore
             "prompt": [
                 {"role": "system", "content": sys_prompt},
-                {"role": "user", "content": generate_stage3_user_prompt(x, cols)},
+                {"role": "user", "content": generate_stage3_user_prompt(x, cols, prompt_packer, sys_prompt)},
             ],
             "answer": x["answer"],
         }
@@ -477,7 +536,15 @@ def fill_unknown_answers_opinions(values):
                     val[field].update({agent: "No answer received..."})
 
 
-def get_stage2_samples(values, test_size=0.1):
+def log_packing_ratio(prompt_packer, stage):
+    if prompt_packer:
+        logger.info(
+            f"Stage {stage} prompts kept {prompt_packer.packing_ratio:.0%} of response tokens"
+        )
+        prompt_packer.reset_stats()
+
+
+def get_stage2_samples(values, test_size=0.1, prompt_packer=None):
     fill_unknown_answers_opinions(values)
     dataset = Dataset.from_generator(stage2_generator, gen_kwargs={"values": values})
     # #TODO: Add ability to select a random subset of num_samples samples if desired
@@ -485,11 +552,12 @@ def get_stage2_samples(values, test_size=0.1):
     #   dataset = dataset.shuffle(seed=42).select(range(num_samples))
 
     # convert our dataset to the r1 prompt
-    dataset = get_gsm8k_questions_with_stage1_answers(dataset)
+    dataset = get_gsm8k_questions_with_stage1_answers(dataset, prompt_packer)
+    log_packing_ratio(prompt_packer, 2)
     return dataset, dataset
 
 
-def get_stage3_samples(values, test_size=0.1):
+def get_stage3_samples(values, test_size=0.1, prompt_packer=None):
     fill_unknown_answers_opinions(values)
     dataset = Dataset.from_generator(stage3_generator, gen_kwargs={"values": values})
     # #TODO: Add ability to select a random subset of num_samples samples if desired
@@ -497,7 +565,8 @@ def get_stage3_samples(values, test_size=0.1):
     #   dataset = dataset.shuffle(seed=42).select(range(num_samples))
 
     # convert our dataset to the r1 prompt
-    dataset = get_gsm8k_questions_with_stage1and2_answers(dataset)
+    dataset = get_gsm8k_questions_with_stage1and2_answers(dataset, prompt_packer)
+    log_packing_ratio(prompt_packer, 3)
     return dataset, dataset
 
 
@@ -0,0 +1,143 @@
+import logging
+import re
+from collections import OrderedDict
+from typing import Sequence
+
+logger = logging.getLogger(__name__)
+
+THINK_PATTERN = re.compile(r"<think>.*?(?:</think>|(?=<answer>))\s*", re.DOTALL)
+TOKEN_COUNT_CACHE_SIZE = 8192
+
+
+def trim_think(text: str) -> str:
+    """Removes the <think> section of a response, keeping its <answer>."""
+    return THINK_PATTERN.sub("", text)
+
+
+class PromptPacker:
+    """
+    Fits ranked peer responses into a stage prompt's token budget.
+
+    Responses are tokenized once with the model tokenizer and their counts
+    cached. When the candidates do not fit, the <think> sections are trimmed
+    from the lowest ranked responses upwards, then whole responses are dropped
+    from the bottom of the ranking.
+
+    The budget is max_tokens less what the chat template and system prompt
+    add around the user prompt (see template_tokens).
+    """
+
+    def __init__(self, tokenizer, max_tokens: int, min_items: int = 1):
+        self.tokenizer = tokenizer
+        self.max_tokens = max_tokens
+        self.min_items = min_items
+
+        self.candidate_tokens = 0
+        self.packed_tokens = 0
+        self._counts: OrderedDict[str, int] = OrderedDict()
+        self._template_counts: dict[str, int] = {}
+
+    def count_tokens(self, text: str) -> int:
+        if text in self._counts:
+            self._counts.move_to_end(text)
+            return self._counts[text]
+
+        count = len(self.tokenizer(text, add_special_tokens=False)["input_ids"])
+        self._counts[text] = count
+        if len(self._counts) > TOKEN_COUNT_CACHE_SIZE:
+            self._counts.popitem(last=False)
+        return count
+
+    def template_tokens(self, system_prompt: str) -> int:
+        """Tokens the chat template and system prompt add to a user prompt."""
+        if system_prompt not in self._template_counts:
+            messages = [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": ""},
+            ]
+            try:
+                text = self.tokenizer.apply_chat_template(
+                    messages, tokenize=False, add_generation_prompt=True
+                )
+            except (AttributeError, ValueError):
+                # No chat template: only the system prompt is known to be added.
+                text = system_prompt
+            self._template_counts[system_prompt] = self.count_tokens(text)
+        return self._template_counts[system_prompt]
+
+    def budget(self, system_prompt: str = "") -> int:
+        """Tokens available to the user prompt."""
+        return self.max_tokens - self.template_tokens(system_prompt)
+
+    @property
+    def packing_ratio(self) -> float:
+        """Tokens kept over tokens offered since the last reset_stats()."""
+        if not self.candidate_tokens:
+            return 1.0
+        return self.packed_tokens / self.candidate_tokens
+
+    def reset_stats(self):
+        self.candidate_tokens = 0
+        self.packed_tokens = 0
+
+    def pack(
+        self,
+        fixed: str,
+        candidates: Sequence[str],
+        item_overhead: str = "",
+        extras: Sequence[str] | None = None,
+        budget: int | None = None,
+    ) -> list[str | None]:
+        """
+        Packs ranked candidates after a fixed prefix.
+
+        Args:
+            fixed: Text that is always part of the prompt
+            candidates: Responses, best first
+            item_overhead: Text wrapped around every included response
+            extras: Text added elsewhere in the prompt for each included response
+            budget: Tokens for fixed and the candidates; defaults to max_tokens
+
+        Returns:
+            One entry per candidate: the (possibly trimmed) text, or None if it was dropped
+        """
+        if budget is None:
+            budget = self.max_tokens
+        overhead = self.count_tokens(item_overhead) if item_overhead else 0
+        fixed_tokens = self.count_tokens(fixed)
+        budget -= fixed_tokens
+
+        packed: list[str | None] = list(candidates)
+        extra_costs = [
+            overhead + (self.count_tokens(extras[i]) if extras and extras[i] else 0)
+            for i in range(len(candidates))
+        ]
+        costs = [self.count_tokens(c) + extra_costs[i] for i, c in enumerate(candidates)]
+        offered = sum(costs)
+        total = offered
+
+        for i in reversed(range(len(packed))):
+            if total <= budget:
+                break
+            trimmed = trim_think(packed[i])
+            if trimmed != packed[i]:
+                cost = self.count_tokens(trimmed) + extra_costs[i]
+                total -= costs[i] - cost
+                packed[i], costs[i] = trimmed, cost
+
+        kept = len(packed)
+        while kept > self.min_items and total > budget:
+            kept -= 1
+            total -= costs[kept]
+            packed[kept] = None
+
+        self.candidate_tokens += offered
+        self.packed_tokens += total
+        logger.debug(
+            "Packed %d/%d responses into %d/%d tokens",
+            kept,
+            len(packed),
+            total + fixed_tokens,
+            budget + fixed_tokens,
+        )
+        return packed
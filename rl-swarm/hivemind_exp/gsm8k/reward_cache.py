@@ -0,0 +1,143 @@
+import functools
+import hashlib
+import inspect
+import threading
+from collections import Counter, OrderedDict
+from typing import Callable
+
+REWARD_CACHE_SIZE = 65536
+
+# Per-completion arguments; every other argument (e.g. weighting) is part of the key as is.
+BATCH_ARGS = ("prompts", "completions", "answer")
+# Arguments that do not change the reward.
+IGNORED_ARGS = ("logging", "kwargs")
+
+
+def reward_name(fn: Callable) -> str:
+    return f"{fn.__module__.rsplit('.', 1)[-1]}.{fn.__name__}"
+
+
+class RewardCache:
+    """
+    Bounded LRU cache of per-completion rewards, shared by all reward functions.
+
+    Entries are keyed by a BLAKE2 hash of the function, its scalar arguments,
+    and one completion with its own prompt and answer. A memoized reward
+    function is only called with the completions that miss, along with their
+    prompts, answers and other per-completion columns, so its sampling-log
+    side effects only happen for those.
+    """
+
+    def __init__(self, max_entries: int = REWARD_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.hits: Counter[str] = Counter()
+        self.misses: Counter[str] = Counter()
+
+        self._entries: OrderedDict[bytes, float] = OrderedDict()
+        self._wrappers: dict[Callable, Callable] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def memoize(self, fn: Callable) -> Callable:
+        if fn not in self._wrappers:
+            self._wrappers[fn] = self._memoize(fn)
+        return self._wrappers[fn]
+
+    def _memoize(self, fn: Callable) -> Callable:
+        name = reward_name(fn)
+        signature = inspect.signature(fn)
+        var_kwargs = next(
+            (p.name for p in signature.parameters.values() if p.kind is p.VAR_KEYWORD), None
+        )
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            arguments = bound.arguments
+            completions = arguments["completions"]
+            prompts = arguments.get("prompts")
+            answer = arguments.get("answer")
+
+            batch = self._key(
+                name,
+                sorted(
+                    (k, v)
+                    for k, v in arguments.items()
+                    if k not in BATCH_ARGS and k not in IGNORED_ARGS
+                ),
+            )
+            keys = [
+                self._key(
+                    batch,
+                    prompts[i][-1]["content"] if prompts else None,
+                    answer[i] if answer else None,
+                    c[0]["content"],
+                )
+                for i, c in enumerate(completions)
+            ]
+
+            rewards: list[float | None] = []
+            with self._lock:
+                for key in keys:
+                    rewards.append(self._entries.get(key))
+                    if rewards[-1] is not None:
+                        self._entries.move_to_end(key)
+            missed = [i for i, r in enumerate(rewards) if r is None]
+            self.hits[name] += len(keys) - len(missed)
+            self.misses[name] += len(missed)
+            if not missed:
+                return rewards
+
+            def select(values):
+                if isinstance(values, list) and len(values) == len(completions):
+                    return [values[i] for i in missed]
+                return values
+
+            for arg in BATCH_ARGS:
+                if arg in arguments:
+                    arguments[arg] = select(arguments[arg])
+            # Extra dataset columns arrive as per-completion lists too.
+            if var_kwargs in arguments:
+                arguments[var_kwargs] = {
+                    k: select(v) for k, v in arguments[var_kwargs].items()
+                }
+            computed = fn(*bound.args, **bound.kwargs)
+
+            with self._lock:
+                for i, reward in zip(missed, computed):
+                    rewards[i] = reward
+                    self._entries[keys[i]] = reward
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            return rewards
+
+        return wrapper
+
+    def hit_rates(self) -> dict[str, float]:
+        return {
+            name: self.hits[name] / (self.hits[name] + self.misses[name])
+            for name in sorted(self.hits.keys() | self.misses.keys())
+            if self.hits[name] + self.misses[name]
+        }
+
+    def summary(self) -> str:
+        lines = [f"Reward cache ({len(self)}/{self.max_entries} entries):"]
+        for name, rate in self.hit_rates().items():
+            calls = self.hits[name] + self.misses[name]
+            lines.append(f"  {name:<50} {rate:6.1%} of {calls}")
+        return "\n".join(lines)
+
+    @staticmethod
+    def _key(*parts) -> bytes:
+        h = hashlib.blake2b(digest_size=16)
+        for part in parts:
+            h.update(repr(part).encode())
+            h.update(b"\0")
+        return h.digest()
+
+
+def memoized(cache: RewardCache | None, fn: Callable) -> Callable:
+    """Returns fn memoized through cache, or fn itself when caching is off."""
+    return cache.memoize(fn) if cache is not None else fn
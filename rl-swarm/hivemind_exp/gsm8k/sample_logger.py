@@ -0,0 +1,126 @@
+import atexit
+import logging
+import os
+import queue
+import random
+import threading
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_LOG_DIR = "model_output_samples"
+SAMPLE_LOG_RATE = 0.01
+SAMPLE_LOG_MAX_BYTES = 10 * 1024 * 1024
+SAMPLE_LOG_BACKUP_COUNT = 3
+SAMPLE_LOG_QUEUE_SIZE = 1024
+
+
+class SampleLogger:
+    """
+    Writes sampled reward function outputs to files from a background thread.
+
+    Reward functions call should_sample() and then log() with a function that
+    formats the record, so the training step only pays for a random draw and
+    a queue put. Formatting, directory creation and appends all happen on the
+    writer thread, which keeps each file open and rotates it by size. Records
+    are dropped rather than blocking when the queue is full.
+    """
+
+    def __init__(
+        self,
+        root: str = SAMPLE_LOG_DIR,
+        rate: float = SAMPLE_LOG_RATE,
+        max_bytes: int = SAMPLE_LOG_MAX_BYTES,
+        backup_count: int = SAMPLE_LOG_BACKUP_COUNT,
+        queue_size: int = SAMPLE_LOG_QUEUE_SIZE,
+    ):
+        self.root = root
+        self.rate = rate
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+
+        self.written = 0
+        self.dropped = 0
+
+        self._queue: queue.Queue = queue.Queue(queue_size)
+        self._files = {}
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def should_sample(self) -> bool:
+        return self.rate > 0 and random.random() < self.rate
+
+    def log(self, subdir: str, filename: str, format_fn: Callable[[], str]) -> bool:
+        """Queues a record; format_fn is called on the writer thread. Returns False if dropped."""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((os.path.join(self.root, subdir, filename), format_fn))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def flush(self):
+        """Blocks until every queued record is written."""
+        if self._thread:
+            self._queue.join()
+
+    def close(self):
+        if self._thread:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+        for f in self._files.values():
+            f.close()
+        self._files.clear()
+
+    def _ensure_started(self):
+        if self._thread:
+            return
+        with self._lock:
+            if not self._thread:
+                self._thread = threading.Thread(
+                    target=self._run, name="sample-logger", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                path, format_fn = item
+                self._write(path, format_fn())
+                self.written += 1
+            except Exception as e:
+                logger.warning(f"Failed to write reward sample: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _write(self, path: str, text: str):
+        data = text.encode()
+        f = self._files.get(path)
+        if f is None:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            f = self._files[path] = open(path, "ab")
+        elif self.max_bytes and f.tell() + len(data) > self.max_bytes:
+            f = self._rotate(path)
+        f.write(data)
+        f.flush()
+
+    def _rotate(self, path: str):
+        self._files.pop(path).close()
+        for i in range(self.backup_count - 1, 0, -1):
+            if os.path.exists(f"{path}.{i}"):
+                os.replace(f"{path}.{i}", f"{path}.{i + 1}")
+        if self.backup_count:
+            os.replace(path, f"{path}.1")
+        else:
+            os.remove(path)
+        f = self._files[path] = open(path, "ab")
+        return f
+
+
+sample_logger = SampleLogger()
+atexit.register(sample_logger.close)
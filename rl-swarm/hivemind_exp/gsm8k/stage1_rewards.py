@@ -1,9 +1,10 @@
 import os
-import random
 import re
 
 import numpy as np
 
+from hivemind_exp.gsm8k.reward_cache import memoized
+from hivemind_exp.gsm8k.sample_logger import sample_logger
 from hivemind_exp.hivemind_utils import HivemindNode
 
 
@@ -35,20 +36,13 @@ def correctness_reward_func(
     responses = [completion[0]["content"] for completion in completions]
     q = prompts[0][-1]["content"]
     extracted_responses = [extract_xml_answer(r) for r in responses]
-    if (random.random() < 0.01) and logging:  # 1% chance to write samples into a file
-        os.makedirs(
-            f"model_output_samples/gsm8k_samples_from_{os.getenv('HOSTNAME')}",
-            exist_ok=True,
-        )
-        log_file = os.path.join(
-            "model_output_samples",
+    if logging and sample_logger.should_sample():
+        sample_logger.log(
             f"gsm8k_samples_from_{os.getenv('HOSTNAME')}",
             "correctness_samples.txt",
+            lambda: "-" * 20
+            + f"Question:\n{q}\n\nAnswer:\n{answer[0]}\n\nResponse:\n{responses[0]}\n\nExtracted:\n{extracted_responses[0]}",
         )
-        with open(log_file, "a") as f:
-            f.write("-" * 20)
-            out_line = f"Question:\n{q}\n\nAnswer:\n{answer[0]}\n\nResponse:\n{responses[0]}\n\nExtracted:\n{extracted_responses[0]}"
-            f.write(out_line)
     return [
         1.0 * weighting if r == a else 0.0 for r, a in zip(extracted_responses, answer)
     ]
@@ -122,13 +116,14 @@ def hivemind_cumulative_reward(
     """
     Dummy reward function that accumulates all rewards into one + saves JSON to node.outputs
     """
-    correctness_reward = correctness_reward_func(
+    cache = node.reward_cache
+    correctness_reward = memoized(cache, correctness_reward_func)(
         prompts, completions, answer, logging=logging
     )
-    int_reward = int_reward_func(completions)
-    strict_format_reward = strict_format_reward_func(completions)
-    soft_format_reward = soft_format_reward_func(completions)
-    xmlcount_reward = xmlcount_reward_func(completions)
+    int_reward = memoized(cache, int_reward_func)(completions)
+    strict_format_reward = memoized(cache, strict_format_reward_func)(completions)
+    soft_format_reward = memoized(cache, soft_format_reward_func)(completions)
+    xmlcount_reward = memoized(cache, xmlcount_reward_func)(completions)
     total_reward = [
         sum(tup)
         for tup in zip(
@@ -1,10 +1,11 @@
 import os
-import random
 import re
 
 import numpy as np
 
 import hivemind_exp.gsm8k.stage1_rewards as stage1_rewards
+from hivemind_exp.gsm8k.reward_cache import memoized
+from hivemind_exp.gsm8k.sample_logger import sample_logger
 from hivemind_exp.hivemind_utils import HivemindNode
 
 
@@ -59,31 +60,24 @@ def count_xml(text) -> float:
 
 # Reward functions
 def proper_id_reward_func(
-    prompts, completions, answer, weighting=2.0, logging=True, **kwargs
+    prompts, completions, answer, weighting=2.0, logging=False, **kwargs
 ) -> list[float]:
     responses = [completion[0]["content"] for completion in completions]
     p = prompts[0][-1]["content"]
     agent_ids = extract_xml_ids(p)
     extracted_responses = [extract_xml_identity(r) for r in responses]
-    if (random.random() < 0.01) and logging:  # 1% chance to write samples into a file
-        os.makedirs(
-            f"model_output_samples/multi_stage_gsm8k_samples_from_{os.getenv('HOSTNAME')}",
-            exist_ok=True,
-        )
-        log_file = os.path.join(
-            "model_output_samples",
+    if logging and sample_logger.should_sample():
+        sample_logger.log(
             f"multi_stage_gsm8k_samples_from_{os.getenv('HOSTNAME')}",
             "id_extact_samps.txt",
+            lambda: "-" * 20
+            + f"\nPrompt:\n{p}\n\nResponse:\n{responses[0]}\n\nValid IDs:\n{agent_ids}\n\nExtracted:\n{extracted_responses[0]}\n\nGot reward? {extracted_responses[0] in agent_ids}",
         )
-        with open(log_file, "a") as f:
-            f.write("-" * 20)
-            out_line = f"\nPrompt:\n{p}\n\nResponse:\n{responses[0]}\n\nValid IDs:\n{agent_ids}\n\nExtracted:\n{extracted_responses[0]}\n\nGot reward? {extracted_responses[0] in agent_ids}"
-            f.write(out_line)
     return [1.0 * weighting if r in agent_ids else 0.0 for r in extracted_responses]
 
 
 def correctness_reward_func(
-    prompts, completions, answer, weighting=2.0, logging=True, **kwargs
+    prompts, completions, answer, weighting=2.0, logging=False, **kwargs
 ) -> list[float]:
     responses = [completion[0]["content"] for completion in completions]
     p = prompts[0][-1]["content"]
@@ -125,50 +119,36 @@ def correctness_reward_func(
             if all(check_submissions):
                 cur_reward += 10
         chosen_rewards += [cur_reward]
-    if (random.random() < 0.01) and logging:  # 1% chance to write samples into a file
+    if logging and sample_logger.should_sample():
         if extracted_responses[0] in agent_answers:
-            os.makedirs(
-                f"model_output_samples/multi_stage_gsm8k_samples_from_{os.getenv('HOSTNAME')}",
-                exist_ok=True,
-            )
-            log_file = os.path.join(
-                "model_output_samples",
+            sample_logger.log(
                 f"multi_stage_gsm8k_samples_from_{os.getenv('HOSTNAME')}",
                 "correctness_samps.txt",
+                lambda: "-" * 20
+                + f"\nPrompt:\n{p}\n\nResponse:\n{responses[0]}\n\nChosen answer ID:\n{extracted_responses[0]}\n\nExtracted:\n{agent_answers[extracted_responses[0]]}\n\nReward for choice: {chosen_rewards[0]}",
             )
-            with open(log_file, "a") as f:
-                f.write("-" * 20)
-                out_line = f"\nPrompt:\n{p}\n\nResponse:\n{responses[0]}\n\nChosen answer ID:\n{extracted_responses[0]}\n\nExtracted:\n{agent_answers[extracted_responses[0]]}\n\nReward for choice: {chosen_rewards[0]}"
-                f.write(out_line)
     return [r * weighting for r in chosen_rewards]
 
 
 def strict_format_reward_func(
-    completions, weighting=0.5, logging=True, **kwargs
+    completions, weighting=0.5, logging=False, **kwargs
 ) -> list[float]:
     """Reward function that checks if the completion has a specific format."""
     pattern = r"^<compare>\n.*?\n</compare>\n<explain>\n.*?\n</explain>\n<identify>\n.*?\n</identify>\n$"
     responses = [completion[0]["content"] for completion in completions]
     matches = [re.match(pattern, r) for r in responses]
-    if (random.random() < 0.01) and logging:  # 1% chance to write samples into a file
-        os.makedirs(
-            f"model_output_samples/multi_stage_gsm8k_samples_from_{os.getenv('HOSTNAME')}",
-            exist_ok=True,
-        )
-        log_file = os.path.join(
-            "model_output_samples",
+    if logging and sample_logger.should_sample():
+        sample_logger.log(
             f"multi_stage_gsm8k_samples_from_{os.getenv('HOSTNAME')}",
             "s2_strict_format_samps.txt",
+            lambda: "-" * 20
+            + f"\nResponse:\n{responses[0]}\n\nMatches? {matches[0]}",
         )
-        with open(log_file, "a") as f:
-            f.write("-" * 20)
-            out_line = f"\nResponse:\n{responses[0]}\n\nMatches? {matches[0]}"
-            f.write(out_line)
     return [1.0 * weighting if match else 0.0 for match in matches]
 
 
 def soft_format_reward_func(
-    completions, weighting=0.5, logging=True, **kwargs
+    completions, weighting=0.5, logging=False, **kwargs
 ) -> list[float]:
     """Reward function that checks if the completion has a specific format."""
     pattern = (
@@ -176,43 +156,27 @@ def soft_format_reward_func(
     )
     responses = [completion[0]["content"] for completion in completions]
     matches = [re.match(pattern, r) for r in responses]
-    if (random.random() < 0.01) and logging:  # 1% chance to write samples into a file
-        os.makedirs(
-            f"model_output_samples/multi_stage_gsm8k_samples_from_{os.getenv('HOSTNAME')}",
-            exist_ok=True,
-        )
-        log_file = os.path.join(
-            "model_output_samples",
+    if logging and sample_logger.should_sample():
+        sample_logger.log(
             f"multi_stage_gsm8k_samples_from_{os.getenv('HOSTNAME')}",
             "s2_soft_format_samps.txt",
+            lambda: "-" * 20
+            + f"\nResponse:\n{responses[0]}\n\nMatches? {matches[0]}",
         )
-        with open(log_file, "a") as f:
-            f.write("-" * 20)
-            out_line = f"\nResponse:\n{responses[0]}\n\nMatches? {matches[0]}"
-            f.write(out_line)
     return [1.0 * weighting if match else 0.0 for match in matches]
 
 
 def xmlcount_reward_func(
-    completions, weighting=1.0, logging=True, **kwargs
+    completions, weighting=1.0, logging=False, **kwargs
 ) -> list[float]:
     contents = [completion[0]["content"] for completion in completions]
-    if (random.random() < 0.01) and logging:  # 1% chance to write samples into a file
-        os.makedirs(
-            f"model_output_samples/multi_stage_gsm8k_samples_from_{os.getenv('HOSTNAME')}",
-            exist_ok=True,
-        )
-        log_file = os.path.join(
-            "model_output_samples",
+    if logging and sample_logger.should_sample():
+        sample_logger.log(
             f"multi_stage_gsm8k_samples_from_{os.getenv('HOSTNAME')}",
             "strict_format_samps.txt",
+            lambda: "-" * 20
+            + f"\nResponse:\n{contents[0]}\n\nCount reward: {count_xml(contents[0])}",
         )
-        with open(log_file, "a") as f:
-            f.write("-" * 20)
-            out_line = (
-                f"\nResponse:\n{contents[0]}\n\nCount reward: {count_xml(contents[0])}"
-            )
-            f.write(out_line)
     return [count_xml(c) * weighting for c in contents]
 
 def top_k_cumulative_reward(
@@ -259,15 +223,16 @@ def hivemind_cumulative_reward(
     """
     Dummy reward function that accumulates all rewards into one + saves JSON to node.outputs
     """
-    proper_id_reward = proper_id_reward_func(
+    cache = node.reward_cache
+    proper_id_reward = memoized(cache, proper_id_reward_func)(
         prompts, completions, answer, logging=logging
     )
-    correctness_reward = correctness_reward_func(
+    correctness_reward = memoized(cache, correctness_reward_func)(
         prompts, completions, answer, logging=logging
     )
-    strict_format_reward = strict_format_reward_func(completions, logging=logging)
-    soft_format_reward = soft_format_reward_func(completions, logging=logging)
-    xmlcount_reward = xmlcount_reward_func(completions, logging=logging)
+    strict_format_reward = memoized(cache, strict_format_reward_func)(completions, logging=logging)
+    soft_format_reward = memoized(cache, soft_format_reward_func)(completions, logging=logging)
+    xmlcount_reward = memoized(cache, xmlcount_reward_func)(completions, logging=logging)
     total_reward = [
         sum(tup)
         for tup in zip(
@@ -1,11 +1,12 @@
 import os
-import random
 import re
 from difflib import SequenceMatcher
 
 import numpy as np
 
 import hivemind_exp.gsm8k.stage1_rewards as stage1_rewards
+from hivemind_exp.gsm8k.reward_cache import memoized
+from hivemind_exp.gsm8k.sample_logger import sample_logger
 from hivemind_exp.hivemind_utils import HivemindNode
 
 
@@ -115,20 +116,13 @@ def consensus_reward_func(
     critic_choices = extract_xml_choices(p)
     majority_choices = swarm_majority(critic_choices)
     extracted_responses = [extract_xml_identity(r) for r in responses]
-    if (random.random() < 0.01) and logging:  # 1% chance to write samples into a file
-        os.makedirs(
-            f"model_output_samples/multi_stage_gsm8k_samples_from_{os.getenv('HOSTNAME')}",
-            exist_ok=True,
-        )
-        log_file = os.path.join(
-            "model_output_samples",
+    if logging and sample_logger.should_sample():
+        sample_logger.log(
             f"multi_stage_gsm8k_samples_from_{os.getenv('HOSTNAME')}",
             "consensus_samps.txt",
+            lambda: "-" * 20
+            + f"\nPrompt:\n{p}\n\nResponse:\n{responses[0]}\n\nCritic Choice Distribution:\n{critic_choices}\n\nExtracted:\n{extracted_responses[0]}\n\nGot reward? {extracted_responses[0] in majority_choices}",
         )
-        with open(log_file, "a") as f:
-            f.write("-" * 20)
-            out_line = f"\nPrompt:\n{p}\n\nResponse:\n{responses[0]}\n\nCritic Choice Distribution:\n{critic_choices}\n\nExtracted:\n{extracted_responses[0]}\n\nGot reward? {extracted_responses[0] in majority_choices}"
-            f.write(out_line)
     return [
         1.0 * weighting if r in majority_choices else 0.0 for r in extracted_responses
     ]
@@ -141,20 +135,13 @@ def question_recreation_reward_func(
     p = prompts[0][-1]["content"]
     q = extract_original_question(p)
     recreated_qs = [extract_xml_question(r) for r in responses]
-    if (random.random() < 0.01) and logging:  # 1% chance to write samples into a file
-        os.makedirs(
-            f"model_output_samples/multi_stage_gsm8k_samples_from_{os.getenv('HOSTNAME')}",
-            exist_ok=True,
-        )
-        log_file = os.path.join(
-            "model_output_samples",
+    if logging and sample_logger.should_sample():
+        sample_logger.log(
             f"multi_stage_gsm8k_samples_from_{os.getenv('HOSTNAME')}",
             "question_recreation_samps.txt",
+            lambda: "-" * 20
+            + f"\nPrompt:\n{p}\n\nResponse:\n{responses[0]}\n\nOriginal Question:\n{q}\n\nExtracted recreation:\n{recreated_qs[0]}\n\nGot reward? {SequenceMatcher(None, recreated_qs[0], q).ratio()}",
         )
-        with open(log_file, "a") as f:
-            f.write("-" * 20)
-            out_line = f"\nPrompt:\n{p}\n\nResponse:\n{responses[0]}\n\nOriginal Question:\n{q}\n\nExtracted recreation:\n{recreated_qs[0]}\n\nGot reward? {SequenceMatcher(None, recreated_qs[0], q).ratio()}"
-            f.write(out_line)
     return [SequenceMatcher(None, r, q).ratio() * weighting for r in recreated_qs]
 
 
@@ -201,21 +188,14 @@ def concensus_correctness_reward_func(
             if all(check_submissions):
                 cur_reward += 10
         chosen_rewards += [cur_reward]
-    if (random.random() < 0.01) and logging:  # 1% chance to write samples into a file
+    if logging and sample_logger.should_sample():
         if extracted_responses[0] in agent_answers:
-            os.makedirs(
-                f"model_output_samples/multi_stage_gsm8k_samples_from_{os.getenv('HOSTNAME')}",
-                exist_ok=True,
-            )
-            log_file = os.path.join(
-                "model_output_samples",
+            sample_logger.log(
                 f"multi_stage_gsm8k_samples_from_{os.getenv('HOSTNAME')}",
                 "correctness_samps.txt",
+                lambda: "-" * 20
+                + f"\nPrompt:\n{p}\n\nResponse:\n{responses[0]}\n\nChosen answer ID:\n{extracted_responses[0]}\n\nExtracted:\n{agent_answers[extracted_responses[0]]}\n\nReward for choice: {chosen_rewards[0]}",
             )
-            with open(log_file, "a") as f:
-                f.write("-" * 20)
-                out_line = f"\nPrompt:\n{p}\n\nResponse:\n{responses[0]}\n\nChosen answer ID:\n{extracted_responses[0]}\n\nExtracted:\n{agent_answers[extracted_responses[0]]}\n\nReward for choice: {chosen_rewards[0]}"
-                f.write(out_line)
     return [r * weighting for r in chosen_rewards]
 
 
@@ -225,20 +205,13 @@ def final_correctness_reward_func(
     responses = [completion[0]["content"] for completion in completions]
     p = prompts[0][-1]["content"]
     extracted_responses = [extract_xml_final_answer(r) for r in responses]
-    if (random.random() < 0.01) and logging:  # 1% chance to write samples into a file
-        os.makedirs(
-            f"model_output_samples/multi_stage_gsm8k_samples_from_{os.getenv('HOSTNAME')}",
-            exist_ok=True,
-        )
-        log_file = os.path.join(
-            "model_output_samples",
+    if logging and sample_logger.should_sample():
+        sample_logger.log(
             f"multi_stage_gsm8k_samples_from_{os.getenv('HOSTNAME')}",
             "final_answer_correctness_samples.txt",
+            lambda: "-" * 20
+            + f"Prompt:\n{p}\n\nAnswer:\n{answer[0]}\n\nResponse:\n{responses[0]}\n\nExtracted:\n{extracted_responses[0]}",
         )
-        with open(log_file, "a") as f:
-            f.write("-" * 20)
-            out_line = f"Prompt:\n{p}\n\nAnswer:\n{answer[0]}\n\nResponse:\n{responses[0]}\n\nExtracted:\n{extracted_responses[0]}"
-            f.write(out_line)
     return [
         1.0 * weighting if r == a else 0.0 for r, a in zip(extracted_responses, answer)
     ]
@@ -251,20 +224,13 @@ def strict_format_reward_func(
     pattern = r"^<summarize_feedback>\n.*?\n</summarize_feedback>\n<majority>\n.*?\n</majority>\n<question>\n.*?\n</question>\n<think>\n.*?\n</think>\n<answer>\n.*?\n</answer>\n$"
     responses = [completion[0]["content"] for completion in completions]
     matches = [re.match(pattern, r) for r in responses]
-    if (random.random() < 0.01) and logging:  # 1% chance to write samples into a file
-        os.makedirs(
-            f"model_output_samples/multi_stage_gsm8k_samples_from_{os.getenv('HOSTNAME')}",
-            exist_ok=True,
-        )
-        log_file = os.path.join(
-            "model_output_samples",
+    if logging and sample_logger.should_sample():
+        sample_logger.log(
             f"multi_stage_gsm8k_samples_from_{os.getenv('HOSTNAME')}",
             "s3_strict_format_samps.txt",
+            lambda: "-" * 20
+            + f"\nResponse:\n{responses[0]}\n\nMatches? {matches[0]}",
         )
-        with open(log_file, "a") as f:
-            f.write("-" * 20)
-            out_line = f"\nResponse:\n{responses[0]}\n\nMatches? {matches[0]}"
-            f.write(out_line)
     return [1.0 * weighting if match else 0.0 for match in matches]
 
 
@@ -275,20 +241,13 @@ def soft_format_reward_func(
     pattern = r"<summarize_feedback>.*?</summarize_feedback>\s*<majority>.*?</majority>\s*<question>.*?</question>\s*<think>.*?</think>\s*<answer>.*?</answer>"
     responses = [completion[0]["content"] for completion in completions]
     matches = [re.match(pattern, r) for r in responses]
-    if (random.random() < 0.01) and logging:  # 1% chance to write samples into a file
-        os.makedirs(
-            f"model_output_samples/multi_stage_gsm8k_samples_from_{os.getenv('HOSTNAME')}",
-            exist_ok=True,
-        )
-        log_file = os.path.join(
-            "model_output_samples",
+    if logging and sample_logger.should_sample():
+        sample_logger.log(
             f"multi_stage_gsm8k_samples_from_{os.getenv('HOSTNAME')}",
             "s3_soft_format_samps.txt",
+            lambda: "-" * 20
+            + f"\nResponse:\n{responses[0]}\n\nMatches? {matches[0]}",
         )
-        with open(log_file, "a") as f:
-            f.write("-" * 20)
-            out_line = f"\nResponse:\n{responses[0]}\n\nMatches? {matches[0]}"
-            f.write(out_line)
     return [1.0 * weighting if match else 0.0 for match in matches]
 
 
@@ -296,22 +255,13 @@ def xmlcount_reward_func(
     completions, weighting=1.0, logging=False, **kwargs
 ) -> list[float]:
     contents = [completion[0]["content"] for completion in completions]
-    if (random.random() < 0.01) and logging:  # 1% chance to write samples into a file
-        os.makedirs(
-            f"model_output_samples/multi_stage_gsm8k_samples_from_{os.getenv('HOSTNAME')}",
-            exist_ok=True,
-        )
-        log_file = os.path.join(
-            "model_output_samples",
+    if logging and sample_logger.should_sample():
+        sample_logger.log(
             f"multi_stage_gsm8k_samples_from_{os.getenv('HOSTNAME')}",
             "count_xml_samps.txt",
+            lambda: "-" * 20
+            + f"\nResponse:\n{contents[0]}\n\nCount reward: {count_xml(contents[0])}",
         )
-        with open(log_file, "a") as f:
-            f.write("-" * 20)
-            out_line = (
-                f"\nResponse:\n{contents[0]}\n\nCount reward: {count_xml(contents[0])}"
-            )
-            f.write(out_line)
     return [count_xml(c) * weighting for c in contents]
 
 
@@ -327,19 +277,20 @@ def hivemind_cumulative_reward(
     """
     Dummy reward function that accumulates all rewards into one + saves JSON to node.outputs
     """
-    consensus_reward = consensus_reward_func(prompts, completions, logging=logging)
-    concensus_correctness = concensus_correctness_reward_func(
+    cache = node.reward_cache
+    consensus_reward = memoized(cache, consensus_reward_func)(prompts, completions, logging=logging)
+    concensus_correctness = memoized(cache, concensus_correctness_reward_func)(
         prompts, completions, answer, logging=logging
     )
-    question_recreation_reward = question_recreation_reward_func(
+    question_recreation_reward = memoized(cache, question_recreation_reward_func)(
         prompts, completions, logging=logging
     )
-    final_correctness = final_correctness_reward_func(
+    final_correctness = memoized(cache, final_correctness_reward_func)(
         prompts, completions, answer, logging=logging
     )
-    strict_format_reward = strict_format_reward_func(completions, logging=logging)
-    soft_format_reward = soft_format_reward_func(completions, logging=logging)
-    xmlcount_reward = xmlcount_reward_func(completions, logging=logging)
+    strict_format_reward = memoized(cache, strict_format_reward_func)(completions, logging=logging)
+    soft_format_reward = memoized(cache, soft_format_reward_func)(completions, logging=logging)
+    xmlcount_reward = memoized(cache, xmlcount_reward_func)(completions, logging=logging)
     total_reward = [
         sum(tup)
         for tup in zip(
@@ -505,6 +456,13 @@ def print_training_summary(node: HivemindNode):
                 with open(file_path, "a") as f:
                     f.write(f"CLINICAL DIRECTOR SYNTHESIS:\n{synthesis_text}\n\n")
     
+    # Reward cache hit rates, if memoization is on
+    if getattr(node, "reward_cache", None) is not None:
+        cache_summary = node.reward_cache.summary()
+        print(f"\n{cache_summary}\n")
+        with open(file_path, "a") as f:
+            f.write(f"\n{cache_summary}\n\n")
+
     # End of summary
     print("=" * 80)
     print("END OF TRAINING SUMMARY")
@@ -2,12 +2,13 @@ from typing import Any
 
 
 def merge_stage1_question(outputs: dict[str, dict[str, Any]]):
-    # TODO: Currently question+answer keeps getting replaced at every file. This is wasteful and can be optimized
     # TODO: If an agents' answers more than once (or >1 answer from the same agent id hash), then current implementation will only keep the last seen in the loop. Should allow for multiple answers?
     merged = {"question": None, "answer": None, "agent_answers": {}}
     for o in outputs.values():
-        merged["question"] = o["question"]
-        merged["answer"] = o["answer"]
+        # Every peer answered the same question; keep the first copy.
+        if merged["question"] is None:
+            merged["question"] = o["question"]
+            merged["answer"] = o["answer"]
         merged["agent_answers"].update(o["agent_answers"])
     # Fill with default values. TODO: Decide if this is a good choice.
     for agent in outputs:
@@ -17,7 +18,6 @@ def merge_stage1_question(outputs: dict[str, dict[str, Any]]):
 
 
 def merge_stage2_question(outputs: dict[str, dict[str, Any]]):
-    # TODO: Currently question+answer keeps getting replaced at every file. This is wasteful and can be optimized
     # TODO: If an agents' answers more than once (or >1 answer from the same agent id hash), then current implementation will only keep the last seen in the loop. Should allow for multiple answers?
     merged = {
         "question": None,
@@ -27,7 +27,7 @@ def merge_stage2_question(outputs: dict[str, dict[str, Any]]):
     }
     for o in outputs.values():
         for col in ["question", "answer", "stage2_prompt"]:
-            if col in o:
+            if merged[col] is None and col in o:
                 merged[col] = o[col]
         if "agent_opinion" in o:
             merged["agent_opinion"].update(o["agent_opinion"])
@@ -36,3 +36,49 @@ def merge_stage2_question(outputs: dict[str, dict[str, Any]]):
         if agent not in merged["agent_opinion"]:
             merged["agent_opinion"].update({agent: "No feedback received..."})
     return merged
+
+
+class StreamingStageMerger:
+    """
+    Groups stage outputs by question hash as they arrive and merges each
+    question once it has max_contributors contributors, or when finished.
+
+    Contributors are taken first come, first served, so callers should offer
+    peers in a random order to sample them fairly.
+    """
+
+    def __init__(self, merge_fn, max_contributors: int):
+        self.merge_fn = merge_fn
+        self.max_contributors = max_contributors
+
+        self.pending: dict[str, dict[str, Any]] = {}
+        self.merged: dict[str, Any] = {}
+        self.order: list[str] = []  # Question hashes, first seen first.
+
+    def is_full(self, q_hash: str) -> bool:
+        return q_hash in self.merged
+
+    def saturated(self) -> bool:
+        """True once every question seen so far has enough contributors."""
+        return bool(self.merged) and not self.pending
+
+    def add(self, q_hash: str, node_key: str, outputs: dict[str, Any]) -> bool:
+        if self.is_full(q_hash):
+            return False
+
+        if q_hash not in self.pending:
+            self.pending[q_hash] = {}
+            self.order.append(q_hash)
+
+        group = self.pending[q_hash]
+        group[node_key] = outputs
+        if len(group) >= self.max_contributors:
+            self.merged[q_hash] = self.merge_fn(self.pending.pop(q_hash))
+        return True
+
+    def finish(self) -> list[Any]:
+        """Merges the remaining questions and returns every row, in first seen order."""
+        for q_hash, group in self.pending.items():
+            self.merged[q_hash] = self.merge_fn(group)
+        self.pending.clear()
+        return [self.merged[q_hash] for q_hash in self.order]
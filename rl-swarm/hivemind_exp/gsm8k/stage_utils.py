@@ -1,6 +1,6 @@
 import logging
+import random
 import time
-from collections import defaultdict
 from typing import Sequence
 
 import hivemind_exp.gsm8k.stage1_rewards as stage1_rewards
@@ -16,9 +16,11 @@ from hivemind_exp.dht_utils import (
 from hivemind_exp.gsm8k.generate_prompts import get_stage2_samples, get_stage3_samples
 from hivemind_exp.gsm8k.stage_merger import (
     Any,
+    StreamingStageMerger,
     merge_stage1_question,
     merge_stage2_question,
 )
+from hivemind_exp.gsm8k.winner_selection import score_final_outputs, top_peers
 from hivemind_exp.hivemind_utils import SingleStageData, StageData
 
 
@@ -39,8 +41,6 @@ def merged_prev_stage_datasets(
 
     logger = logging.getLogger(f"{__name__}:{log_tag}")
 
-    merged_qs = []
-
     # Retrieves and merges last stage samples locally and from DHT.
     def get_prev_rewards():
         return get_dht_value(
@@ -56,54 +56,46 @@ def merged_prev_stage_datasets(
         time.sleep(check_interval)
         prev_rewards = get_prev_rewards()
 
+    # dht_sample_limit caps the contributors merged into each question.
+    merger = StreamingStageMerger(merge_fn, dht_sample_limit)
+
+    def add_outputs(node_key, outputs):
+        for q_hash, (_, o) in outputs.items():
+            if merger.is_full(q_hash):
+                continue
+            # Blobs are cached on the node, so each is fetched once per stage.
+            o = node.blob_store.resolve_outputs(dht, o)
+            if o is None:
+                logger.debug(f"Missing blobs in outputs from node: {node_key}")
+                continue
+            merger.add(q_hash, node_key, o)
+
     # Add the current node's local samples first.
-    prev_items: dict[str, list] = defaultdict(list)
     try:
-        prev_node_outputs = get_outputs(dht, node.key, r, s - 1, node.get_stage_outputs)
-        for item in prev_node_outputs.items():
-            prev_items[node.key].append(item)
+        add_outputs(node.key, get_outputs(dht, node.key, r, s - 1, node.get_stage_outputs))
     except ValueError:
         # Joined after the round has started.
         logger.info(f"Could not retrieve local outputs for round {r} stage {s - 1}")
 
     # Add other nodes' samples iff rewards are available.
     if prev_rewards:
-        node_keys = prev_rewards.keys()
-        dht_sample_count = 0
+        # Visit peers in random order so the same peers do not always fill the cap.
+        node_keys = [k for k in prev_rewards.keys() if k != node.key]
+        random.shuffle(node_keys)
         for node_key in node_keys:
-            if dht_sample_count > dht_sample_limit:
+            if merger.saturated():
+                logger.debug(f"All questions have {dht_sample_limit} contributors")
                 break
 
-            if node_key == node.key:
-                continue
             try:
-                prev_node_outputs = get_outputs(dht, node_key, r, s - 1)
-                for item in prev_node_outputs.items():
-                    prev_items[node_key].append(item)
-
-                    dht_sample_count += 1
-                    if dht_sample_count > dht_sample_limit:
-                        break
-
+                add_outputs(node_key, get_outputs(dht, node_key, r, s - 1))
             except ValueError:
                 # Skip this node's answers for the current round and stage.
                 logger.debug(
                     f"Found rewards published for node: {node_key} but no outputs!"
                 )
 
-    # Group samples by question hash.
-    q_to_keyed_items: dict[str, dict[str, Any]] = defaultdict(dict)
-    for node_key, items in prev_items.items():
-        for item in items:
-            q_hash, (_, outputs) = item
-            q_to_keyed_items[q_hash][node_key] = outputs
-
-    # Merge sample lists.
-    for outputs in q_to_keyed_items.values():
-        merged = merge_fn(outputs)
-        merged_qs.append(merged)
-
-    return samples_fn(merged_qs)
+    return samples_fn(merger.finish())
 
 
 def gsm8k_stage_data(
@@ -113,6 +105,7 @@ def gsm8k_stage_data(
     initial_test_dataset,
     check_interval: float = 5,
     log_tag=None,
+    prompt_packer=None,
 ):
     def cumulative_reward_0(**kwargs):
         return stage1_rewards.hivemind_cumulative_reward(node, **kwargs)
@@ -130,7 +123,7 @@ def gsm8k_stage_data(
             r,
             s,
             merge_stage1_question,
-            get_stage2_samples,
+            lambda values: get_stage2_samples(values, prompt_packer=prompt_packer),
             check_interval=check_interval,
             log_tag=log_tag,
         )
@@ -142,12 +135,19 @@ def gsm8k_stage_data(
             r,
             s,
             merge_stage2_question,
-            get_stage3_samples,
+            lambda values: get_stage3_samples(values, prompt_packer=prompt_packer),
             check_interval=check_interval,
             log_tag=log_tag,
         )
 
     def round_winners(limit=10) -> Sequence[str]:
+        # Prefer the final stage rewards peers already published.
+        rewards = get_dht_value(
+            dht, key=rewards_key(node.round_num, 2), latest=True, beam_size=1000
+        )
+        if rewards:
+            return top_peers(rewards, limit)
+
         final_stage_outputs, _ = merged_prev_stage_datasets(
             dht,
             node,
@@ -158,22 +158,7 @@ def gsm8k_stage_data(
             check_interval=check_interval,
             log_tag=log_tag,
         )
-        rewards = defaultdict(float)
-        for outputs in final_stage_outputs:
-            for node_key, output in outputs.items():
-                prompts = [
-                    [
-                        {"role": "system", "content": output["question"]},
-                        {"role": "system", "content": output["stage3_prompt"]},
-                    ],
-                ]
-                final_answer = next(iter(output["final_agent_decision"].items()))[1]
-                completions = [[{"role": "assistant", "content": final_answer}]]
-                cumulative_reward_2(prompts=prompts, completions=completions, **output)
-                rewards[node_key] += sum(node.rewards)
-
-        rewards = sorted(list(rewards.items()), key=lambda x: x[1], reverse=True)
-        return [n for n, _ in rewards][:limit]
+        return top_peers(score_final_outputs(final_stage_outputs), limit)
 
     return StageData(
         round_winner_fn=round_winners,
@@ -6,11 +6,6 @@ import time
 import argparse
 import json
 
-from hivemind_exp.chain_utils import (
-    ModalSwarmCoordinator,
-    WalletSwarmCoordinator,
-    setup_web3,
-)
 from hivemind_exp.gsm8k.generate_prompts import get_stage1_samples, get_user_input_samples, get_user_input_with_supervisor_simulation, get_user_input_with_continuous_conversation, record_therapist_answer
 from hivemind_exp.runner.gensyn.testnet_grpo_runner import (
     TestnetGRPOArguments,
@@ -18,6 +13,7 @@ from hivemind_exp.runner.gensyn.testnet_grpo_runner import (
 )
 from hivemind_exp.runner.grpo_runner import GRPOArguments, GRPORunner
 from hivemind_exp.gsm8k.stage3_rewards import print_training_summary
+from hivemind_exp.log_utils import start_file_logging
 
 # Create a custom output recorder
 def record_model_output(output, file_path=None, conversation_mode=False):
@@ -55,18 +51,6 @@ def record_model_output(output, file_path=None, conversation_mode=False):
     
     print(f"Model output (Response #{response_num}) recorded to {file_path}")
 
-# Custom logging handler that writes to both console and file
-class DualHandler(logging.Handler):
-    def __init__(self, file_path):
-        super().__init__()
-        self.file_path = file_path
-        
-    def emit(self, record):
-        log_entry = self.format(record)
-        # Write to the file
-        with open(self.file_path, "a") as f:
-            f.write(log_entry + "\n")
-
 # Function to record all data from round_cache
 def record_complete_round_cache(node, file_path):
     """
@@ -129,13 +113,13 @@ def main():
     )
     root_logger.addHandler(console_handler)
     
-    # Add file handler to also log everything to supervisor_content.txt
-    file_handler = DualHandler(file_path)
-    file_handler.setFormatter(logging.Formatter("%(levelname)s:%(name)s:%(message)s"))
-    root_logger.addHandler(file_handler)
+    # Log everything to supervisor_log.txt too. supervisor_content.txt stays
+    # a journal of responses and feedback, which later runs parse.
+    log_path = os.path.join(root_dir, "supervisor_log.txt")
+    start_file_logging(log_path, logging.Formatter("%(levelname)s:%(name)s:%(message)s"))
     
     # Log the start of recording
-    root_logger.info("Starting complete log recording to supervisor_content.txt")
+    root_logger.info(f"Starting complete log recording to {log_path}")
 
     # Add command-line argument for continuous conversation mode
     parser = argparse.ArgumentParser(description="Run the training loop")
@@ -157,10 +141,15 @@ def main():
     trl_parser = TrlParser((ModelConfig, GRPOArguments, TestnetGRPOArguments, GRPOConfig))
     model_args, grpo_args, testnet_args, training_args = trl_parser.parse_args_and_config(unknown)
 
-    # Run main training loop.
+    # Run main training loop. The chain dependencies (web3) are only imported
+    # when joining the testnet.
     if org_id := testnet_args.modal_org_id:
+        from hivemind_exp.chain_utils import ModalSwarmCoordinator, setup_web3
+
         runner = TestnetGRPORunner(ModalSwarmCoordinator(org_id, web3=setup_web3()))
     elif priv_key := testnet_args.wallet_private_key:
+        from hivemind_exp.chain_utils import WalletSwarmCoordinator, setup_web3
+
         runner = TestnetGRPORunner(WalletSwarmCoordinator(priv_key, web3=setup_web3()))
     else:
         runner = GRPORunner()
@@ -0,0 +1,82 @@
+import heapq
+from collections import defaultdict
+from typing import Any, Mapping, Sequence
+
+import hivemind_exp.gsm8k.stage3_rewards as stage3_rewards
+
+# Same terms as stage3_rewards.hivemind_cumulative_reward, without touching node state.
+FINAL_STAGE_REWARD_FUNCS = [
+    stage3_rewards.consensus_reward_func,
+    stage3_rewards.concensus_correctness_reward_func,
+    stage3_rewards.question_recreation_reward_func,
+    stage3_rewards.final_correctness_reward_func,
+    stage3_rewards.strict_format_reward_func,
+    stage3_rewards.soft_format_reward_func,
+    stage3_rewards.xmlcount_reward_func,
+]
+# Zips answer against the agent answers in the prompt rather than the
+# completions, so it gets the one-element list a lone peer is scored with.
+SINGLE_ANSWER_REWARD_FUNCS = {stage3_rewards.concensus_correctness_reward_func}
+
+
+def top_peers(scores: Mapping[str, float], limit: int) -> list[str]:
+    """Returns the IDs of the highest scoring peers, best first; ties go to the larger ID."""
+    return [
+        peer_id
+        for peer_id, _ in heapq.nlargest(
+            limit, scores.items(), key=lambda t: (float(t[1]), t[0])
+        )
+    ]
+
+
+def score_final_outputs(final_stage_outputs: Sequence[dict[str, Any]]) -> dict[str, float]:
+    """
+    Scores every peer's final answer with the stage 3 reward functions.
+
+    Answers judged against the same stage 3 prompt are scored together, so each
+    reward function runs once per prompt rather than once per peer.
+
+    Args:
+        final_stage_outputs: One {peer ID: stage 3 output} dict per question
+
+    Returns:
+        The total reward of each peer across all questions
+    """
+    groups: dict[str, list[tuple[str, dict[str, Any]]]] = defaultdict(list)
+    for outputs in final_stage_outputs:
+        for peer_id, output in outputs.items():
+            groups[output["stage3_prompt"]].append((peer_id, output))
+
+    scores: dict[str, float] = defaultdict(float)
+    for prompt, entries in groups.items():
+        question = entries[0][1]["question"]
+        prompts = [
+            [
+                {"role": "system", "content": question},
+                {"role": "system", "content": prompt},
+            ]
+        ] * len(entries)
+        completions = [
+            [
+                {
+                    "role": "assistant",
+                    "content": next(iter(output["final_agent_decision"].values())),
+                }
+            ]
+            for _, output in entries
+        ]
+        answer = [output["answer"] for _, output in entries]
+
+        totals = [0.0] * len(entries)
+        for reward_func in FINAL_STAGE_REWARD_FUNCS:
+            rewards = reward_func(
+                prompts=prompts,
+                completions=completions,
+                answer=answer[:1] if reward_func in SINGLE_ANSWER_REWARD_FUNCS else answer,
+            )
+            totals = [t + r for t, r in zip(totals, rewards)]
+
+        for (peer_id, _), total in zip(entries, totals):
+            scores[peer_id] += total
+
+    return dict(scores)
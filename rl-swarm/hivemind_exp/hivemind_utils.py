@@ -1,9 +1,199 @@
-from collections import defaultdict
+import os
+import pickle
+import sys
+import tempfile
+from collections import OrderedDict
 from dataclasses import dataclass, field
-from typing import Any, Callable, Sequence
+from types import MappingProxyType
+from typing import TYPE_CHECKING, Any, Callable, Iterator, Mapping, Sequence
 
 import torch
 
+from hivemind_exp.blob_utils import BlobStore
+
+if TYPE_CHECKING:
+    from hivemind_exp.gsm8k.reward_cache import RewardCache
+
+ROUND_CACHE_MAX_BYTES = 256 * 1024 * 1024
+ROUND_CACHE_MAX_DISK_BYTES = 1024 * 1024 * 1024
+# Strings at least this long (questions, prompts, completions) are interned.
+ROUND_CACHE_INTERN_MIN_LENGTH = 64
+
+
+class RoundCache:
+    """
+    Cache for (r, s): Q: (timestamp, outputs), bounded by an approximate byte budget.
+
+    Long strings are interned so the questions and prompts repeated across
+    stages and peers are stored once. When the budget is exceeded, whole rounds
+    are spilled to disk in least recently used order and loaded back on access.
+    When the spilled stages exceed max_disk_bytes, the least recently used ones
+    are dropped. Reads behave like a dict of dicts, but return read-only views
+    of the cached stages; write through put() so the sizes stay accurate.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = ROUND_CACHE_MAX_BYTES,
+        intern_min_length: int = ROUND_CACHE_INTERN_MIN_LENGTH,
+        spill_dir: str | None = None,
+        max_disk_bytes: int = ROUND_CACHE_MAX_DISK_BYTES,
+    ):
+        self.max_bytes = max_bytes
+        self.intern_min_length = intern_min_length
+        self.spill_dir = spill_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.total_bytes = 0
+        self.disk_bytes = 0
+
+        self._stages: dict[tuple[int, int], dict[str, tuple[float, dict]]] = {}
+        self._sizes: dict[tuple[int, int], int] = {}
+        self._spilled: dict[tuple[int, int], tuple[str, int]] = {}  # (path, file size)
+        self._rounds: OrderedDict[int, None] = OrderedDict()  # Oldest first.
+        self._tmp_dir = None
+
+    def put(self, r, s, question, value: tuple[float, dict]):
+        key = (r, s)
+        stage = self._load(key) if key in self._spilled else self._stages.setdefault(key, {})
+        value = self._intern(value)
+        size = self._estimate_size((question, value))
+        if question in stage:
+            size -= self._estimate_size((question, stage[question]))
+
+        stage[question] = value
+        self._sizes[key] = self._sizes.get(key, 0) + size
+        self.total_bytes += size
+        self._touch(key)
+        self._evict(keep=key)
+
+    def get(self, key, default=None):
+        if key in self:
+            return self[key]
+        return default
+
+    def clear(self):
+        self._stages.clear()
+        self._sizes.clear()
+        self._spilled.clear()
+        self._rounds.clear()
+        self.total_bytes = 0
+        self.disk_bytes = 0
+        if self._tmp_dir:
+            self._tmp_dir.cleanup()
+            self._tmp_dir = None
+
+    def is_spilled(self, key) -> bool:
+        return key in self._spilled
+
+    def keys(self):
+        return sorted(self._stages.keys() | self._spilled.keys())
+
+    def items(self):
+        for key in self.keys():
+            yield key, self[key]
+
+    def __contains__(self, key) -> bool:
+        return key in self._stages or key in self._spilled
+
+    def __getitem__(self, key) -> Mapping[str, tuple[float, dict]]:
+        if key in self._spilled:
+            stage = self._load(key)
+        else:
+            stage = self._stages[key]
+            self._touch(key)
+        # Callers only read the outputs, so they share them rather than copy them.
+        return MappingProxyType(stage)
+
+    def __iter__(self) -> Iterator[tuple[int, int]]:
+        return iter(self.keys())
+
+    def __len__(self) -> int:
+        return len(self._stages) + len(self._spilled)
+
+    def _touch(self, key):
+        self._rounds[key[0]] = None
+        self._rounds.move_to_end(key[0])
+
+    def _evict(self, keep):
+        for r in list(self._rounds):
+            for key in [k for k in self._stages if k[0] == r]:
+                if self.total_bytes <= self.max_bytes:
+                    return
+                if key != keep:
+                    self._spill(key)
+
+    def _spill(self, key):
+        if not self._tmp_dir:
+            self._tmp_dir = tempfile.TemporaryDirectory(
+                prefix="round_cache_", dir=self.spill_dir
+            )
+        path = os.path.join(self._tmp_dir.name, f"{key[0]}_{key[1]}.pkl")
+        with open(path, "wb") as f:
+            pickle.dump(self._stages.pop(key), f, protocol=pickle.HIGHEST_PROTOCOL)
+
+        disk_size = os.path.getsize(path)
+        self._spilled[key] = (path, disk_size)
+        self.total_bytes -= self._sizes[key]
+        self.disk_bytes += disk_size
+        self._evict_disk()
+
+    def _evict_disk(self):
+        for r in list(self._rounds):
+            for key in [k for k in self._spilled if k[0] == r]:
+                if self.disk_bytes <= self.max_disk_bytes:
+                    return
+                path, disk_size = self._spilled.pop(key)
+                os.remove(path)
+                del self._sizes[key]
+                self.disk_bytes -= disk_size
+            if not any(k[0] == r for k in self._stages):
+                del self._rounds[r]
+
+    def _load(self, key) -> dict[str, tuple[float, dict]]:
+        path, disk_size = self._spilled.pop(key)
+        with open(path, "rb") as f:
+            stage = self._intern(pickle.load(f))
+        os.remove(path)
+        self.disk_bytes -= disk_size
+
+        self._stages[key] = stage
+        self.total_bytes += self._sizes[key]
+        self._touch(key)
+        self._evict(keep=key)
+        return stage
+
+    def _intern(self, obj):
+        if isinstance(obj, str):
+            if len(obj) >= self.intern_min_length:
+                return sys.intern(obj)
+            return obj
+        if isinstance(obj, dict):
+            return {self._intern(k): self._intern(v) for k, v in obj.items()}
+        if isinstance(obj, list):
+            return [self._intern(v) for v in obj]
+        if isinstance(obj, tuple):
+            return tuple(self._intern(v) for v in obj)
+        return obj
+
+    def _estimate_size(self, obj, seen=None) -> int:
+        # Interned strings are counted once per entry. Sharing between entries
+        # is ignored, so the estimate errs on the high side.
+        seen = set() if seen is None else seen
+        if isinstance(obj, str):
+            if id(obj) in seen:
+                return 8
+            if len(obj) >= self.intern_min_length:
+                seen.add(id(obj))
+            return sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            return sys.getsizeof(obj) + sum(
+                self._estimate_size(k, seen) + self._estimate_size(v, seen)
+                for k, v in obj.items()
+            )
+        if isinstance(obj, (list, tuple)):
+            return sys.getsizeof(obj) + sum(self._estimate_size(v, seen) for v in obj)
+        return sys.getsizeof(obj)
+
 
 @dataclass
 class HivemindNode:
@@ -16,12 +206,14 @@ class HivemindNode:
     # Q&A outputs from the last training step.
     outputs: dict[Any, Any] = field(default_factory=dict)
     # Cache for (r, s): Q: (timestamp, outputs).
-    round_cache: dict[tuple[int, int], dict[str, tuple[float, dict]]] = field(
-        default_factory=lambda: defaultdict(dict)
-    )
+    round_cache: RoundCache = field(default_factory=RoundCache)
+    # Question and prompt text referenced by published outputs.
+    blob_store: BlobStore = field(default_factory=BlobStore)
 
     # Reward outputs from the last training.
     rewards: Sequence[float | int] = field(default_factory=list)
+    # Memoizes reward functions when set.
+    reward_cache: "RewardCache | None" = None
 
     # Values incremented by coordinator.
     round_num: int = 0
@@ -33,16 +225,15 @@ class HivemindNode:
     def coordinator(*args, **kwargs):
         return HivemindNode(*args, **kwargs, is_coordinator=True)
 
-    def get_stage_outputs(self, r, s) -> dict[str, tuple[float, dict]] | None:
-        key = (r, s)
-        if key in self.round_cache:
-            return self.round_cache[key]
+    def get_stage_outputs(self, r, s) -> Mapping[str, tuple[float, dict]] | None:
+        return self.round_cache.get((r, s))
 
     def put_stage_outputs(self, r, s, question, value: tuple[float, dict]):
-        self.round_cache[(r, s)][question] = value
+        self.round_cache.put(r, s, question, value)
 
     def clear_stage_cache(self):
         self.round_cache.clear()
+        self.blob_store.clear()
 
 
 # Takes round + stage.
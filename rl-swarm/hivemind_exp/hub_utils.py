@@ -0,0 +1,189 @@
+import logging
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable
+
+UPLOAD_MAX_ATTEMPTS = 3
+UPLOAD_RETRY_BACKOFF_SECONDS = 10.0
+UPLOAD_NUM_WORKERS = 4
+
+# What Trainer.push_to_hub leaves out of an output directory.
+IGNORE_PATTERNS = ("_*", "checkpoint-*")
+
+
+def hf_upload_fn(repo_id: str, token: str | None, num_workers: int = UPLOAD_NUM_WORKERS):
+    """
+    Returns an upload function backed by HfApi.upload_large_folder, which uploads
+    files in parallel and resumes from the progress cached in the folder.
+    """
+    from huggingface_hub import HfApi
+
+    api = HfApi(token=token)
+
+    def upload(folder: str):
+        api.upload_large_folder(
+            repo_id=repo_id,
+            folder_path=folder,
+            repo_type="model",
+            num_workers=num_workers,
+            print_report=False,
+        )
+
+    return upload
+
+
+class HubUploader:
+    """
+    Uploads checkpoints on a background thread so pushing to the Hub does not
+    block training.
+
+    Each submitted checkpoint is copied to a staging directory on a separate
+    thread, since the trainer overwrites its output directory every stage; call
+    wait_staged() before writing to it again. Only the newest pending
+    checkpoint is kept; older pending ones are dropped. A failed upload is
+    retried from the same staging directory, so its later attempts resume from
+    the files already uploaded. The staging directory is removed once the
+    checkpoint is uploaded, given up on or superseded.
+    """
+
+    def __init__(
+        self,
+        upload_fn: Callable[[str], None],
+        logger: logging.Logger | None = None,
+        max_attempts: int = UPLOAD_MAX_ATTEMPTS,
+        retry_backoff: float = UPLOAD_RETRY_BACKOFF_SECONDS,
+        staging_dir: str | None = None,
+    ):
+        self.upload_fn = upload_fn
+        self.logger = logger or logging.getLogger(__name__)
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.staging_dir = staging_dir
+
+        self.uploaded = 0
+        self.dropped = 0
+        self.failed = 0
+
+        self._pending: tuple[str, Future] | None = None  # (label, staged folder future)
+        self._staged: Future | None = None
+        self._stager = ThreadPoolExecutor(max_workers=1, thread_name_prefix="hub-stage")
+        self._uploading = False
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, folder: str, label: str):
+        """Queues a copy of folder for upload, replacing any pending checkpoint."""
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("HubUploader is closed")
+            staged = self._stager.submit(self._stage, folder)
+            if self._pending:
+                dropped_label, dropped = self._pending
+                self._discard(dropped)
+                self.dropped += 1
+                self.logger.info(f"Hub upload of {dropped_label} superseded by {label}")
+            self._pending = (label, staged)
+            self._staged = staged
+            self._cond.notify()
+
+        self.logger.info(f"Queued Hub upload of {label}")
+
+    def wait_staged(self, timeout: float | None = None):
+        """Blocks until the last submitted folder has been copied, so it may be overwritten."""
+        if self._staged:
+            self._staged.exception(timeout)
+
+    def _stage(self, folder: str) -> str:
+        staged = tempfile.mkdtemp(prefix="hub_upload_", dir=self.staging_dir)
+        try:
+            shutil.copytree(
+                folder,
+                staged,
+                dirs_exist_ok=True,
+                ignore=shutil.ignore_patterns(*IGNORE_PATTERNS),
+            )
+        except BaseException:
+            shutil.rmtree(staged, ignore_errors=True)
+            raise
+        return staged
+
+    @staticmethod
+    def _discard(staged: Future):
+        staged.add_done_callback(
+            lambda f: f.exception() or shutil.rmtree(f.result(), ignore_errors=True)
+        )
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """Blocks until nothing is pending or uploading; returns False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: not self._pending and not self._uploading, timeout
+            )
+
+    def close(self, timeout: float | None = None):
+        """Finishes the pending upload, then stops the worker."""
+        self.wait(timeout)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        self._stager.shutdown(wait=False)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending or self._closed)
+                if not self._pending:
+                    return
+                label, staged = self._pending
+                self._pending = None
+                self._uploading = True
+
+            try:
+                try:
+                    folder = staged.result()
+                except Exception as e:
+                    self.failed += 1
+                    self.logger.warning(f"Could not stage {label} for a Hub upload: {e}")
+                else:
+                    try:
+                        self._upload(label, folder)
+                    finally:
+                        shutil.rmtree(folder, ignore_errors=True)
+            finally:
+                with self._cond:
+                    self._uploading = False
+                    self._cond.notify_all()
+
+    def _upload(self, label: str, staged: str):
+        start_time = time.monotonic()
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                self.upload_fn(staged)
+                self.uploaded += 1
+                self.logger.info(
+                    f"Uploaded {label} to the Hugging Face Hub in {time.monotonic() - start_time:.1f}s"
+                )
+                return
+            except Exception as e:
+                self.logger.warning(
+                    f"Hub upload of {label} failed (attempt {attempt}/{self.max_attempts}): {e}"
+                )
+                # A newer checkpoint replaces this one rather than waiting behind it.
+                if attempt == self.max_attempts or self._superseded():
+                    break
+                time.sleep(self.retry_backoff * attempt)
+
+        self.failed += 1
+        self.logger.info(
+            f"Failed to push {label} to the Hugging Face Hub. When you conclude training please try manually pushing it yourself using the instructions here: https://huggingface.co/docs/hub/en/models-uploading"
+        )
+
+    def _superseded(self) -> bool:
+        with self._cond:
+            return self._pending is not None
@@ -0,0 +1,108 @@
+import atexit
+import logging
+import os
+import queue
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_MAX_BYTES = 50 * 1024 * 1024
+LOG_BACKUP_COUNT = 3
+LOG_FLUSH_INTERVAL_SECONDS = 1.0
+LOG_BUFFER_BYTES = 64 * 1024
+
+
+class BufferedRotatingFileHandler(RotatingFileHandler):
+    """
+    RotatingFileHandler that keeps a buffered stream open and flushes it at
+    most once per flush_interval, so consecutive records share one write.
+
+    The file size is tracked here rather than read from the stream, since
+    seeking or telling on a text stream flushes it.
+    """
+
+    def __init__(
+        self,
+        filename: str,
+        max_bytes: int = LOG_MAX_BYTES,
+        backup_count: int = LOG_BACKUP_COUNT,
+        flush_interval: float = LOG_FLUSH_INTERVAL_SECONDS,
+        buffer_bytes: int = LOG_BUFFER_BYTES,
+    ):
+        self.flush_interval = flush_interval
+        self.buffer_bytes = buffer_bytes
+        self._last_flush = time.monotonic()
+        self._size = 0
+        self._record_bytes = 0
+        super().__init__(
+            filename, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+        )
+
+    def _open(self):
+        stream = open(
+            self.baseFilename, self.mode, buffering=self.buffer_bytes, encoding=self.encoding
+        )
+        self._size = os.path.getsize(self.baseFilename)
+        return stream
+
+    def shouldRollover(self, record) -> bool:
+        if self.stream is None:
+            self.stream = self._open()
+        self._record_bytes = len((self.format(record) + self.terminator).encode(self.encoding))
+        return 0 < self.maxBytes <= self._size + self._record_bytes and self._size > 0
+
+    def emit(self, record):
+        super().emit(record)
+        self._size += self._record_bytes
+
+    def flush(self):
+        # Called by emit() after every record.
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.force_flush()
+
+    def force_flush(self):
+        super().flush()
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        self.acquire()
+        try:
+            if self.stream:
+                self.force_flush()
+        finally:
+            self.release()
+        super().close()
+
+
+class FileLogListener(QueueListener):
+    """QueueListener whose stop() also closes its handlers and may be called twice."""
+
+    def stop(self):
+        if self._thread is not None:
+            super().stop()
+        for handler in self.handlers:
+            handler.close()
+
+
+def start_file_logging(
+    path: str,
+    formatter: logging.Formatter,
+    logger: logging.Logger | None = None,
+    **handler_kwargs,
+) -> QueueListener:
+    """
+    Sends the logger's records through a queue to a BufferedRotatingFileHandler
+    running on a listener thread, so logging calls never touch the file.
+
+    Returns:
+        The started listener; it is stopped (and the file flushed) at exit
+    """
+    handler = BufferedRotatingFileHandler(path, **handler_kwargs)
+    handler.setFormatter(formatter)
+
+    log_queue: queue.Queue = queue.Queue()
+    listener = FileLogListener(log_queue, handler, respect_handler_level=True)
+    listener.start()
+    (logger or logging.getLogger()).addHandler(QueueHandler(log_queue))
+
+    atexit.register(listener.stop)
+    return listener
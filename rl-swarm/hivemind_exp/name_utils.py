@@ -1,6 +1,7 @@
 import hashlib
+import threading
 from functools import lru_cache
-from typing import Sequence
+from typing import Iterable, Sequence
 
 # fmt: off
 ADJECTIVES = [
@@ -75,25 +76,84 @@ def hex_to_ints(s, k):
     return tuple(int(s[i : i + k], 16) for i in range(0, len(s), k))
 
 
+# Names are cached per peer ID; bounded so long-running servers don't grow forever.
+NAME_CACHE_SIZE = 1 << 16
+
+
 # libp2p peer IDs are always base58-encoded multihashes!
 
 
-@lru_cache
-def get_name_from_peer_id(peer_id: str, no_spaces=False):
-    # ~200 entries for both lists; so 2 hex digits.
-    ints = hex_to_ints(hashlib.md5(peer_id.encode()).hexdigest(), 2)
-    adj1 = ADJECTIVES[ints[2] % len(ADJECTIVES)]
-    adj2 = ADJECTIVES[ints[1] % len(ADJECTIVES)]
-    animal = ANIMALS[ints[0] % len(ANIMALS)]
+def _name_from_digest(digest: bytes) -> str:
+    # ~200 entries for both lists; so one digest byte each.
+    adj1 = ADJECTIVES[digest[2] % len(ADJECTIVES)]
+    adj2 = ADJECTIVES[digest[1] % len(ADJECTIVES)]
+    animal = ANIMALS[digest[0] % len(ANIMALS)]
+    return f"{adj1} {adj2} {animal}"
+
+
+@lru_cache(maxsize=NAME_CACHE_SIZE)
+def _get_name(peer_id: str) -> str:
+    return _name_from_digest(hashlib.md5(peer_id.encode()).digest())
+
 
-    name = f"{adj1} {adj2} {animal}"
+def get_name_from_peer_id(peer_id: str, no_spaces=False):
+    name = _get_name(peer_id)
     if no_spaces:
-        name = "_".join(name.split(" "))
+        name = name.replace(" ", "_")
     return name
 
 
+def get_names_from_peer_ids(peer_ids: Iterable[str], no_spaces=False) -> list[str]:
+    """Batched get_name_from_peer_id; hashes each distinct ID at most once."""
+    peer_ids = list(peer_ids)
+    names = {}
+    for peer_id in peer_ids:
+        if peer_id not in names:
+            names[peer_id] = _get_name(peer_id)
+
+    if no_spaces:
+        names = {k: v.replace(" ", "_") for k, v in names.items()}
+    return [names[peer_id] for peer_id in peer_ids]
+
+
 def search_peer_ids_for_name(peer_ids: Sequence[str], name):
     for peer_id in peer_ids:
         if name == get_name_from_peer_id(peer_id):
             return peer_id
     return None
+
+
+class PeerNameIndex:
+    """
+    Reverse index from generated names to peer IDs.
+
+    Names are three words drawn from ~200 entry lists, so distinct peers can
+    share a name; every ID seen for a name is kept in insertion order.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids_by_name: dict[str, list[str]] = {}
+        self._seen: set[str] = set()
+
+    def __len__(self):
+        return len(self._seen)
+
+    def add(self, peer_ids: Iterable[str]):
+        new_ids = [peer_id for peer_id in peer_ids if peer_id not in self._seen]
+        if not new_ids:
+            return
+
+        names = get_names_from_peer_ids(new_ids)
+        with self._lock:
+            for peer_id, name in zip(new_ids, names):
+                if peer_id in self._seen:
+                    continue
+                self._seen.add(peer_id)
+                self._ids_by_name.setdefault(name, []).append(peer_id)
+
+    def lookup(self, name) -> list[str]:
+        return list(self._ids_by_name.get(name, ()))
+
+    def lookup_many(self, names: Iterable[str]) -> dict[str, list[str]]:
+        return {name: self.lookup(name) for name in names}
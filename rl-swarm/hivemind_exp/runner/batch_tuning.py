@@ -0,0 +1,83 @@
+import logging
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+# Used when accelerator memory cannot be probed (e.g. CPU and MPS).
+DEFAULT_BATCH_SIZE = 2
+MAX_AUTO_BATCH_SIZE = 16
+# Fraction of the remaining free memory the batch may use; the rest covers fragmentation.
+MEMORY_HEADROOM = 0.7
+# AdamW keeps two fp32 moments per parameter.
+OPTIMIZER_STATE_BYTES = 2 * 4
+# Training activations per layer and token, in hidden-size units, with gradient checkpointing.
+ACTIVATION_MULTIPLIER = 4
+LOGITS_BYTES = 4  # Log-probs are computed in fp32.
+
+
+def available_accelerator_memory(reserved_fraction: float = 0.0) -> int | None:
+    """Free CUDA memory, less the fraction of total memory reserved for e.g. vLLM."""
+    if torch.cuda.is_available():
+        free, total = torch.cuda.mem_get_info()
+        return max(0, free - int(total * reserved_fraction))
+    return None
+
+
+def bytes_per_sequence(model_config, seq_len: int, dtype_bytes: int = 2) -> int:
+    """Estimates the accelerator memory one generated sequence needs during a GRPO step."""
+    layers = model_config.num_hidden_layers
+    hidden = model_config.hidden_size
+    heads = model_config.num_attention_heads
+    kv_heads = getattr(model_config, "num_key_value_heads", None) or heads
+    head_dim = hidden // heads
+
+    kv_cache = 2 * layers * kv_heads * head_dim * dtype_bytes * seq_len
+    activations = ACTIVATION_MULTIPLIER * layers * hidden * dtype_bytes * seq_len
+    logits = model_config.vocab_size * LOGITS_BYTES * seq_len
+    return kv_cache + activations + logits
+
+
+def training_state_bytes(num_params: int, dtype_bytes: int = 2) -> int:
+    """Estimates the accelerator memory of the weights, gradients and optimizer state."""
+    return num_params * (2 * dtype_bytes + OPTIMIZER_STATE_BYTES)
+
+
+def auto_batch_size(
+    model,
+    max_prompt_length: int,
+    max_completion_length: int,
+    free_bytes: int | None = None,
+    max_batch_size: int = MAX_AUTO_BATCH_SIZE,
+    reserved_fraction: float = 0.0,
+) -> int:
+    """
+    Picks the largest power of two generations per step that fits in free accelerator memory,
+    once the model's training state is on the accelerator.
+
+    Returns:
+        The batch size, or DEFAULT_BATCH_SIZE if memory cannot be probed
+    """
+    if free_bytes is None:
+        free_bytes = available_accelerator_memory(reserved_fraction)
+    if free_bytes is None:
+        return DEFAULT_BATCH_SIZE
+
+    dtype_bytes = torch.finfo(model.dtype).bits // 8 if model.dtype.is_floating_point else 2
+    # The model is probed before the trainer moves it, and its optimizer, to the accelerator.
+    training_state = training_state_bytes(model.num_parameters(), dtype_bytes)
+    per_sequence = bytes_per_sequence(
+        model.config, max_prompt_length + max_completion_length, dtype_bytes
+    )
+    fits = int(max(0, free_bytes - training_state) * MEMORY_HEADROOM) // per_sequence
+
+    batch_size = DEFAULT_BATCH_SIZE
+    while batch_size * 2 <= min(fits, max_batch_size):
+        batch_size *= 2
+
+    logger.info(
+        f"Auto batch size {batch_size}: {free_bytes / 1024**3:.1f} GiB free, "
+        f"~{training_state / 1024**3:.1f} GiB training state, "
+        f"~{per_sequence / 1024**2:.0f} MiB per sequence"
+    )
+    return batch_size
@@ -1,18 +1,18 @@
 import logging
 from dataclasses import dataclass
 from functools import partial
-from typing import Callable, Tuple
+from typing import TYPE_CHECKING, Callable, Tuple
 
-import hivemind
 from datasets import Dataset
 from trl import GRPOConfig, ModelConfig
 
-from hivemind_exp.chain_utils import (
-    SwarmCoordinator,
-)
 from hivemind_exp.runner.grpo_runner import GRPOArguments, GRPORunner
 from hivemind_exp.trainer.gensyn.testnet_grpo_trainer import TestnetGRPOTrainer
 
+if TYPE_CHECKING:
+    # web3 is only imported when a coordinator is created.
+    from hivemind_exp.chain_utils import SwarmCoordinator
+
 logger = logging.getLogger(__name__)
 
 
@@ -23,7 +23,7 @@ class TestnetGRPOArguments:
     modal_org_id: str | None = None # Modal organization ID.
 
 class TestnetGRPORunner(GRPORunner):
-    def __init__(self, coordinator: SwarmCoordinator) -> None:
+    def __init__(self, coordinator: "SwarmCoordinator") -> None:
         self.coordinator = coordinator
 
     def get_initial_peers(self) -> list[str]:
@@ -33,10 +33,22 @@ class TestnetGRPORunner(GRPORunner):
         logger.info(f"Registering self with peer ID: {peer_id}")
         self.coordinator.register_peer(peer_id)
 
-    def setup_dht(self, grpo_args):
+    def resolve_initial_peers(self, grpo_args):
+        initial_peers = grpo_args.initial_peers
+        if not initial_peers:
+            initial_peers = self.get_initial_peers()
+            logger.info(f"Retrieved initial peers from chain: {initial_peers}")
+        elif initial_peers == ["BOOT"]:
+            initial_peers = []
+            logger.info("Proceeding as bootnode!")
+
+        grpo_args.initial_peers = initial_peers
+
+    def setup_dht(self, grpo_args, dht=None):
         initial_peers = grpo_args.initial_peers
 
-        dht = hivemind.DHT(start=True, **self._dht_kwargs(grpo_args))
+        dht = dht or self.start_dht(grpo_args)
+        dht.wait_until_ready()
         logger.info(f"🐝 Joining swarm with initial_peers = {initial_peers}")
 
         peer_id = str(dht.peer_id)
@@ -51,15 +63,6 @@ class TestnetGRPORunner(GRPORunner):
         training_args: GRPOConfig,
         initial_datasets_fn: Callable[[], Tuple[Dataset, Dataset]],
     ):
-        initial_peers = grpo_args.initial_peers
-        if not initial_peers:
-            initial_peers = self.get_initial_peers()
-            logger.info(f"Retrieved initial peers from chain: {initial_peers}")
-        elif initial_peers == ["BOOT"]:
-            initial_peers = []
-            logger.info("Proceeding as bootnode!")
-
-        grpo_args.initial_peers = initial_peers
         return super().run(
             model_args,
             grpo_args,
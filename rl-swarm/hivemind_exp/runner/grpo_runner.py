@@ -1,4 +1,5 @@
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
 from datetime import datetime
 from typing import Callable, Tuple
@@ -9,9 +10,15 @@ from huggingface_hub import login
 from transformers import AutoModelForCausalLM, AutoTokenizer
 from trl import GRPOConfig, ModelConfig
 
+from hivemind_exp.debug_utils import PhaseTimer
+from hivemind_exp.dist_utils import DistributedContext
+from hivemind_exp.gsm8k.prompt_packing import PromptPacker
+from hivemind_exp.gsm8k.reward_cache import RewardCache
+from hivemind_exp.gsm8k.sample_logger import sample_logger
 from hivemind_exp.gsm8k.stage_utils import gsm8k_stage_data
 from hivemind_exp.hivemind_utils import HivemindNode
 from hivemind_exp.name_utils import get_name_from_peer_id
+from hivemind_exp.runner.batch_tuning import DEFAULT_BATCH_SIZE, auto_batch_size
 from hivemind_exp.trainer.hivemind_grpo_trainer import HivemindGRPOTrainer
 
 logger = logging.getLogger(__name__)
@@ -31,6 +38,13 @@ class GRPOArguments:
     tokenizer_name_or_path: str | None = None
     number_of_data_samples: int = 50000
     public_maddr: str | None = None
+    # Generations per step: "config" keeps per_device_train_batch_size and
+    # num_generations, "auto" probes accelerator memory, or a fixed number.
+    batch_size: str = "config"
+    # Memoizes up to this many per-completion rewards; 0 disables it.
+    reward_cache_size: int = 0
+    # Fraction of reward function calls that log a sample when logging is on.
+    sample_log_rate: float = 0.01
 
     #Hugging Face Hub arguments
     hf_token: str | None = None
@@ -45,6 +59,16 @@ class GRPORunner:
         )
         return AutoModelForCausalLM.from_pretrained(model_name, **model_init_kwargs)
 
+    def get_tokenizer(self, model_args: ModelConfig, grpo_args: GRPOArguments):
+        tokenizer = AutoTokenizer.from_pretrained(
+            self.get_tokenizer_name(model_args, grpo_args),
+            revision=model_args.model_revision,
+            trust_remote_code=model_args.trust_remote_code,
+        )
+        if tokenizer.pad_token is None:
+            tokenizer.pad_token = tokenizer.eos_token
+        return tokenizer
+
     def get_tokenizer_name(self, model_args: ModelConfig, script_args: GRPOArguments):
         if script_args.tokenizer_name_or_path:
             return script_args.tokenizer_name_or_path
@@ -52,6 +76,42 @@ class GRPORunner:
             return model_args.model_name_or_path
         raise ValueError("unable to resolve tokenizer name")
 
+    def configure_batch_size(
+        self, grpo_args: GRPOArguments, training_args: GRPOConfig, model, dist: DistributedContext
+    ):
+        match str(grpo_args.batch_size).lower():
+            case "config":
+                # GRPOTrainer needs each global batch to hold whole groups of generations.
+                global_batch_size = training_args.per_device_train_batch_size * dist.world_size
+                num_generations = training_args.num_generations
+                if num_generations >= 2 and global_batch_size % num_generations == 0:
+                    return
+                logger.warning(
+                    f"{num_generations} generations per prompt do not divide the global batch "
+                    f"size of {global_batch_size}; using a batch size of {DEFAULT_BATCH_SIZE}"
+                )
+                batch_size = DEFAULT_BATCH_SIZE
+            case "auto":
+                batch_size = auto_batch_size(
+                    model,
+                    training_args.max_prompt_length or 0,
+                    training_args.max_completion_length,
+                    # vLLM claims its share of the GPU when the trainer starts.
+                    reserved_fraction=(
+                        training_args.vllm_gpu_memory_utilization
+                        if training_args.use_vllm
+                        else 0.0
+                    ),
+                )
+            case value:
+                batch_size = int(value)
+
+        # Every rank must step with the same batch size.
+        batch_size = min(dist.all_gather_object(batch_size))
+        # Each step groups all generations of one prompt.
+        training_args.per_device_train_batch_size = batch_size
+        training_args.num_generations = batch_size
+
     def _dht_kwargs(self, grpo_args):
         kwargs = {}
         initial_peers = grpo_args.initial_peers
@@ -74,9 +134,19 @@ class GRPORunner:
         logger.info(f"🐱 Hello 🐈 [{animal_name}] 🦮 [{peer_id}]!")
         return animal_name
 
-    def setup_dht(self, grpo_args):
+    def resolve_initial_peers(self, grpo_args):
+        pass
+
+    def start_dht(self, grpo_args):
+        """Starts the DHT process without waiting for it to bootstrap."""
+        dht = hivemind.DHT(start=False, **self._dht_kwargs(grpo_args))
+        dht.run_in_background(await_ready=False)
+        return dht
+
+    def setup_dht(self, grpo_args, dht=None):
         initial_peers = grpo_args.initial_peers
-        dht = hivemind.DHT(start=True, **self._dht_kwargs(grpo_args))
+        dht = dht or self.start_dht(grpo_args)
+        dht.wait_until_ready()
         if initial_peers:
             logger.info(f"🐝 Joining swarm with initial_peers = {initial_peers}")
         else:
@@ -100,54 +170,89 @@ class GRPORunner:
         logger.debug(f"Model parameters {model_args}")
         logger.debug(f"Training/evaluation parameters {training_args}")
 
-        batch_size = 2
-        training_args.per_device_train_batch_size = batch_size
-        training_args.num_generations = batch_size
+        timer = PhaseTimer()
+        model_name_or_path = model_args.model_name_or_path
+        assert model_name_or_path
+
+        # With several local processes (e.g. accelerate launch), rank 0 is the
+        # swarm node and the other ranks only train.
+        dist = DistributedContext.from_env()
+        if dist.is_distributed:
+            logger.info(f"Local rank {dist.rank} of {dist.world_size}")
 
         ############################
         # Log into HF hub if wanted
         ############################
         if (grpo_args.hf_token not in [None, "None"]):
             training_args.push_to_hub_token = grpo_args.hf_token
-            login(token=training_args.push_to_hub_token, add_to_git_credential=True)
+            if dist.is_main:
+                with timer.phase("hub login"):
+                    login(token=training_args.push_to_hub_token, add_to_git_credential=True)
         else:
             training_args.push_to_hub_token = None
 
-        ################
-        # Load tokenizer
-        ################
-        tokenizer = AutoTokenizer.from_pretrained(
-            self.get_tokenizer_name(model_args, grpo_args),
-            revision=model_args.model_revision,
-            trust_remote_code=model_args.trust_remote_code,
-        )
-        if tokenizer.pad_token is None:
-            tokenizer.pad_token = tokenizer.eos_token
-
         #########################
         # Create DHT via Hivemind
         #########################
-        dht = self.setup_dht(grpo_args)
+        dht = None
+        if dist.is_main:
+            with timer.phase("initial peers"):
+                self.resolve_initial_peers(grpo_args)
+            # Forked before any loader threads start.
+            with timer.phase("dht start"):
+                dht = self.start_dht(grpo_args)
+
+        ##############################################################
+        # Load tokenizer, datasets and model while the DHT bootstraps
+        ##############################################################
+        with ThreadPoolExecutor(max_workers=3, thread_name_prefix="startup") as executor:
+            tokenizer_future = executor.submit(
+                timer.timed("tokenizer", self.get_tokenizer), model_args, grpo_args
+            )
+            model_future = executor.submit(
+                timer.timed("model", self.get_model), training_args, model_name_or_path
+            )
+            if dist.is_main:
+                datasets_future = executor.submit(timer.timed("datasets", initial_datasets_fn))
+                with timer.phase("dht bootstrap + registration"):
+                    dht = self.setup_dht(grpo_args, dht)
 
-        #####################################
-        # Load datasets, prepare, and format
-        #####################################
-        train_dataset, test_dataset = initial_datasets_fn()
+            tokenizer = tokenizer_future.result()
+            model = model_future.result()
+
+        datasets = datasets_future.result() if dist.is_main else None
+        train_dataset, test_dataset = dist.broadcast_object(datasets)
 
         #########################
         # Instantiate DPO trainer
         #########################
-        model_name_or_path = model_args.model_name_or_path
-        assert model_name_or_path
-        model = self.get_model(training_args, model_name_or_path)
+        with timer.phase("batch size"):
+            self.configure_batch_size(grpo_args, training_args, model, dist)
+        logger.info(
+            f"Batch size {training_args.per_device_train_batch_size}, "
+            f"{training_args.num_generations} generations per prompt"
+        )
 
-        initial_peers = grpo_args.initial_peers
-        if initial_peers:
-            node = HivemindNode(model_name_or_path, str(dht.peer_id))
+        # All ranks share rank 0's swarm identity.
+        peer_id, is_coordinator, self.name = dist.broadcast_object(
+            (str(dht.peer_id), not grpo_args.initial_peers, self.name) if dist.is_main else None
+        )
+        if is_coordinator:
+            node = HivemindNode.coordinator(model_name_or_path, peer_id)
         else:
-            node = HivemindNode.coordinator(model_name_or_path, str(dht.peer_id))
+            node = HivemindNode(model_name_or_path, peer_id)
+        sample_logger.rate = grpo_args.sample_log_rate
+        if grpo_args.reward_cache_size > 0:
+            node.reward_cache = RewardCache(grpo_args.reward_cache_size)
 
-        stage_data = gsm8k_stage_data(dht, node, train_dataset, test_dataset)
+        # Fit stage 2 and 3 prompts to the length TRL would truncate them to.
+        prompt_packer = None
+        if training_args.max_prompt_length:
+            prompt_packer = PromptPacker(tokenizer, training_args.max_prompt_length)
+
+        stage_data = gsm8k_stage_data(
+            dht, node, train_dataset, test_dataset, prompt_packer=prompt_packer
+        )
         stage_data.max_rounds = grpo_args.max_rounds
         trainer = trainer_factory_fn(
             dht=dht,
@@ -157,7 +262,9 @@ class GRPORunner:
             config=training_args,
             stage_data=stage_data,
             log_tag=self.name,
+            dist=dist,
         )
+        logger.info(timer.report())
 
         ###############
         # Training loop
@@ -0,0 +1,56 @@
+import json
+
+from web3 import EthereumTesterProvider, Web3
+
+from hivemind_exp.chain_utils import SWARM_COORDINATOR_ABI_JSON, SwarmCoordinator
+
+STAGE_COUNT = 3
+
+
+class FakeChain:
+    """
+    Local in-memory chain (eth-tester) running the SwarmCoordinator contract,
+    so coordinator clients can be tested without an RPC endpoint.
+    """
+
+    def __init__(self):
+        self.web3 = Web3(EthereumTesterProvider())
+        self.owner = self.web3.eth.accounts[0]
+
+        with open(SWARM_COORDINATOR_ABI_JSON, "r") as f:
+            artifact = json.load(f)
+
+        factory = self.web3.eth.contract(
+            abi=artifact["abi"], bytecode=artifact["bytecode"]["object"]
+        )
+        receipt = self._transact(factory.constructor())
+        self.address = receipt.contractAddress
+        self.contract = self.web3.eth.contract(address=self.address, abi=artifact["abi"])
+
+        self._transact(self.contract.functions.setStageCount(STAGE_COUNT))
+        self._transact(self.contract.functions.setStageUpdater(self.owner))
+        self._transact(self.contract.functions.setBootnodeManager(self.owner))
+
+    def _transact(self, fn):
+        tx_hash = fn.transact({"from": self.owner})
+        return self.web3.eth.wait_for_transaction_receipt(tx_hash)
+
+    def fund(self, address, ether=1):
+        tx_hash = self.web3.eth.send_transaction(
+            {"from": self.owner, "to": address, "value": self.web3.to_wei(ether, "ether")}
+        )
+        self.web3.eth.wait_for_transaction_receipt(tx_hash)
+
+    def set_bootnode_manager(self, address):
+        self._transact(self.contract.functions.setBootnodeManager(address))
+
+    def add_bootnodes(self, bootnodes):
+        self._transact(self.contract.functions.addBootnodes(bootnodes))
+
+    def advance_stage(self):
+        self._transact(self.contract.functions.updateStageAndRound())
+
+    def coordinator(self, **kwargs) -> SwarmCoordinator:
+        return SwarmCoordinator(
+            web3=self.web3, contract_address=self.address, **kwargs
+        )
@@ -0,0 +1,56 @@
+from types import SimpleNamespace
+
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from hivemind_exp.runner.batch_tuning import (
+    DEFAULT_BATCH_SIZE,
+    MEMORY_HEADROOM,
+    auto_batch_size,
+    bytes_per_sequence,
+    training_state_bytes,
+)
+
+# Roughly Qwen2.5-0.5B.
+CONFIG = SimpleNamespace(
+    num_hidden_layers=24,
+    hidden_size=896,
+    num_attention_heads=14,
+    num_key_value_heads=2,
+    vocab_size=151936,
+)
+NUM_PARAMS = 494_000_000
+MODEL = SimpleNamespace(config=CONFIG, dtype=torch.bfloat16, num_parameters=lambda: NUM_PARAMS)
+GIB = 1024**3
+
+
+def test_bytes_per_sequence_scales_with_length():
+    assert bytes_per_sequence(CONFIG, 2048) == 2 * bytes_per_sequence(CONFIG, 1024)
+
+
+def test_auto_batch_size_grows_with_memory():
+    sizes = [
+        auto_batch_size(MODEL, 256, 1024, free_bytes=free * GIB) for free in (1, 8, 80)
+    ]
+    assert sizes == sorted(sizes)
+    assert sizes[0] == DEFAULT_BATCH_SIZE
+    assert sizes[-1] == 16
+
+
+def test_auto_batch_size_is_power_of_two():
+    size = auto_batch_size(MODEL, 256, 1024, free_bytes=6 * GIB)
+    assert size & (size - 1) == 0
+
+
+def test_auto_batch_size_respects_max():
+    assert auto_batch_size(MODEL, 256, 1024, free_bytes=80 * GIB, max_batch_size=4) == 4
+
+
+def test_auto_batch_size_leaves_room_for_training_state():
+    state = training_state_bytes(NUM_PARAMS)
+    per_sequence = bytes_per_sequence(CONFIG, 256 + 1024)
+    batch_bytes = int(4 * per_sequence / MEMORY_HEADROOM) + 1
+    assert auto_batch_size(MODEL, 256, 1024, free_bytes=state + batch_bytes) == 4
+    # Enough for four sequences only if the training state were ignored.
+    assert auto_batch_size(MODEL, 256, 1024, free_bytes=batch_bytes) == DEFAULT_BATCH_SIZE
@@ -0,0 +1,72 @@
+from types import SimpleNamespace
+
+from hivemind_exp.blob_utils import (
+    BlobStore,
+    blob_hash,
+    blob_key,
+    blob_ref,
+    is_blob_ref,
+)
+from hivemind_exp.tests.fake_data import STAGE_2_OUTPUTS, STAGE_3_OUTPUTS
+
+
+class FakeDHT:
+    def __init__(self):
+        self.values = {}
+        self.gets = 0
+
+    def store(self, key, value, expiration_time):
+        self.values[key] = value
+
+    def get(self, key, latest=False):
+        self.gets += 1
+        if key in self.values:
+            return SimpleNamespace(value=self.values[key])
+        return None
+
+
+def test_publish_and_resolve():
+    dht = FakeDHT()
+    outputs = next(iter(STAGE_3_OUTPUTS.values()))
+
+    published = BlobStore().publish(dht, outputs, expiration_time=0)
+    assert is_blob_ref(published["question"])
+    assert is_blob_ref(published["stage3_prompt"])
+    assert published["final_agent_decision"] == outputs["final_agent_decision"]
+    assert blob_key(blob_hash(outputs["stage3_prompt"])) in dht.values
+
+    reader = BlobStore()
+    assert reader.resolve_outputs(dht, published) == outputs
+
+
+def test_blobs_published_and_fetched_once():
+    dht = FakeDHT()
+    writer = BlobStore()
+    published = [writer.publish(dht, o, expiration_time=0) for o in STAGE_2_OUTPUTS.values()]
+    assert len(dht.values) == 2  # Question and stage 2 prompt are shared.
+
+    reader = BlobStore()
+    resolved = [reader.resolve_outputs(dht, o) for o in published]
+    assert resolved == list(STAGE_2_OUTPUTS.values())
+    assert dht.gets == 2
+    assert resolved[0]["stage2_prompt"] is resolved[1]["stage2_prompt"]
+
+
+def test_short_values_stay_inline():
+    outputs = {"question": "What is 6 x 7?", "answer": "42"}
+    assert BlobStore().dehydrate(outputs) == outputs
+
+
+def test_missing_or_tampered_blob():
+    dht = FakeDHT()
+    text = "x" * 200
+    ref = blob_ref(blob_hash(text))
+    assert BlobStore().resolve_outputs(dht, {"question": ref}) is None
+
+    dht.values[blob_key(blob_hash(text))] = "y" * 200
+    assert BlobStore().resolve(dht, ref) is None
+
+
+def test_legacy_outputs_pass_through():
+    outputs = next(iter(STAGE_2_OUTPUTS.values()))
+    assert BlobStore().resolve_outputs(FakeDHT(), outputs) is outputs
@@ -0,0 +1,313 @@
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+import requests
+
+from hivemind_exp.chain_utils import (
+    ModalSwarmCoordinator,
+    SingleFlightCache,
+    TransactionManager,
+    send_via_api,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_single_flight_cache_ttl():
+    clock = FakeClock()
+    cache = SingleFlightCache(clock)
+    values = iter(range(10))
+
+    assert cache.get("k", 5, lambda: next(values)) == 0
+    clock.now = 4.9
+    assert cache.get("k", 5, lambda: next(values)) == 0
+    clock.now = 5.0
+    assert cache.get("k", 5, lambda: next(values)) == 1
+
+    cache.invalidate("k")
+    assert cache.get("k", 5, lambda: next(values)) == 2
+
+
+def test_single_flight_cache_collapses_concurrent_misses():
+    cache = SingleFlightCache()
+    calls = []
+    release = threading.Event()
+
+    def fetch():
+        calls.append(1)
+        release.wait(timeout=5)
+        return "value"
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(cache.get("k", 60, fetch)))
+        for _ in range(8)
+    ]
+    for t in threads:
+        t.start()
+    time.sleep(0.1)
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert results == ["value"] * 8
+
+
+def test_single_flight_cache_failure_is_not_cached():
+    cache = SingleFlightCache()
+
+    def fail():
+        raise ValueError("rpc down")
+
+    with pytest.raises(ValueError):
+        cache.get("k", 60, fail)
+    assert cache.get("k", 60, lambda: "ok") == "ok"
+
+
+def test_coordinator_caches_round_and_stage():
+    pytest.importorskip("eth_tester")
+    from hivemind_exp.tests.fake_chain import FakeChain
+
+    chain = FakeChain()
+    chain.add_bootnodes(["/ip4/127.0.0.1/tcp/38331/p2p/QmBootnode"])
+    coordinator = chain.coordinator(round_stage_ttl=60)
+
+    with patch.object(
+        coordinator,
+        "_fetch_round_and_stage",
+        wraps=coordinator._fetch_round_and_stage,
+    ) as fetch:
+        assert coordinator.get_round_and_stage() == (0, 0)
+        chain.advance_stage()
+        assert coordinator.get_round_and_stage() == (0, 0)  # Cached.
+        assert fetch.call_count == 1
+
+        coordinator.state_cache.invalidate()
+        assert coordinator.get_round_and_stage() == (0, 1)
+        assert fetch.call_count == 2
+
+    assert coordinator.get_bootnodes() == ["/ip4/127.0.0.1/tcp/38331/p2p/QmBootnode"]
+
+
+def test_transaction_manager_tracks_nonces_locally():
+    pytest.importorskip("eth_tester")
+    from eth_account import Account
+
+    from hivemind_exp.tests.fake_chain import FakeChain
+
+    chain = FakeChain()
+    account = Account.create()
+    chain.fund(account.address)
+    chain.set_bootnode_manager(account.address)
+
+    web3 = chain.web3
+    manager = TransactionManager(
+        web3, account, chain_id=web3.eth.chain_id, gas_price=web3.eth.gas_price * 2
+    )
+    bootnodes = [f"/ip4/127.0.0.1/tcp/{38331 + i}/p2p/QmBootnode{i}" for i in range(5)]
+
+    with patch.object(
+        web3.eth, "get_transaction_count", wraps=web3.eth.get_transaction_count
+    ) as get_nonce:
+        futures = [
+            manager.submit(
+                "addBootnodes", chain.contract.functions.addBootnodes([bootnode])
+            )
+            for bootnode in bootnodes
+        ]
+        receipts = [f.result(timeout=30) for f in futures]
+
+    assert get_nonce.call_count == 1
+    assert all(r["status"] == 1 for r in receipts)
+    assert list(manager.gas_estimates) == [("addBootnodes", (1,))]
+    assert chain.contract.functions.getBootnodes().call() == bootnodes
+
+
+def test_transaction_manager_estimates_gas_per_argument_shape():
+    pytest.importorskip("eth_tester")
+    from eth_account import Account
+
+    from hivemind_exp.tests.fake_chain import FakeChain
+
+    chain = FakeChain()
+    account = Account.create()
+    chain.fund(account.address)
+    chain.set_bootnode_manager(account.address)
+
+    web3 = chain.web3
+    manager = TransactionManager(
+        web3, account, chain_id=web3.eth.chain_id, gas_price=web3.eth.gas_price * 2
+    )
+    bootnodes = [f"/ip4/127.0.0.1/tcp/{38331 + i}/p2p/QmBootnode{i}" for i in range(20)]
+
+    # A longer list needs more gas than the first estimate allowed for.
+    for batch in (bootnodes[:1], bootnodes[1:]):
+        future = manager.submit("addBootnodes", chain.contract.functions.addBootnodes(batch))
+        assert future.result(timeout=30)["status"] == 1
+
+    assert chain.contract.functions.getBootnodes().call() == bootnodes
+    estimates = manager.gas_estimates
+    assert estimates[("addBootnodes", (19,))] > estimates[("addBootnodes", (1,))]
+
+
+def test_transaction_manager_reports_reverts():
+    pytest.importorskip("eth_tester")
+    from eth_account import Account
+
+    from hivemind_exp.tests.fake_chain import FakeChain
+
+    chain = FakeChain()
+    account = Account.create()
+    chain.fund(account.address)
+
+    web3 = chain.web3
+    manager = TransactionManager(
+        web3, account, chain_id=web3.eth.chain_id, gas_price=web3.eth.gas_price * 2
+    )
+
+    # Not the bootnode manager: the call reverts.
+    future = manager.submit(
+        "addBootnodes", chain.contract.functions.addBootnodes(["/ip4/127.0.0.1"])
+    )
+    with pytest.raises(Exception):
+        future.result(timeout=30)
+
+
+def test_transaction_manager_resyncs_nonce_after_failed_send():
+    pytest.importorskip("eth_tester")
+    from eth_account import Account
+
+    from hivemind_exp.tests.fake_chain import FakeChain
+
+    chain = FakeChain()
+    account = Account.create()
+    chain.fund(account.address)
+    chain.set_bootnode_manager(account.address)
+
+    web3 = chain.web3
+    manager = TransactionManager(
+        web3, account, chain_id=web3.eth.chain_id, gas_price=web3.eth.gas_price * 2
+    )
+
+    with patch.object(
+        web3.eth, "send_raw_transaction", side_effect=ValueError("rpc down")
+    ):
+        future = manager.submit(
+            "addBootnodes", chain.contract.functions.addBootnodes(["/ip4/127.0.0.1"])
+        )
+        with pytest.raises(ValueError):
+            future.result(timeout=30)
+
+    # Every attempt consumed a nonce locally; none of them reached the chain.
+    future = manager.submit(
+        "addBootnodes", chain.contract.functions.addBootnodes(["/ip4/127.0.0.2"])
+    )
+    assert future.result(timeout=30)["status"] == 1
+    assert chain.contract.functions.getBootnodes().call() == ["/ip4/127.0.0.2"]
+
+
+def test_transaction_manager_resyncs_nonce_after_dropped_transaction():
+    pytest.importorskip("eth_tester")
+    from eth_account import Account
+
+    from hivemind_exp.tests.fake_chain import FakeChain
+
+    chain = FakeChain()
+    account = Account.create()
+    chain.fund(account.address)
+    chain.set_bootnode_manager(account.address)
+
+    web3 = chain.web3
+    manager = TransactionManager(
+        web3,
+        account,
+        chain_id=web3.eth.chain_id,
+        gas_price=web3.eth.gas_price * 2,
+        receipt_timeout=0.1,
+    )
+
+    # The node accepts the transaction, which then never gets mined.
+    with patch.object(web3.eth, "send_raw_transaction", return_value=b"\x01" * 32):
+        future = manager.submit(
+            "addBootnodes", chain.contract.functions.addBootnodes(["/ip4/127.0.0.1"])
+        )
+        with pytest.raises(Exception):
+            future.result(timeout=30)
+
+    # The next transaction reuses the nonce; a real node would otherwise queue
+    # it behind the gap rather than reject it as this test chain does.
+    with patch.object(
+        web3.eth, "send_raw_transaction", wraps=web3.eth.send_raw_transaction
+    ) as send:
+        future = manager.submit(
+            "addBootnodes", chain.contract.functions.addBootnodes(["/ip4/127.0.0.2"])
+        )
+        receipt = future.result(timeout=30)
+    assert send.call_count == 1
+    assert web3.eth.get_transaction(receipt["transactionHash"])["nonce"] == 0
+
+
+def make_response(status_code, body=None):
+    response = MagicMock(status_code=status_code)
+    response.json.return_value = body
+    if status_code >= 400:
+        response.raise_for_status.side_effect = requests.exceptions.HTTPError(
+            response=response
+        )
+    return response
+
+
+@patch("hivemind_exp.chain_utils.time.sleep")
+def test_send_via_api_retries_transient_failures(sleep):
+    session = MagicMock()
+    session.post.side_effect = [
+        requests.exceptions.ConnectionError("reset"),
+        make_response(503),
+        make_response(200, {"ok": True}),
+    ]
+
+    assert send_via_api("org", "submit-winner", {"roundNumber": 1}, session=session) == {
+        "ok": True
+    }
+    assert session.post.call_count == 3
+    assert sleep.call_count == 2
+    assert session.post.call_args[1]["timeout"] > 0
+    assert session.post.call_args[1]["json"] == {"orgId": "org", "roundNumber": 1}
+
+
+@patch("hivemind_exp.chain_utils.time.sleep")
+def test_send_via_api_does_not_retry_client_errors(sleep):
+    session = MagicMock()
+    session.post.return_value = make_response(400)
+
+    with pytest.raises(requests.exceptions.HTTPError):
+        send_via_api("org", "register-peer", {"peerId": "QmPeer"}, session=session)
+    assert session.post.call_count == 1
+    sleep.assert_not_called()
+
+
+def test_modal_submit_winners_does_not_block():
+    release = threading.Event()
+
+    with patch("hivemind_exp.chain_utils.send_via_api") as send:
+        send.side_effect = lambda *args: release.wait(timeout=5)
+        with patch.object(ModalSwarmCoordinator, "coordinator_contract"):
+            coordinator = ModalSwarmCoordinator("org", web3=MagicMock())
+
+        future = coordinator.submit_winners(1, ["QmPeer"])
+        assert not future.done()
+        release.set()
+        future.result(timeout=5)
+
+    send.assert_called_once_with(
+        "org", "submit-winner", {"roundNumber": 1, "winners": ["QmPeer"]}
+    )
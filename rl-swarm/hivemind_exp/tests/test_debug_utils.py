@@ -0,0 +1,40 @@
+import threading
+
+import pytest
+
+pytest.importorskip("psutil")
+
+from hivemind_exp.debug_utils import PhaseTimer
+
+
+def test_phase_timer_records_phases():
+    timer = PhaseTimer()
+    with timer.phase("first"):
+        pass
+    assert timer.timed("second", lambda x: x + 1)(1) == 2
+
+    assert [name for name, _, _ in timer.phases] == ["first", "second"]
+    assert all(duration >= 0 for _, _, duration in timer.phases)
+    report = timer.report()
+    assert "first" in report and "second" in report
+
+
+def test_phase_timer_concurrent_phases():
+    timer = PhaseTimer()
+    threads = [
+        threading.Thread(target=timer.timed(f"phase {i}", lambda: None)) for i in range(8)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert sorted(name for name, _, _ in timer.phases) == [f"phase {i}" for i in range(8)]
+
+
+def test_phase_timer_records_failed_phase():
+    timer = PhaseTimer()
+    with pytest.raises(ValueError):
+        with timer.phase("broken"):
+            raise ValueError()
+    assert timer.phases[0][0] == "broken"
@@ -0,0 +1,58 @@
+import socket
+
+import pytest
+
+torch = pytest.importorskip("torch")
+import torch.multiprocessing as mp
+
+from hivemind_exp.dist_utils import DistributedContext
+
+
+def test_single_process_collectives_are_identity(monkeypatch):
+    monkeypatch.delenv("RANK", raising=False)
+    monkeypatch.delenv("WORLD_SIZE", raising=False)
+    ctx = DistributedContext.from_env()
+
+    assert ctx.is_main
+    assert not ctx.is_distributed
+    assert ctx.broadcast_object("x") == "x"
+    assert ctx.gather_object("x") == ["x"]
+    assert ctx.all_gather_object("x") == ["x"]
+    ctx.barrier()
+
+
+def test_distributed_requires_process_group():
+    with pytest.raises(RuntimeError):
+        DistributedContext(rank=0, world_size=2)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _worker(rank, world_size, port, results):
+    torch.distributed.init_process_group(
+        "gloo", init_method=f"tcp://127.0.0.1:{port}", rank=rank, world_size=world_size
+    )
+    try:
+        ctx = DistributedContext.from_env()
+        broadcast = ctx.broadcast_object({"stage": 1} if ctx.is_main else None)
+        gathered = ctx.gather_object(rank * 10)
+        everyone = ctx.all_gather_object(rank)
+        ctx.barrier()
+        results[rank] = (ctx.is_main, broadcast, gathered, everyone)
+    finally:
+        torch.distributed.destroy_process_group()
+
+
+def test_collectives_across_processes():
+    world_size = 2
+    with mp.Manager() as manager:
+        results = manager.dict()
+        mp.spawn(_worker, args=(world_size, _free_port(), results), nprocs=world_size)
+        results = dict(results)
+
+    assert results[0] == (True, {"stage": 1}, [0, 10], [0, 1])
+    assert results[1] == (False, {"stage": 1}, None, [0, 1])
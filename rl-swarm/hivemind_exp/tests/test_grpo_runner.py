@@ -0,0 +1,58 @@
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+from datasets import Dataset
+from transformers import AutoModelForCausalLM, AutoTokenizer
+from trl import GRPOConfig, GRPOTrainer, ModelConfig, TrlParser
+
+from hivemind_exp.dist_utils import DistributedContext
+from hivemind_exp.runner.batch_tuning import DEFAULT_BATCH_SIZE
+from hivemind_exp.runner.grpo_runner import GRPOArguments, GRPORunner
+
+TEST_MODEL_NAME = "trl-internal-testing/tiny-Qwen2ForCausalLM-2.5"
+CONFIGS_DIR = Path(__file__).parents[1] / "configs"
+
+
+def parse_config(path, *args):
+    parser = TrlParser((ModelConfig, GRPOArguments, GRPOConfig))
+    return parser.parse_args_and_config(["--config", str(path), *args])
+
+
+@pytest.mark.parametrize("platform", ["gpu", "mac"])
+def test_shipped_config_builds_trainer(tmp_path, platform):
+    _, grpo_args, training_args = parse_config(
+        CONFIGS_DIR / platform / "grpo-qwen-2.5-0.5b-deepseek-r1.yaml",
+        # Run on CPU.
+        *("--output_dir", str(tmp_path), "--use_vllm", "false", "--bf16", "false"),
+        *("--tf32", "false", "--report_to", "none"),
+    )
+    model = AutoModelForCausalLM.from_pretrained(TEST_MODEL_NAME)
+    GRPORunner().configure_batch_size(grpo_args, training_args, model, DistributedContext())
+
+    GRPOTrainer(
+        model=model,
+        reward_funcs=lambda completions, **kwargs: [0.0] * len(completions),
+        args=training_args,
+        train_dataset=Dataset.from_list([{"prompt": "What is 1 + 1?"}]),
+        processing_class=AutoTokenizer.from_pretrained(TEST_MODEL_NAME),
+    )
+
+
+def test_config_batch_size_falls_back_when_generations_do_not_divide(tmp_path):
+    grpo_args = GRPOArguments(batch_size="config")
+    training_args = GRPOConfig(
+        output_dir=str(tmp_path), per_device_train_batch_size=1, num_generations=8
+    )
+    GRPORunner().configure_batch_size(grpo_args, training_args, None, DistributedContext())
+    assert training_args.per_device_train_batch_size == DEFAULT_BATCH_SIZE
+    assert training_args.num_generations == DEFAULT_BATCH_SIZE
+
+    training_args = GRPOConfig(
+        output_dir=str(tmp_path), per_device_train_batch_size=4, num_generations=8
+    )
+    # 2 ranks x 4 completions hold one group of 8.
+    dist = SimpleNamespace(world_size=2)
+    GRPORunner().configure_batch_size(grpo_args, training_args, None, dist)
+    assert training_args.per_device_train_batch_size == 4
+    assert training_args.num_generations == 8
@@ -37,6 +37,7 @@ from hivemind_exp.trainer.hivemind_grpo_trainer import (
     HivemindGRPOTrainer,
     get_dht_value,
 )
+from hivemind_exp.wire_utils import decode_stage_outputs
 
 TEST_MODEL_NAME = "trl-internal-testing/tiny-Qwen2ForCausalLM-2.5"
 
@@ -244,7 +245,7 @@ def test_gsm8k_stage_data(tmp_path):
 
     def check_outputs(outputs: dict[str, tuple] | None, output_checks={}):
         assert outputs
-        qo = outputs[QUESTION][1]
+        qo = decode_stage_outputs(outputs)[QUESTION][1]
         assert qo["question"] == QUESTION
         assert qo["answer"] == "42"
         for k, check in output_checks.items():
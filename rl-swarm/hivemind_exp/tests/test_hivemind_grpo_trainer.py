@@ -3,6 +3,7 @@ import math
 from collections import defaultdict
 from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from unittest.mock import MagicMock
 
 import hivemind
 import pytest
@@ -20,7 +21,9 @@ from hivemind_exp.tests.fake_data import CK, QUESTION, QUESTION_HASH, RSK, SAMPL
 from hivemind_exp.trainer.hivemind_grpo_trainer import (
     HivemindGRPOTrainer,
     get_dht_value,
+    merge_rank_outputs,
 )
+from hivemind_exp.wire_utils import decode_stage_outputs
 
 
 def dummy_reward_func(node: HivemindNode, prompts, completions, **kwargs) -> list[int]:
@@ -158,6 +161,46 @@ def test_single_node_multi_stage(tmp_path):
     assert completions == {"merged_0": True}
 
 
+def test_single_node_multi_stage_reuses_trainer(tmp_path):
+    node = HivemindNode.coordinator("test", CK)
+    stage_calls = defaultdict(int)
+    trainers = []
+
+    def reward_func(stage):
+        def fn(**kwargs):
+            stage_calls[stage] += 1
+            return dummy_reward_func(node, **kwargs)
+
+        return fn
+
+    def datasets_fn(r, s):
+        trainers.append(trainer.trainer)
+        return SAMPLES, SAMPLES
+
+    dht, trainer = create_dht_and_trainer(
+        tmp_path,
+        node,
+        StageData(
+            max_rounds=1,
+            round_winner_fn=lambda: [CK],
+            stages=[
+                SingleStageData(
+                    name=str(i),
+                    reward_funcs=[reward_func(i)],
+                    datasets_fn=datasets_fn,  # type: ignore
+                )
+                for i in range(3)
+            ],
+        ),
+    )
+    trainer.train()
+
+    # Built by stage 0, then reused with each stage's reward functions.
+    assert trainers[0] is None
+    assert trainers[1] is trainers[2] is trainer.trainer
+    assert set(stage_calls) == {0, 1, 2}
+
+
 ##############
 # MULTI NODE #
 ##############
@@ -209,7 +252,7 @@ def test_multi_node_single_stage(tmp_path):
     for r, s in itertools.product([0], [0]):
         outputs = get_dht_value(dht0, key=outputs_key(node0.key, r, s), latest=True)
         assert outputs
-        assert outputs[QUESTION_HASH][1] == {"question": QUESTION}
+        assert decode_stage_outputs(outputs)[QUESTION_HASH][1] == {"question": QUESTION}
 
         rewards = get_dht_value(dht0, key=rewards_key(r, s), latest=True)
         assert rewards
@@ -292,7 +335,7 @@ def test_multi_node_multi_stage(tmp_path):
     for r, s in itertools.product(range(1), range(3)):
         outputs = get_dht_value(dht0, key=outputs_key(node0.key, r, s), latest=False)
         assert outputs
-        assert outputs[QUESTION_HASH][1] == {"question": QUESTION}
+        assert decode_stage_outputs(outputs)[QUESTION_HASH][1] == {"question": QUESTION}
 
         rewards = get_dht_value(dht0, key=rewards_key(r, s), latest=False)
         assert rewards
@@ -305,3 +348,32 @@ def test_multi_node_multi_stage(tmp_path):
         assert len(leaderboard) == 2
         assert leaderboard[0][0] == CK
         assert math.isclose(leaderboard[0][1], 2.0 * max_steps)
+
+
+def test_merge_rank_outputs():
+    q1 = {"question": "q1", "agent_answers": {CK: "a"}}
+    q1_better = {"question": "q1", "agent_answers": {CK: "b"}}
+    q2 = {"question": "q2", "agent_answers": {CK: "c"}}
+
+    merged = merge_rank_outputs(
+        [(q1, [1.0, 0.0]), (q1_better, [2.0]), (q2, [0.5]), ({}, [])]
+    )
+    assert merged == [(q1_better, [2.0]), (q2, [0.5])]
+
+
+def test_publish_outputs_averages_rewards_over_ranks():
+    node = HivemindNode.coordinator("test", CK)
+    trainer = HivemindGRPOTrainer.PublishingGRPOTrainer.__new__(
+        HivemindGRPOTrainer.PublishingGRPOTrainer
+    )
+    trainer.node, trainer.dht, trainer.logger = node, MagicMock(), MagicMock()
+    trainer.stage_rewards, trainer.stage_outputs = 0.0, {}
+
+    # Two local ranks worked on different questions in the same step.
+    trainer.publish_outputs(
+        [({"question": "q1"}, [1.0, 1.0]), ({"question": "q2"}, [3.0, 1.0])]
+    )
+    assert trainer.stage_rewards == 3.0
+    rewards_store = trainer.dht.store.call_args_list[-1][1]
+    assert rewards_store["key"] == rewards_key(0, 0)
+    assert rewards_store["value"] == 3.0
@@ -0,0 +1,114 @@
+import pickle
+
+import pytest
+
+from hivemind_exp.hivemind_utils import HivemindNode, RoundCache
+
+PROMPT = "The following answers were given by other students: " * 8
+
+
+def outputs(i):
+    return (float(i), {"question": PROMPT, "answer": str(i) * 100})
+
+
+def test_node_stage_outputs():
+    node = HivemindNode("test", "key")
+    assert node.get_stage_outputs(0, 0) is None
+
+    node.put_stage_outputs(0, 0, "q1", outputs(1))
+    node.put_stage_outputs(0, 0, "q2", outputs(2))
+    assert node.get_stage_outputs(0, 0) == {"q1": outputs(1), "q2": outputs(2)}
+    assert (0, 0) in node.round_cache
+    assert [key for key, _ in node.round_cache.items()] == [(0, 0)]
+
+    node.clear_stage_cache()
+    assert node.get_stage_outputs(0, 0) is None
+    assert node.round_cache.total_bytes == 0
+
+
+def test_interns_long_strings():
+    cache = RoundCache()
+    cache.put(0, 0, "q1", (0.0, {"prompt": "".join(PROMPT)}))
+    cache.put(0, 1, "q1", (0.0, {"prompt": "".join(PROMPT)}))
+
+    assert cache[(0, 0)]["q1"][1]["prompt"] is cache[(0, 1)]["q1"][1]["prompt"]
+
+
+def test_replacing_entry_keeps_size():
+    cache = RoundCache()
+    cache.put(0, 0, "q1", outputs(1))
+    size = cache.total_bytes
+    cache.put(0, 0, "q1", outputs(2))
+    assert cache.total_bytes == size
+
+
+def test_spills_least_recently_used_round(tmp_path):
+    cache = RoundCache(spill_dir=str(tmp_path))
+    cache.put(0, 0, "q1", outputs(0))
+    cache.max_bytes = cache.total_bytes * 2
+
+    cache.put(1, 0, "q1", outputs(1))
+    cache[(0, 0)]  # Round 0 is now the most recently used.
+    cache.put(2, 0, "q1", outputs(2))
+
+    assert cache.is_spilled((1, 0))
+    assert not cache.is_spilled((0, 0))
+    assert cache.total_bytes <= cache.max_bytes
+    assert len(cache) == 3
+
+    # Spilled stages are loaded back transparently.
+    assert cache.get((1, 0)) == {"q1": outputs(1)}
+    assert not cache.is_spilled((1, 0))
+    assert cache.total_bytes <= cache.max_bytes
+
+
+def test_put_into_spilled_stage(tmp_path):
+    cache = RoundCache(max_bytes=0, spill_dir=str(tmp_path))
+    cache.put(0, 0, "q1", outputs(1))
+    cache.put(1, 0, "q1", outputs(1))
+    assert cache.is_spilled((0, 0))
+
+    cache.put(0, 0, "q2", outputs(2))
+    assert cache[(0, 0)] == {"q1": outputs(1), "q2": outputs(2)}
+    assert cache.keys() == [(0, 0), (1, 0)]
+
+    cache.clear()
+    assert len(cache) == 0
+    assert not list(tmp_path.iterdir())
+
+
+def test_spilled_stage_is_pickled(tmp_path):
+    cache = RoundCache(max_bytes=0, spill_dir=str(tmp_path))
+    cache.put(0, 0, "q1", outputs(1))
+    cache.put(1, 0, "q1", outputs(1))
+
+    [spill_dir] = tmp_path.iterdir()
+    [path] = spill_dir.iterdir()
+    with open(path, "rb") as f:
+        assert pickle.load(f) == {"q1": outputs(1)}
+
+
+def test_drops_least_recently_used_spilled_stages(tmp_path):
+    cache = RoundCache(max_bytes=0, spill_dir=str(tmp_path))
+    for r in range(3):
+        cache.put(r, 0, "q1", outputs(r))
+    cache.max_disk_bytes = cache.disk_bytes
+    cache[(0, 0)]  # Round 0 is now the most recently used.
+
+    cache.put(3, 0, "q1", outputs(3))
+    assert cache.keys() == [(0, 0), (2, 0), (3, 0)]
+    assert cache.disk_bytes <= cache.max_disk_bytes
+    [spill_dir] = tmp_path.iterdir()
+    assert len(list(spill_dir.iterdir())) == 2
+
+
+def test_reads_are_read_only():
+    cache = RoundCache()
+    cache.put(0, 0, "q1", outputs(1))
+    size = cache.total_bytes
+
+    stage = cache[(0, 0)]
+    with pytest.raises(TypeError):
+        stage["q2"] = outputs(2)
+    assert cache[(0, 0)] == {"q1": outputs(1)}
+    assert cache.total_bytes == size
@@ -0,0 +1,120 @@
+import shutil
+import threading
+
+from hivemind_exp.hub_utils import HubUploader
+
+
+class LocalHub:
+    """Stands in for the Hub by copying uploaded folders into a local directory."""
+
+    def __init__(self, root, fail_times=0):
+        self.root = root
+        self.fail_times = fail_times
+        self.uploads = []
+        self.gate = threading.Event()
+        self.gate.set()
+        self.started = threading.Event()
+
+    def upload(self, folder):
+        self.started.set()
+        self.gate.wait()
+        if self.fail_times:
+            self.fail_times -= 1
+            raise ConnectionError("connection reset")
+
+        dest = self.root / str(len(self.uploads))
+        shutil.copytree(folder, dest)
+        self.uploads.append(dest)
+
+
+def write_checkpoint(path, content):
+    path.mkdir(exist_ok=True)
+    (path / "model.safetensors").write_text(content)
+    (path / "trainer_state.json").write_text("{}")
+    (path / "checkpoint-500").mkdir(exist_ok=True)
+    (path / "checkpoint-500" / "optimizer.pt").write_text("state")
+    (path / "_private").write_text("")
+
+
+def test_uploads_snapshot_in_background(tmp_path):
+    hub = LocalHub(tmp_path / "hub")
+    checkpoint = tmp_path / "out"
+    write_checkpoint(checkpoint, "round 0")
+
+    uploader = HubUploader(hub.upload, staging_dir=str(tmp_path))
+    hub.gate.clear()
+    uploader.submit(str(checkpoint), "round 0")
+
+    # The trainer keeps writing once the checkpoint is staged, while the upload is in flight.
+    uploader.wait_staged()
+    write_checkpoint(checkpoint, "round 1")
+    hub.gate.set()
+    uploader.close()
+
+    [upload] = hub.uploads
+    assert (upload / "model.safetensors").read_text() == "round 0"
+    # Same files as Trainer.push_to_hub.
+    assert (upload / "trainer_state.json").exists()
+    assert not (upload / "checkpoint-500").exists()
+    assert not (upload / "_private").exists()
+    assert uploader.uploaded == 1
+    assert not list(tmp_path.glob("hub_upload_*"))  # Staging cleaned up.
+
+
+def test_drops_superseded_checkpoints(tmp_path):
+    hub = LocalHub(tmp_path / "hub")
+    checkpoint = tmp_path / "out"
+    uploader = HubUploader(hub.upload, staging_dir=str(tmp_path))
+
+    hub.gate.clear()
+    write_checkpoint(checkpoint, "round 0")
+    uploader.submit(str(checkpoint), "round 0")
+    hub.started.wait(5)
+    for r in (1, 2, 3):
+        uploader.wait_staged()
+        write_checkpoint(checkpoint, f"round {r}")
+        uploader.submit(str(checkpoint), f"round {r}")
+
+    hub.gate.set()
+    uploader.close()
+
+    contents = [(u / "model.safetensors").read_text() for u in hub.uploads]
+    assert contents == ["round 0", "round 3"]
+    assert uploader.dropped == 2
+
+
+def test_retries_failed_upload(tmp_path):
+    hub = LocalHub(tmp_path / "hub", fail_times=2)
+    checkpoint = tmp_path / "out"
+    write_checkpoint(checkpoint, "round 0")
+
+    uploader = HubUploader(hub.upload, retry_backoff=0, staging_dir=str(tmp_path))
+    uploader.submit(str(checkpoint), "round 0")
+    uploader.close()
+
+    assert len(hub.uploads) == 1
+    assert uploader.uploaded == 1 and uploader.failed == 0
+
+
+def test_gives_up_after_max_attempts(tmp_path):
+    hub = LocalHub(tmp_path / "hub", fail_times=5)
+    checkpoint = tmp_path / "out"
+    write_checkpoint(checkpoint, "round 0")
+
+    uploader = HubUploader(hub.upload, max_attempts=2, retry_backoff=0, staging_dir=str(tmp_path))
+    uploader.submit(str(checkpoint), "round 0")
+    uploader.close()
+
+    assert not hub.uploads
+    assert uploader.failed == 1
+
+
+def test_staging_failure_is_reported(tmp_path):
+    hub = LocalHub(tmp_path / "hub")
+    uploader = HubUploader(hub.upload, staging_dir=str(tmp_path))
+    uploader.submit(str(tmp_path / "missing"), "round 0")
+    uploader.close()
+
+    assert not hub.uploads
+    assert uploader.failed == 1
+    assert not list(tmp_path.glob("hub_upload_*"))
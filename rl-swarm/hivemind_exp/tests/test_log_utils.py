@@ -0,0 +1,47 @@
+import logging
+
+from hivemind_exp.log_utils import BufferedRotatingFileHandler, start_file_logging
+
+
+def make_record(msg):
+    return logging.LogRecord("test", logging.INFO, __file__, 1, msg, None, None)
+
+
+def test_buffered_handler_batches_and_flushes_on_close(tmp_path):
+    path = tmp_path / "log.txt"
+    handler = BufferedRotatingFileHandler(str(path), flush_interval=3600)
+    for i in range(3):
+        handler.emit(make_record(f"line {i}"))
+    assert path.read_text() == ""
+
+    handler.close()
+    assert path.read_text() == "line 0\nline 1\nline 2\n"
+
+
+def test_buffered_handler_rotates(tmp_path):
+    path = tmp_path / "log.txt"
+    handler = BufferedRotatingFileHandler(str(path), max_bytes=20, backup_count=2, flush_interval=0)
+    for i in range(4):
+        handler.emit(make_record(f"line {i} ......"))
+    handler.close()
+
+    assert path.read_text() == "line 3 ......\n"
+    assert (tmp_path / "log.txt.1").read_text() == "line 2 ......\n"
+    assert (tmp_path / "log.txt.2").read_text() == "line 1 ......\n"
+
+
+def test_start_file_logging(tmp_path):
+    path = tmp_path / "log.txt"
+    logger = logging.getLogger("test_start_file_logging")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    # hivemind renames the level names, so match on the level numbers.
+    listener = start_file_logging(
+        str(path), logging.Formatter("%(levelno)s:%(message)s"), logger=logger
+    )
+
+    logger.info("hello")
+    logger.warning("world")
+    listener.stop()
+
+    assert path.read_text() == f"{logging.INFO}:hello\n{logging.WARNING}:world\n"
@@ -1,4 +1,14 @@
-from hivemind_exp.name_utils import get_name_from_peer_id, search_peer_ids_for_name
+import hashlib
+
+from hivemind_exp.name_utils import (
+    ADJECTIVES,
+    ANIMALS,
+    PeerNameIndex,
+    get_name_from_peer_id,
+    get_names_from_peer_ids,
+    hex_to_ints,
+    search_peer_ids_for_name,
+)
 
 TEST_PEER_IDS = [
     "QmYyQSo1c1Ym7orWxLYvCrM2EmxFTANf8wXmmE7DWjhx5N",
@@ -17,7 +27,49 @@ def test_get_name_from_peer_id():
     assert get_name_from_peer_id(TEST_PEER_IDS[-1], True) == "toothy_carnivorous_bison"
 
 
+def test_get_names_from_peer_ids():
+    peer_ids = TEST_PEER_IDS + [TEST_PEER_IDS[0]] + [f"Qm{i}" for i in range(500)]
+    assert get_names_from_peer_ids(peer_ids) == [
+        get_name_from_peer_id(peer_id) for peer_id in peer_ids
+    ]
+    assert get_names_from_peer_ids(TEST_PEER_IDS[-1:], True) == [
+        "toothy_carnivorous_bison"
+    ]
+
+
+def test_names_match_hex_encoding():
+    # Names were originally derived from the hex digest; keep them stable.
+    for peer_id in [f"Qm{i}" for i in range(500)]:
+        ints = hex_to_ints(hashlib.md5(peer_id.encode()).hexdigest(), 2)
+        expected = (
+            f"{ADJECTIVES[ints[2] % len(ADJECTIVES)]} "
+            f"{ADJECTIVES[ints[1] % len(ADJECTIVES)]} "
+            f"{ANIMALS[ints[0] % len(ANIMALS)]}"
+        )
+        assert get_name_from_peer_id(peer_id) == expected
+
+
 def test_search_peer_ids_for_name():
     names = ["none", "not an animal", "toothy carnivorous bison"]
     results = [search_peer_ids_for_name(TEST_PEER_IDS, name) for name in names]
     assert results == [None, None, "Qmb8wVVVMTRmG4U1tCdaCCqietuWwpGRSbL53PA5azBViP"]
+
+
+def test_peer_name_index():
+    index = PeerNameIndex()
+    index.add(TEST_PEER_IDS[:2])
+    index.add(TEST_PEER_IDS)  # Re-adding known IDs is a no-op.
+    assert len(index) == 3
+    assert index.lookup("toothy carnivorous bison") == [TEST_PEER_IDS[2]]
+    assert index.lookup("not an animal") == []
+    assert index.lookup_many(["singing keen cow", "none"]) == {
+        "singing keen cow": [TEST_PEER_IDS[1]],
+        "none": [],
+    }
+
+
+def test_peer_name_index_collisions():
+    index = PeerNameIndex()
+    other = "QmCollision157176"  # Also "thorny fishy meerkat".
+    index.add([TEST_PEER_IDS[0], other])
+    assert index.lookup("thorny fishy meerkat") == [TEST_PEER_IDS[0], other]
@@ -0,0 +1,107 @@
+from hivemind_exp.gsm8k.prompt_packing import PromptPacker, trim_think
+
+
+class WordTokenizer:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, text, add_special_tokens=True):
+        self.calls += 1
+        return {"input_ids": text.split()}
+
+
+def response(think, answer):
+    return f"<think>\n{think}\n</think>\n<answer>\n{answer}\n</answer>"
+
+
+def test_trim_think():
+    assert trim_think(response("a b c", "42")) == "<answer>\n42\n</answer>"
+    assert trim_think("<think> unclosed <answer>42</answer>") == "<answer>42</answer>"
+    assert trim_think("no tags") == "no tags"
+
+
+def test_everything_fits():
+    packer = PromptPacker(WordTokenizer(), max_tokens=100)
+    candidates = [response("x", "1"), response("y", "2")]
+    assert packer.pack("header", candidates) == candidates
+    assert packer.packing_ratio == 1.0
+
+
+def test_trims_lowest_ranked_first():
+    packer = PromptPacker(WordTokenizer(), max_tokens=13)
+    best, worst = response("a b c d", "1"), response("e f g h", "2")
+
+    # 1 + 9 + 9 tokens; trimming the worst response saves 6.
+    assert packer.pack("header", [best, worst]) == [best, trim_think(worst)]
+    assert packer.packing_ratio == 12 / 18
+
+
+def test_drops_after_trimming():
+    packer = PromptPacker(WordTokenizer(), max_tokens=4)
+    candidates = [response("a", "1"), response("b", "2"), response("c", "3")]
+    packed = packer.pack("header", candidates, item_overhead="said")
+    assert packed == [trim_think(candidates[0]), None, None]
+
+
+def test_keeps_min_items():
+    packer = PromptPacker(WordTokenizer(), max_tokens=1)
+    packed = packer.pack("a long header", [response("a", "1"), response("b", "2")])
+    assert packed[0] == trim_think(response("a", "1"))
+    assert packed[1] is None
+
+
+def test_token_counts_cached():
+    tokenizer = WordTokenizer()
+    packer = PromptPacker(tokenizer, max_tokens=100)
+    candidates = [response("x", "1")] * 3
+    packer.pack("header", candidates)
+    packer.pack("header", candidates)
+    assert tokenizer.calls == 2
+
+    packer.reset_stats()
+    assert packer.packing_ratio == 1.0
+
+
+class TemplateTokenizer(WordTokenizer):
+    def apply_chat_template(self, messages, tokenize=False, add_generation_prompt=False):
+        text = " ".join(f"<{m['role']}> {m['content']} </{m['role']}>" for m in messages)
+        return text + (" <assistant>" if add_generation_prompt else "")
+
+
+def test_budget_excludes_template():
+    packer = PromptPacker(TemplateTokenizer(), max_tokens=20)
+    # <system> be kind </system> <user> </user> <assistant>
+    assert packer.budget("be kind") == 20 - 7
+    assert PromptPacker(WordTokenizer(), max_tokens=20).budget("be kind") == 18
+
+
+def test_extras_count_against_budget():
+    packer = PromptPacker(WordTokenizer(), max_tokens=6)
+    packed = packer.pack("header", ["a", "b", "c"], extras=["x y", "x y", "x y"])
+    assert packed == ["a", None, None]
+
+
+def test_stage3_prompt_fits_budget_with_several_opinions():
+    from hivemind_exp.gsm8k.generate_prompts import generate_stage3_user_prompt
+
+    therapists = "".join(
+        f"<therapist>Therapist #{i}</therapist> said \n"
+        + response(" ".join(["step"] * 40), "answer")
+        + "\n\n\n"
+        for i in range(4)
+    )
+    datum = {
+        "question": "How do I sleep better?",
+        "answer": "rest",
+        "stage2_prompt": "The client concern we received is: How do I sleep better?  \n\n"
+        "The following therapeutic responses were provided: \n" + therapists,
+    }
+    for i in range(4):
+        datum[f"agent_opinion_{i}"] = (
+            f"**Key point** Therapist #{i} was kind.\n\n<identify>\n{i}\n</identify>"
+        )
+
+    packer = PromptPacker(TemplateTokenizer(), max_tokens=150)
+    prompt = generate_stage3_user_prompt(datum, list(datum), packer, "be kind")
+    assert len(prompt.split()) <= packer.budget("be kind")
+    assert prompt.count("<supervisor>") > 1
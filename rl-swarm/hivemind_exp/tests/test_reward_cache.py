@@ -0,0 +1,122 @@
+import hivemind_exp.gsm8k.stage1_rewards as stage1_rewards
+import hivemind_exp.gsm8k.stage2_rewards as stage2_rewards
+from hivemind_exp.gsm8k.reward_cache import RewardCache, memoized
+from hivemind_exp.hivemind_utils import HivemindNode
+
+GOOD = "<think>\nadd them\n</think>\n<answer>\n4\n</answer>\n"
+BAD = "four"
+
+
+def completions(*texts):
+    return [[{"role": "assistant", "content": t}] for t in texts]
+
+
+def prompts(n, question="What is 2 + 2?"):
+    return [[{"role": "system", "content": "sys"}, {"role": "user", "content": question}]] * n
+
+
+def test_memoize_matches_uncached():
+    cache = RewardCache()
+    fn = cache.memoize(stage1_rewards.correctness_reward_func)
+    batch = completions(GOOD, BAD, GOOD)
+    answer = ["4"] * 3
+
+    expected = stage1_rewards.correctness_reward_func(prompts(3), batch, answer)
+    assert fn(prompts(3), batch, answer) == expected
+    assert fn(prompts(3), batch, answer) == expected
+    assert cache.hits["stage1_rewards.correctness_reward_func"] == 3
+    assert cache.misses["stage1_rewards.correctness_reward_func"] == 3
+
+
+def test_memoize_only_computes_misses():
+    calls = []
+
+    def reward_func(completions, weighting=1.0, **kwargs):
+        calls.append(len(completions))
+        return [len(c[0]["content"]) * weighting for c in completions]
+
+    cache = RewardCache()
+    fn = cache.memoize(reward_func)
+    assert fn(completions("a", "bb")) == [1.0, 2.0]
+    assert fn(completions("bb", "ccc")) == [2.0, 3.0]
+    assert calls == [2, 1]
+
+    # Scalar arguments are part of the key.
+    assert fn(completions("a"), weighting=2.0) == [2.0]
+    assert calls == [2, 1, 1]
+
+
+def test_key_includes_prompt_and_answer():
+    cache = RewardCache()
+    fn = cache.memoize(stage1_rewards.correctness_reward_func)
+    batch = completions(GOOD)
+
+    assert fn(prompts(1), batch, ["4"]) == [2.0]
+    assert fn(prompts(1), batch, ["5"]) == [0.0]
+    assert fn(prompts(1, "What is 1 + 3?"), batch, ["4"]) == [2.0]
+    assert cache.hits["stage1_rewards.correctness_reward_func"] == 0
+
+
+def test_lru_eviction():
+    cache = RewardCache(max_entries=2)
+    fn = cache.memoize(stage1_rewards.xmlcount_reward_func)
+    fn(completions("a", "b", "c"))
+    assert len(cache) == 2
+
+    fn(completions("a"))
+    assert cache.hits["stage1_rewards.xmlcount_reward_func"] == 0
+    fn(completions("c"))
+    assert cache.hits["stage1_rewards.xmlcount_reward_func"] == 1
+
+
+def test_memoized_without_cache():
+    fn = stage1_rewards.int_reward_func
+    assert memoized(None, fn) is fn
+    cache = RewardCache()
+    assert memoized(cache, fn) is memoized(cache, fn)
+
+
+def test_hivemind_cumulative_reward_uses_node_cache():
+    node = HivemindNode("model", "key")
+    node.reward_cache = RewardCache()
+    batch = completions(GOOD, BAD)
+
+    stage1_rewards.hivemind_cumulative_reward(node, prompts=prompts(2), completions=batch, answer=["4", "4"])
+    first = list(node.rewards)
+    stage1_rewards.hivemind_cumulative_reward(node, prompts=prompts(2), completions=batch, answer=["4", "4"])
+
+    assert node.rewards == first
+    assert set(node.reward_cache.hit_rates().values()) == {0.5}
+    assert "stage1_rewards.correctness_reward_func" in node.reward_cache.summary()
+
+
+def test_stage2_correctness_matches_uncached():
+    prompt = "<student>0</student> said\n<think>\nx\n</think>\n<answer>\n4\n</answer>\n"
+    p = prompts(2, prompt)
+    batch = completions("<identify>\nNone\n</identify>", "<identify>\n0\n</identify>")
+    answer = ["4", "4"]
+
+    fn = RewardCache().memoize(stage2_rewards.correctness_reward_func)
+    expected = stage2_rewards.correctness_reward_func(p, batch, answer, logging=False)
+    assert fn(p, batch, answer, logging=False) == expected
+    assert fn(p, batch[1:], answer, logging=False) == expected[1:]
+
+
+def test_partial_hit_with_mixed_answers():
+    seen = []
+
+    def reward_func(prompts, completions, answer, **kwargs):
+        seen.append(kwargs["source"])
+        return stage1_rewards.correctness_reward_func(prompts, completions, answer)
+
+    one, two = GOOD.replace("4", "1"), GOOD.replace("4", "2")
+    p = prompts(2, "What is 0 + 1?") + prompts(2, "What is 0 + 2?")
+    batch = completions(one, one, two, two)
+    answer = ["1", "1", "2", "2"]
+    source = ["a", "b", "c", "d"]
+
+    fn = RewardCache().memoize(reward_func)
+    assert fn(p[:1], batch[:1], answer[:1], source=source[:1]) == [2.0]
+    assert fn(p, batch, answer, source=source) == [2.0] * 4
+    # The second completion repeats the first; the misses keep their own columns.
+    assert seen == [["a"], ["c", "d"]]
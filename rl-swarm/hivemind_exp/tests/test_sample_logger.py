@@ -0,0 +1,67 @@
+import os
+import threading
+
+import hivemind_exp.gsm8k.stage1_rewards as stage1_rewards
+from hivemind_exp.gsm8k.sample_logger import SampleLogger, sample_logger
+
+
+def test_log_formats_on_writer_thread(tmp_path):
+    logger = SampleLogger(str(tmp_path))
+    threads = []
+
+    def format_fn():
+        threads.append(threading.current_thread())
+        return "record"
+
+    assert logger.log("samples", "a.txt", format_fn)
+    logger.flush()
+    logger.close()
+
+    assert threads and threads[0] is not threading.current_thread()
+    with open(tmp_path / "samples" / "a.txt") as f:
+        assert f.read() == "record"
+    assert logger.written == 1
+
+
+def test_rotation(tmp_path):
+    logger = SampleLogger(str(tmp_path), max_bytes=10, backup_count=2)
+    for i in range(4):
+        logger.log("samples", "a.txt", lambda i=i: str(i) * 6)
+    logger.close()
+
+    path = tmp_path / "samples" / "a.txt"
+    assert path.read_text() == "333333"
+    assert (tmp_path / "samples" / "a.txt.1").read_text() == "222222"
+    assert (tmp_path / "samples" / "a.txt.2").read_text() == "111111"
+    assert not os.path.exists(f"{path}.3")
+
+
+def test_full_queue_drops(tmp_path):
+    logger = SampleLogger(str(tmp_path), queue_size=1)
+    release = threading.Event()
+    logger.log("samples", "a.txt", lambda: release.wait() and "")
+    # The writer may or may not have taken the first record yet.
+    results = [logger.log("samples", "a.txt", lambda: "x") for _ in range(3)]
+    release.set()
+    logger.close()
+
+    assert not all(results)
+    assert logger.dropped == results.count(False)
+
+
+def test_sampling_rate():
+    assert not SampleLogger(rate=0).should_sample()
+    assert SampleLogger(rate=1).should_sample()
+
+
+def test_reward_func_logs_through_sample_logger(monkeypatch, tmp_path):
+    monkeypatch.setattr(sample_logger, "rate", 1.0)
+    monkeypatch.setattr(sample_logger, "root", str(tmp_path))
+    prompts = [[{"role": "user", "content": "What is 2 + 2?"}]]
+    completions = [[{"role": "assistant", "content": "<answer>\n4\n</answer>"}]]
+
+    stage1_rewards.correctness_reward_func(prompts, completions, ["4"], logging=True)
+    sample_logger.flush()
+
+    (log_file,) = tmp_path.glob("*/correctness_samples.txt")
+    assert "What is 2 + 2?" in log_file.read_text()
@@ -12,3 +12,28 @@ def test_merge_stage1():
 def test_merge_stage2():
     merged = merge_stage2_question(STAGE_2_OUTPUTS)
     assert merged == STAGE_2_MERGED
+
+
+def test_streaming_merger_caps_contributors():
+    merger = StreamingStageMerger(lambda o: sorted(o), max_contributors=2)
+    assert not merger.saturated()
+
+    assert merger.add("q1", "a", {})
+    assert merger.add("q2", "a", {})
+    assert merger.add("q1", "b", {})
+    assert merger.is_full("q1")
+    assert not merger.add("q1", "c", {})  # Capped.
+    assert not merger.saturated()
+
+    assert merger.add("q2", "c", {})
+    assert merger.saturated()
+    assert merger.finish() == [["a", "b"], ["a", "c"]]
+
+
+def test_streaming_merger_finish_merges_pending():
+    merger = StreamingStageMerger(merge_stage1_question, max_contributors=10)
+    for node_key, outputs in STAGE_1_OUTPUTS.items():
+        merger.add("q", node_key, outputs)
+
+    assert not merger.saturated()
+    assert merger.finish() == [STAGE_1_MERGED]
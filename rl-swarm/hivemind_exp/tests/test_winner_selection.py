@@ -0,0 +1,56 @@
+import copy
+
+from hivemind_exp.gsm8k.winner_selection import score_final_outputs, top_peers
+from hivemind_exp.tests.fake_data import CK, STAGE_3_OUTPUTS
+
+
+def test_top_peers():
+    scores = {"a": 1.0, "b": 3.0, "c": 2.0, "d": 3.0}
+    assert top_peers(scores, 3) == ["d", "b", "c"]
+    assert top_peers(scores, 10) == ["d", "b", "c", "a"]
+    assert top_peers({}, 3) == []
+
+
+def test_score_final_outputs():
+    output = STAGE_3_OUTPUTS[CK]
+    wrong = copy.deepcopy(output)
+    wrong["final_agent_decision"] = {"other": "<answer>\n7\n</answer>"}
+    final_stage_outputs = [{CK: output, "other": wrong}]
+
+    scores = score_final_outputs(final_stage_outputs)
+    assert scores[CK] > scores["other"]
+    assert top_peers(scores, 1) == [CK]
+
+    # Scoring peers together matches scoring them one at a time.
+    assert scores == {
+        peer_id: score_final_outputs([{peer_id: o}])[peer_id]
+        for peer_id, o in final_stage_outputs[0].items()
+    }
+
+
+def test_score_final_outputs_all_wrong_matches_per_peer():
+    prompt = (
+        "The question we were given is: 2 + 2?  \n\n"
+        "The following answers to this question were suggested: \n"
+        "<student>Student #0</student> said \n<answer>\n4\n</answer>\n\n\n"
+        "<student>Student #1</student> said \n<answer>\n5\n</answer>\n\n\n"
+    )
+    final_stage_outputs = [
+        {
+            peer_id: {
+                "question": "2 + 2?",
+                "answer": "4",
+                "stage3_prompt": prompt,
+                "final_agent_decision": {
+                    peer_id: "<majority>\nAll answers are wrong\n</majority>\n<answer>\n4\n</answer>"
+                },
+            }
+            for peer_id in ("a", "b")
+        }
+    ]
+
+    scores = score_final_outputs(final_stage_outputs)
+    assert scores == {
+        peer_id: score_final_outputs([{peer_id: o}])[peer_id]
+        for peer_id, o in final_stage_outputs[0].items()
+    }
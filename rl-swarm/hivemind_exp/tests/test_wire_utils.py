@@ -0,0 +1,72 @@
+import pickle
+
+import pytest
+
+from hivemind_exp.tests.fake_data import (
+    QUESTION,
+    QUESTION_HASH,
+    STAGE_2_OUTPUTS,
+    STAGE_3_OUTPUTS,
+)
+from hivemind_exp.wire_utils import (
+    CODEC_NONE,
+    CODEC_ZLIB,
+    CODEC_ZSTD,
+    HEADER,
+    decode_outputs,
+    decode_stage_outputs,
+    encode_outputs,
+    is_encoded,
+)
+
+
+@pytest.mark.parametrize("outputs", list(STAGE_2_OUTPUTS.values()) + list(STAGE_3_OUTPUTS.values()))
+def test_round_trip(outputs):
+    value = (1234.5, outputs)
+    encoded = encode_outputs(value)
+    assert is_encoded(encoded)
+    assert decode_outputs(encoded) == value
+
+    # Prompts reference the question instead of repeating it, then get compressed.
+    assert len(encoded) < len(pickle.dumps(value))
+
+
+@pytest.mark.parametrize("codec", [CODEC_NONE, CODEC_ZLIB, CODEC_ZSTD])
+def test_codecs(codec):
+    if codec == CODEC_ZSTD:
+        pytest.importorskip("zstandard")
+
+    value = (0.0, {"question": QUESTION, "prompt": f"Q: {QUESTION} A:", "n": [1, 2.5, None, True]})
+    assert decode_outputs(encode_outputs(value, codec=codec)) == value
+
+
+def test_default_codec_is_zlib():
+    value = (0.0, {"question": QUESTION, "answers": [f"answer {i}" for i in range(100)]})
+    encoded = encode_outputs(value)
+    assert HEADER.unpack_from(encoded)[2] == CODEC_ZLIB
+
+
+def test_tuples_and_nested_values():
+    value = (1.0, {"question": QUESTION, "pairs": [("a", 1)], "nested": {"x": {"y": QUESTION * 2}}})
+    assert decode_outputs(encode_outputs(value)) == value
+
+
+def test_legacy_values_pass_through():
+    legacy = (1.0, {"question": QUESTION})
+    assert decode_outputs(legacy) == legacy
+    assert decode_stage_outputs({QUESTION_HASH: legacy}) == {QUESTION_HASH: legacy}
+    assert decode_stage_outputs(None) is None
+
+
+def test_mixed_formats():
+    old = (1.0, {"question": QUESTION, "answer": "42"})
+    new = (2.0, {"question": QUESTION, "answer": "sleep"})
+    outputs = {"old": old, "new": encode_outputs(new)}
+    assert decode_stage_outputs(outputs) == {"old": old, "new": new}
+
+
+def test_unsupported_version():
+    encoded = bytearray(encode_outputs((1.0, {"question": QUESTION})))
+    encoded[3] = 99
+    with pytest.raises(ValueError):
+        decode_outputs(bytes(encoded))
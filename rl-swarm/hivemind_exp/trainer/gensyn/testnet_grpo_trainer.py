@@ -1,11 +1,13 @@
-from typing import Sequence
+from typing import TYPE_CHECKING, Sequence
 
-from hivemind_exp.chain_utils import SwarmCoordinator
 from hivemind_exp.trainer.hivemind_grpo_trainer import HivemindGRPOTrainer
 
+if TYPE_CHECKING:
+    from hivemind_exp.chain_utils import SwarmCoordinator
+
 
 class TestnetGRPOTrainer(HivemindGRPOTrainer):
-    def __init__(self, coordinator: SwarmCoordinator, **kwargs) -> None:
+    def __init__(self, coordinator: "SwarmCoordinator", **kwargs) -> None:
         self.coordinator = coordinator
         super().__init__(**kwargs)
 
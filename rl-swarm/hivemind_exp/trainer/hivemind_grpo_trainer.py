@@ -11,9 +11,11 @@ import datasets
 import torch
 from hivemind.dht import DHT
 from hivemind.utils import get_dht_time
+from transformers import TrainerCallback
 from trl import GRPOConfig, GRPOTrainer
 
 from hivemind_exp.debug_utils import print_system_info
+from hivemind_exp.dist_utils import DistributedContext
 from hivemind_exp.dht_utils import (
     ROUND_STAGE_NUMBER_KEY,
     get_dht_value,
@@ -23,13 +25,70 @@ from hivemind_exp.dht_utils import (
     rewards_key,
 )
 from hivemind_exp.hivemind_utils import HivemindNode, StageData
+from hivemind_exp.hub_utils import HubUploader, hf_upload_fn
 from hivemind_exp.name_utils import get_name_from_peer_id
+from hivemind_exp.wire_utils import encode_outputs
 
 
 MAX_TRAIN_FAILS = 5
 CADENCE_OF_UPDATE_STEPS = 4
 
 
+def merge_rank_outputs(gathered):
+    """
+    Merges the (outputs, rewards) each local rank produced in a step.
+
+    Ranks may work on different questions. For each question, the outputs of
+    the rank with the highest reward are kept.
+
+    Returns:
+        A list of (outputs, rewards), one per question
+    """
+    best: dict[str, tuple[dict, list]] = {}
+    for outputs, rewards in gathered:
+        if not outputs or "question" not in outputs:
+            continue
+        question = outputs["question"]
+        if question not in best or max(rewards, default=0) > max(best[question][1], default=0):
+            best[question] = (outputs, rewards)
+    return list(best.values())
+
+
+class ThroughputCallback(TrainerCallback):
+    """Logs generated tokens per second from the completion lengths GRPOTrainer reports."""
+
+    def __init__(self, logger):
+        self.logger = logger
+        self._last_time = None
+        self._last_step = 0
+
+    def on_train_begin(self, args, state, control, **kwargs):
+        self._last_time = time.monotonic()
+        self._last_step = state.global_step
+
+    def on_log(self, args, state, control, logs=None, **kwargs):
+        if not logs or "completion_length" not in logs or self._last_time is None:
+            return
+
+        now = time.monotonic()
+        steps = state.global_step - self._last_step
+        if steps <= 0 or now <= self._last_time:
+            return
+
+        completions = (
+            steps
+            * args.per_device_train_batch_size
+            * args.gradient_accumulation_steps
+            * args.world_size
+        )
+        tokens_per_second = logs["completion_length"] * completions / (now - self._last_time)
+        self.logger.info(
+            f"Generated {tokens_per_second:.1f} tokens/s "
+            f"(batch size {args.per_device_train_batch_size})"
+        )
+        self._last_time, self._last_step = now, state.global_step
+
+
 class HivemindGRPOTrainer:
     """
     Subclass of GRPOTrainer that implements multi-stage GRPO by publishing
@@ -43,15 +102,43 @@ class HivemindGRPOTrainer:
             dht: DHT,
             tokenizer,
             logger,
+            dist: DistributedContext | None = None,
             **kwargs,
         ):
             self.node = node
             self.dht = dht
             self.logger = logger
+            self.dist = dist or DistributedContext()
             self.stage_rewards = 0.0
             self.stage_outputs = {}
             super().__init__(processing_class=tokenizer, **kwargs)
 
+        def reset_stage(self, reward_funcs, train_dataset, eval_dataset):
+            """
+            Prepares this trainer for the next stage, keeping the model, optimizer,
+            accelerator and vLLM engine built by the first stage.
+
+            Only callable reward functions are supported; reward models would
+            need to be prepared by the accelerator again.
+            """
+            self.reward_funcs = list(reward_funcs)
+            self.reward_processing_classes = [None] * len(self.reward_funcs)
+            if hasattr(self, "reward_weights"):
+                self.reward_weights = torch.ones(len(self.reward_funcs))
+            self.train_dataset = train_dataset
+            self.eval_dataset = eval_dataset
+
+            # The schedule is rebuilt for the new stage's steps; optimizer state carries over.
+            self.lr_scheduler = None
+            # global_step restarts at 0, so force vLLM to load the weights the
+            # previous stage finished with on the first step.
+            self._last_loaded_step = -1
+            if hasattr(self, "_buffered_inputs"):
+                self._buffered_inputs = [None] * len(self._buffered_inputs)
+
+            self.stage_rewards = 0.0
+            self.stage_outputs = {}
+
         def publish_leaderboard(self):
             r, s = self.node.round_num, self.node.stage_num
             curr_rewards: dict[str, Any] | None = get_dht_value(
@@ -78,45 +165,64 @@ class HivemindGRPOTrainer:
             # This is only here to publish to the DHT at the right time.
             # Only publish to DHT every N steps
             if self.state.global_step % CADENCE_OF_UPDATE_STEPS == 0:
-                question = self.node.outputs["question"]
+                # Every rank has rewarded its own completions; rank 0 publishes them all.
+                gathered = self.dist.gather_object(
+                    (dict(self.node.outputs), list(self.node.rewards))
+                )
+                if gathered is not None:
+                    self.publish_outputs(gathered)
+            if self.node.is_coordinator and self.dist.is_main:
+                self.publish_leaderboard()
+
+            return loss
+
+        def publish_outputs(self, gathered):
+            merged = merge_rank_outputs(gathered)
+            for outputs, rewards in merged:
+                question = outputs["question"]
                 q_hash = hashlib.md5(question.encode()).hexdigest()
 
                 # Add detailed output logging
                 self.logger.info("-" * 50)
                 self.logger.info(f"Question: {question}")
-                if "responses" in self.node.outputs:
-                    for i, response in enumerate(self.node.outputs["responses"]):
+                if "responses" in outputs:
+                    for i, response in enumerate(outputs["responses"]):
                         self.logger.info(f"Response #{i+1}: {response}")
-                        reward = self.node.rewards[i] if i < len(self.node.rewards) else "N/A"
+                        reward = rewards[i] if i < len(rewards) else "N/A"
                         self.logger.info(f"Reward #{i+1}: {reward}")
                 
                 # Store outputs for final summary
-                self.stage_outputs = dict(self.node.outputs)
+                self.stage_outputs = dict(outputs)
                 self.logger.info("-" * 50)
 
-                value = (time.time(), self.node.outputs)
+                value = (time.time(), outputs)
+                expiration_time = get_dht_time() + self.node.out_expiration
+                # Peers receive references to the question and prompts.
+                published = self.node.blob_store.publish(
+                    self.dht, outputs, expiration_time
+                )
                 self.dht.store(
                     key=node_outputs_key(self.node),
                     subkey=q_hash,
-                    value=value,
-                    expiration_time=get_dht_time() + self.node.out_expiration,
+                    value=encode_outputs((value[0], published)),
+                    expiration_time=expiration_time,
                 )
                 self.node.put_stage_outputs(
                     self.node.round_num, self.node.stage_num, q_hash, value
                 )
 
-                # Just the latest.
-                self.stage_rewards += sum(self.node.rewards)
-                self.dht.store(
-                    key=rewards_key(self.node.round_num, self.node.stage_num),
-                    subkey=self.node.key,
-                    value=self.stage_rewards,
-                    expiration_time=get_dht_time() + self.node.out_expiration,
-                )
-            if self.node.is_coordinator:
-                self.publish_leaderboard()
+            if not merged:
+                return
 
-            return loss
+            # Just the latest. Averaged over the questions this step covered, so
+            # a node's score doesn't grow with its number of local ranks.
+            self.stage_rewards += sum(sum(rewards) for _, rewards in merged) / len(merged)
+            self.dht.store(
+                key=rewards_key(self.node.round_num, self.node.stage_num),
+                subkey=self.node.key,
+                value=self.stage_rewards,
+                expiration_time=get_dht_time() + self.node.out_expiration,
+            )
 
     def __init__(
         self,
@@ -127,12 +233,15 @@ class HivemindGRPOTrainer:
         model,
         tokenizer,
         log_tag=None,
+        dist: DistributedContext | None = None,
         **kwargs,
     ):
         # The single coordinator is responsible for incrementing round + stage numbers.
         # TODO(lou): Allow ability to choose different coordinators?
         self.node = node
         self.dht = dht
+        # Only rank 0 talks to the DHT (dht is None on other ranks).
+        self.dist = dist or DistributedContext()
 
         self.stage_data = stage_data
 
@@ -153,6 +262,10 @@ class HivemindGRPOTrainer:
         # Storage for final summary
         self.all_stage_outputs = []
 
+        # Built by the first stage and reused by every later stage and round.
+        self.trainer = None
+        self.hub_uploader = None
+
     def wait_for(self, result_fn=lambda: None, interval=10, timeout=30):
         start_time = time.monotonic()
         while time.monotonic() - start_time < timeout:
@@ -180,16 +293,9 @@ class HivemindGRPOTrainer:
 
             self.logger.info(f"📈 Training round: {round_num} stage: {stage_num}")
             train_dataset, test_dataset = stage.datasets_fn(round_num, stage_num)
-            kwargs = {
-                "model": self.model,
-                "args": self.config,
-                "reward_funcs": stage.reward_funcs,
-                "train_dataset": train_dataset,
-                "eval_dataset": test_dataset,
-            }
-            trainer = HivemindGRPOTrainer.PublishingGRPOTrainer(
-                self.node, self.dht, self.tokenizer, self.logger, **kwargs
-            )
+            # Other local ranks train the same stage on their shard of the data.
+            self.dist.broadcast_object((round_num, stage_num, train_dataset, test_dataset))
+            trainer = self.stage_trainer(stage, train_dataset, test_dataset)
             self.train_and_save(trainer, train_dataset)
             self.logger.info(
                 f"📉 Finished training round: {round_num} stage: {stage_num}"
@@ -198,26 +304,54 @@ class HivemindGRPOTrainer:
         # Push to HF hub if desired
         # TODO: Come back and add additional logic checking if they've provided access token+HF username
         if self.config.push_to_hub_token is not None:
-            self.logger.info("Pushing model to Hugging Face Hub...")
-            try:
-                trainer.push_to_hub(
-                    tags=[
-                        "rl-swarm",
-                        "grpo",
-                        "gensyn",
-                        f"I am {get_name_from_peer_id(self.node.key)}",
-                    ]
-                )
-                time.sleep(1)
-            except Exception:
-                self.logger.info(
-                    "Failed to push model to the Hugging Face Hub. When you conclude training please try manually pushing it yourself using the instructions here: https://huggingface.co/docs/hub/en/models-uploading"
-                )
+            self.push_to_hub(trainer, round_num)
         
         # Print final summary of all stages
         self.print_all_stage_outputs()
         self.cleanup()
 
+    def push_to_hub(self, trainer, round_num):
+        """Queues the latest checkpoint for a background upload."""
+        try:
+            if not self.hub_uploader:
+                trainer.init_hf_repo(token=self.config.push_to_hub_token)
+                self.hub_uploader = HubUploader(
+                    hf_upload_fn(trainer.hub_model_id, self.config.push_to_hub_token),
+                    logger=self.logger,
+                )
+
+            trainer.create_model_card(
+                tags=[
+                    "rl-swarm",
+                    "grpo",
+                    "gensyn",
+                    f"I am {get_name_from_peer_id(self.node.key)}",
+                ]
+            )
+            self.hub_uploader.submit(self.config.output_dir, label=f"round {round_num}")
+        except Exception:
+            self.logger.info(
+                "Failed to push model to the Hugging Face Hub. When you conclude training please try manually pushing it yourself using the instructions here: https://huggingface.co/docs/hub/en/models-uploading"
+            )
+
+    def stage_trainer(self, stage, train_dataset, test_dataset):
+        if self.trainer:
+            self.trainer.reset_stage(stage.reward_funcs, train_dataset, test_dataset)
+            return self.trainer
+
+        kwargs = {
+            "model": self.model,
+            "args": self.config,
+            "reward_funcs": stage.reward_funcs,
+            "train_dataset": train_dataset,
+            "eval_dataset": test_dataset,
+            "callbacks": [ThroughputCallback(self.logger)],
+        }
+        self.trainer = HivemindGRPOTrainer.PublishingGRPOTrainer(
+            self.node, self.dht, self.tokenizer, self.logger, dist=self.dist, **kwargs
+        )
+        return self.trainer
+
     def cleanup(self):
         # Clear various stage caches.
         gc.collect()
@@ -240,6 +374,10 @@ class HivemindGRPOTrainer:
                 train_result = trainer.train()
                 break
             except (BlockingIOError, EOFError) as e:
+                if self.dist.is_distributed:
+                    # Only rank 0 talks to the DHT; restarting it alone would
+                    # desync it from the other ranks' collectives.
+                    raise
                 self.logger.warning(f"DHT IPC error: {e}. Restarting training...")
                 self.cleanup()  # Clear GPU/caches
                 time.sleep(5)
@@ -276,6 +414,9 @@ class HivemindGRPOTrainer:
                     self.logger.info(f"{key}: [Output too large to display]")
         self.logger.info("=" * 60)
         
+        # The last Hub upload may still be copying the output directory.
+        if self.hub_uploader:
+            self.hub_uploader.wait_staged()
         trainer.log_metrics("train", metrics)
         trainer.save_metrics("train", metrics)
         trainer.save_state()
@@ -287,8 +428,9 @@ class HivemindGRPOTrainer:
         assert self.config.distributed_state
         self.config.distributed_state.wait_for_everyone()  # wait for all processes to load
 
-        self.tokenizer.save_pretrained(self.config.output_dir)
-        self.logger.info(f"Tokenizer saved to {self.config.output_dir}")
+        if self.dist.is_main:
+            self.tokenizer.save_pretrained(self.config.output_dir)
+            self.logger.info(f"Tokenizer saved to {self.config.output_dir}")
 
     def get_round_and_stage(self):
         return get_round_and_stage(self.dht)
@@ -366,6 +508,18 @@ class HivemindGRPOTrainer:
 
         self.logger.info("Training timed out!")
 
+    def replica_train(self):
+        """Trains the stages rank 0 broadcasts until it signals the end of training."""
+        last_stage = len(self.stage_data.stages) - 1
+        while (message := self.dist.broadcast_object()) is not None:
+            round_num, stage_num, train_dataset, test_dataset = message
+            self.node.round_num, self.node.stage_num = round_num, stage_num
+            stage = self.stage_data.stages[stage_num]
+            trainer = self.stage_trainer(stage, train_dataset, test_dataset)
+            self.train_and_save(trainer, train_dataset)
+            if stage_num == last_stage:
+                self.cleanup()
+
     def _train(self):
         if self.node.is_coordinator:
             self.coordinator_train()
@@ -374,7 +528,15 @@ class HivemindGRPOTrainer:
 
     def train(self):
         try:
+            if not self.dist.is_main:
+                self.replica_train()
+                return
+
             self._train()
+            self.dist.broadcast_object(None)
+            if self.hub_uploader:
+                self.logger.info("Waiting for the last Hugging Face Hub upload...")
+                self.hub_uploader.close()
 
         except Exception:
             self.logger.error("Encountered error during training!")
@@ -0,0 +1,232 @@
+import struct
+import zlib
+from typing import Any
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Stage outputs published to the DHT are encoded as:
+#   header: magic, version, codec, timestamp
+#   body (compressed): string table, then the outputs tree
+# Every string in the tree is a reference into the string table, so text repeated
+# across fields is sent once. Strings that embed the question (e.g. the stage 2
+# and 3 prompts) reference the question entry rather than repeating its text.
+MAGIC = b"RSO"
+WIRE_VERSION = 1
+HEADER = struct.Struct("<3sBBd")
+
+CODEC_NONE = 0
+CODEC_ZLIB = 1
+# zstd is optional (zstandard is not a requirement) and must be chosen explicitly;
+# writers default to zlib, which every peer and the web server can decode.
+CODEC_ZSTD = 2
+DEFAULT_CODEC = CODEC_ZLIB
+MIN_COMPRESS_BYTES = 256
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 3
+
+_INT = struct.Struct("<q")
+_FLOAT = struct.Struct("<d")
+
+
+def is_encoded(value: Any) -> bool:
+    return isinstance(value, (bytes, bytearray)) and value[: len(MAGIC)] == MAGIC
+
+
+def encode_outputs(value: tuple[float, dict], codec: int | None = None) -> bytes:
+    """
+    Encodes a (timestamp, outputs) stage output for storage in the DHT.
+
+    Args:
+        value: The timestamp and outputs dict written by the trainer
+        codec: One of the CODEC_* constants; defaults to zlib
+
+    Returns:
+        The versioned, compressed payload
+    """
+    ts, outputs = value
+    question = outputs.get("question") if isinstance(outputs, dict) else None
+    encoder = _Encoder(question if isinstance(question, str) and question else None)
+    tree = encoder.encode(outputs)
+
+    body = bytearray()
+    _write_varint(body, len(encoder.strings))
+    for s in encoder.strings:
+        data = s.encode()
+        _write_varint(body, len(data))
+        body += data
+    body += tree
+
+    if codec is None:
+        codec = DEFAULT_CODEC if len(body) >= MIN_COMPRESS_BYTES else CODEC_NONE
+    return HEADER.pack(MAGIC, WIRE_VERSION, codec, float(ts)) + _compress(bytes(body), codec)
+
+
+def decode_outputs(value: Any) -> Any:
+    """Decodes an encoded stage output; values in the legacy format are returned as is."""
+    if not is_encoded(value):
+        return value
+
+    magic, version, codec, ts = HEADER.unpack_from(value)
+    if version != WIRE_VERSION:
+        raise ValueError(f"unsupported stage output version {version}")
+
+    body = _decompress(bytes(value[HEADER.size :]), codec)
+    n, pos = _read_varint(body, 0)
+    strings = []
+    for _ in range(n):
+        length, pos = _read_varint(body, pos)
+        strings.append(body[pos : pos + length].decode())
+        pos += length
+
+    outputs, _ = _decode(body, pos, strings)
+    return ts, outputs
+
+
+def decode_stage_outputs(outputs: dict[str, Any] | None) -> dict[str, Any] | None:
+    """Decodes every Q: value entry read from a stage outputs key."""
+    if not outputs:
+        return outputs
+    return {k: decode_outputs(v) for k, v in outputs.items()}
+
+
+class _Encoder:
+    def __init__(self, question: str | None):
+        self.question = question
+        self.strings: list[str] = []
+        self.indices: dict[str, int] = {}
+        if question:
+            self._index(question)  # Always entry 0.
+
+    def _index(self, s: str) -> int:
+        if s not in self.indices:
+            self.indices[s] = len(self.strings)
+            self.strings.append(s)
+        return self.indices[s]
+
+    def encode(self, obj) -> bytearray:
+        out = bytearray()
+        self._encode(out, obj)
+        return out
+
+    def _encode(self, out: bytearray, obj):
+        if obj is None:
+            out += b"N"
+        elif obj is True:
+            out += b"T"
+        elif obj is False:
+            out += b"F"
+        elif isinstance(obj, int):
+            out += b"i"
+            out += _INT.pack(obj)
+        elif isinstance(obj, float):
+            out += b"f"
+            out += _FLOAT.pack(obj)
+        elif isinstance(obj, str):
+            if self.question and obj != self.question and self.question in obj:
+                parts = obj.split(self.question)
+                out += b"p"
+                _write_varint(out, len(parts))
+                for part in parts:
+                    _write_varint(out, self._index(part))
+            else:
+                out += b"s"
+                _write_varint(out, self._index(obj))
+        elif isinstance(obj, (list, tuple)):
+            out += b"l" if isinstance(obj, list) else b"t"
+            _write_varint(out, len(obj))
+            for item in obj:
+                self._encode(out, item)
+        elif isinstance(obj, dict):
+            out += b"d"
+            _write_varint(out, len(obj))
+            for k, v in obj.items():
+                self._encode(out, k)
+                self._encode(out, v)
+        else:
+            raise TypeError(f"cannot encode {type(obj).__name__} in stage outputs")
+
+
+def _decode(body: bytes, pos: int, strings: list[str]):
+    tag = body[pos : pos + 1]
+    pos += 1
+    if tag == b"N":
+        return None, pos
+    if tag == b"T":
+        return True, pos
+    if tag == b"F":
+        return False, pos
+    if tag == b"i":
+        return _INT.unpack_from(body, pos)[0], pos + _INT.size
+    if tag == b"f":
+        return _FLOAT.unpack_from(body, pos)[0], pos + _FLOAT.size
+    if tag == b"s":
+        i, pos = _read_varint(body, pos)
+        return strings[i], pos
+    if tag == b"p":
+        n, pos = _read_varint(body, pos)
+        parts = []
+        for _ in range(n):
+            i, pos = _read_varint(body, pos)
+            parts.append(strings[i])
+        return strings[0].join(parts), pos
+    if tag in (b"l", b"t"):
+        n, pos = _read_varint(body, pos)
+        items = []
+        for _ in range(n):
+            item, pos = _decode(body, pos, strings)
+            items.append(item)
+        return (items if tag == b"l" else tuple(items)), pos
+    if tag == b"d":
+        n, pos = _read_varint(body, pos)
+        result = {}
+        for _ in range(n):
+            k, pos = _decode(body, pos, strings)
+            result[k], pos = _decode(body, pos, strings)
+        return result, pos
+
+    raise ValueError(f"unknown tag {tag!r} in stage outputs")
+
+
+def _compress(data: bytes, codec: int) -> bytes:
+    if codec == CODEC_NONE:
+        return data
+    if codec == CODEC_ZLIB:
+        return zlib.compress(data, ZLIB_LEVEL)
+    if codec == CODEC_ZSTD:
+        if not zstandard:
+            raise ValueError("zstandard is not installed")
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    raise ValueError(f"unknown codec {codec}")
+
+
+def _decompress(data: bytes, codec: int) -> bytes:
+    if codec == CODEC_NONE:
+        return data
+    if codec == CODEC_ZLIB:
+        return zlib.decompress(data)
+    if codec == CODEC_ZSTD:
+        if not zstandard:
+            raise ValueError("zstandard is required to decode these stage outputs")
+        return zstandard.ZstdDecompressor().decompress(data)
+    raise ValueError(f"unknown codec {codec}")
+
+
+def _write_varint(out: bytearray, n: int):
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _read_varint(data: bytes, pos: int) -> tuple[int, int]:
+    result = shift = 0
+    while True:
+        b = data[pos]
+        pos += 1
+        result |= (b & 0x7F) << shift
+        if b < 0x80:
+            return result, pos
+        shift += 7
@@ -1,22 +1,23 @@
-from collections import defaultdict
-import hashlib
-import itertools
+import json
+import os
 import time
 import logging
 import threading
 from datetime import datetime, timezone
 from typing import Dict, Any, Optional, Tuple
-import random
 from abc import ABC, abstractmethod
 
 from hivemind.dht import DHT
 from hivemind_exp.dht_utils import get_dht_value, rewards_key, outputs_key
 from hivemind_exp.name_utils import get_name_from_peer_id
 from hivemind_exp.chain_utils import ModalSwarmCoordinator
+from hivemind_exp.wire_utils import decode_stage_outputs
 
-from .gossip_utils import stage1_message, stage2_message, stage3_message
+from .dht_snapshot import DHTSnapshot
 from .kinesis import Kinesis, GossipMessage, GossipMessageData, RewardsMessage, RewardsMessageData
 
+STAGES_PER_ROUND = 3
+
 
 class BaseDHTPublisher(ABC):
     """
@@ -57,6 +58,10 @@ class BaseDHTPublisher(ABC):
         self.current_round = -1
         self.current_stage = -1
         self.last_polled = None
+
+        # Snapshot the current poll reads from.
+        self.snapshot: Optional[DHTSnapshot] = None
+        self._last_snapshot_at = None
         
         self.logger.info(f"{self.__class__.__name__} initialized")
     
@@ -92,16 +97,40 @@ class BaseDHTPublisher(ABC):
         return self.last_polled
 
 
+    def on_snapshot(self, snapshot: DHTSnapshot):
+        """Polls from a snapshot shared by a DHTPoller, at most once per poll interval."""
+        if (
+            self._last_snapshot_at
+            and (snapshot.polled_at - self._last_snapshot_at).total_seconds() < self.poll_interval_seconds
+        ):
+            return
+
+        self._last_snapshot_at = snapshot.polled_at
+        self._poll_once(snapshot)
+
+
+    def _begin_poll(self, snapshot: Optional[DHTSnapshot]) -> DHTSnapshot:
+        """Uses the given snapshot, or takes one when polling on our own."""
+        if snapshot is None:
+            snapshot = DHTSnapshot.take(self.dht, self.coordinator, logger=self.logger)
+        self.snapshot = snapshot
+        return snapshot
+
+
     def _get_rewards_data(self, round_num: int, stage_num: int) -> dict[str, Any] | None:
+        if self.snapshot:
+            return self.snapshot.rewards(round_num, stage_num)
         rewards_key_str = rewards_key(round_num, stage_num)
         rewards_data = get_dht_value(self.dht, key=rewards_key_str)
         return rewards_data
 
 
     def _get_outputs_data(self, node_key: str, round_num: int, stage_num: int) -> dict[str, Any] | None:
+        if self.snapshot:
+            return self.snapshot.outputs(node_key, round_num, stage_num)
         outputs_key_str = outputs_key(node_key, round_num, stage_num)
         outputs_data = get_dht_value(self.dht, key=outputs_key_str)
-        return outputs_data
+        return decode_stage_outputs(outputs_data)
 
 
     def _get_peer_name_from_id(self, peer_id: str) -> str:
@@ -118,9 +147,9 @@ class BaseDHTPublisher(ABC):
     
 
     @abstractmethod
-    def _poll_once(self):
+    def _poll_once(self, snapshot: Optional[DHTSnapshot] = None):
         """
-        Perform a single poll of the DHT.
+        Perform a single poll of the DHT, from the given snapshot if any.
         This method should be overridden by subclasses to implement specific polling logic.
         """
         pass
@@ -129,12 +158,111 @@ class BaseDHTPublisher(ABC):
 class RewardsDHTPublisher(BaseDHTPublisher):
     """
     A class that polls the DHT for round and stage changes, and publishes rewards data to Kinesis.
+
+    Each poll publishes only the peers whose rewards changed in the current stage.
+    On a round/stage change, every stage since the last one is published in order,
+    so transitions shorter than the poll interval are not lost. A high-water mark of
+    the last fully published stage, and the scores already emitted for unfinished
+    stages, are persisted to state_path so restarts neither repeat nor skip stages.
     """
-    
-    def _poll_once(self):
+
+    def __init__(
+        self,
+        *args,
+        state_path: Optional[str] = None,
+        max_backfill_stages: int = 30,
+        **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        self.state_path = state_path
+        self.max_backfill_stages = max_backfill_stages
+
+        # Last (round, stage) whose rewards were fully published.
+        self.published_round = -1
+        self.published_stage = -1
+        # (round, stage) -> {peer_id: score} already sent for unfinished stages.
+        self.emitted_scores: Dict[Tuple[int, int], Dict[str, float]] = {}
+
+        if state_path:
+            self._load_state()
+
+    def _load_state(self):
+        try:
+            with open(self.state_path) as f:
+                state = json.load(f)
+            published_round, published_stage = map(int, state["published"])
+            current_round, current_stage = map(int, state["current"])
+            emitted_scores = {
+                tuple(map(int, key.split("/"))): scores
+                for key, scores in state["emitted"].items()
+            }
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            # Start afresh rather than keep the server from starting.
+            self.logger.error(f"Could not load publisher state from {self.state_path}: {e}")
+            return
+
+        self.published_round, self.published_stage = published_round, published_stage
+        self.current_round, self.current_stage = current_round, current_stage
+        self.emitted_scores = emitted_scores
+        self.logger.info(
+            f"Loaded publisher state: published={self.published_round}/{self.published_stage}, "
+            f"current={self.current_round}/{self.current_stage}"
+        )
+
+    def _save_state(self):
+        if not self.state_path:
+            return
+
+        # Stages behind the backfill window are never published again.
+        oldest = self._stage_index(self.current_round, self.current_stage) - self.max_backfill_stages
+        self.emitted_scores = {
+            (r, s): scores
+            for (r, s), scores in self.emitted_scores.items()
+            if self._stage_index(r, s) >= oldest
+        }
+        state = {
+            "published": [self.published_round, self.published_stage],
+            "current": [self.current_round, self.current_stage],
+            "emitted": {f"{r}/{s}": scores for (r, s), scores in self.emitted_scores.items()},
+        }
+        # Write atomically so a crash never leaves a truncated state file.
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.state_path)
+
+    @staticmethod
+    def _stage_index(round_num: int, stage_num: int) -> int:
+        return round_num * STAGES_PER_ROUND + stage_num
+
+    def _stages_between(self, start: Tuple[int, int], end: Tuple[int, int]) -> list[Tuple[int, int]]:
+        """Stages from start (inclusive) to end (exclusive) not yet fully published."""
+        stages = []
+        r, s = start
+        while (r, s) < end:
+            if (r, s) > (self.published_round, self.published_stage):
+                stages.append((r, s))
+            r, s = (r, s + 1) if s + 1 < STAGES_PER_ROUND else (r + 1, 0)
+
+        if len(stages) > self.max_backfill_stages:
+            self.logger.warning(
+                f"Skipping {len(stages) - self.max_backfill_stages} stages older than the backfill limit"
+            )
+            stages = stages[-self.max_backfill_stages:]
+        return stages
+
+    def _mark_published(self, round_num: int, stage_num: int):
+        self.published_round = round_num
+        self.published_stage = stage_num
+        self.emitted_scores.pop((round_num, stage_num), None)
+
+    def _poll_once(self, snapshot: Optional[DHTSnapshot] = None):
         """Perform a single poll of the DHT for rewards data."""
         try:
-            new_round, new_stage = self.coordinator.get_round_and_stage()
+            snapshot = self._begin_poll(snapshot)
+            new_round, new_stage = snapshot.round, snapshot.stage
                 
             self.logger.info(f"Polled for round/stage: round={new_round}, stage={new_stage}")
             
@@ -145,10 +273,17 @@ class RewardsDHTPublisher(BaseDHTPublisher):
             if new_round != self.current_round or new_stage != self.current_stage:
                 self.logger.info(f"Round/stage changed: {self.current_round}/{self.current_stage} -> {new_round}/{new_stage}")
                 
-                # If we have a previous round/stage, publish its rewards
+                # If we have a previous round/stage, publish it and any stages missed since.
                 if self.current_round >= 0 and self.current_stage >= 0:
                     self.logger.info(f"Found rewards for {self.current_round}/{self.current_stage}, publishing")
-                    self._publish_rewards(self.current_round, self.current_stage)
+                    for r, s in self._stages_between(
+                        (self.current_round, self.current_stage), (new_round, new_stage)
+                    ):
+                        if not self._publish_rewards(r, s):
+                            # Resume from this stage on the next poll.
+                            new_round, new_stage = r, s
+                            break
+                        self._mark_published(r, s)
                 
                 # Update current round and stage
                 self.current_round = new_round
@@ -157,6 +292,10 @@ class RewardsDHTPublisher(BaseDHTPublisher):
                 
             else:
                 self.logger.debug(f"No round/stage change: {new_round}/{new_stage}")
+
+            # Publish changes to the in-progress stage.
+            self._publish_rewards(self.current_round, self.current_stage)
+            self._save_state()
                 
         except Exception as e:
             self.logger.error(f"Error polling for round/stage: {e}")
@@ -164,11 +303,15 @@ class RewardsDHTPublisher(BaseDHTPublisher):
 
     def _publish_rewards(self, round_num: int, stage_num: int):
         """
-        Get rewards for the specified round and stage, and publish to Kinesis.
+        Get rewards for the specified round and stage, and publish the peers
+        whose rewards changed since the last publish to Kinesis.
         
         Args:
             round_num: The round number
             stage_num: The stage number
+
+        Returns:
+            False if publishing failed and should be retried
         """
         try:
             # Get rewards data from DHT
@@ -176,20 +319,33 @@ class RewardsDHTPublisher(BaseDHTPublisher):
             
             if not rewards_data:
                 self.logger.warning(f"No rewards data found for round {round_num}, stage {stage_num}")
-                return
+                return True
+
+            emitted = self.emitted_scores.get((round_num, stage_num), {})
+            changed = {
+                peer_id: float(score)
+                for peer_id, score in rewards_data.items()
+                if emitted.get(peer_id) != float(score)
+            }
+            if not changed:
+                self.logger.debug(f"No reward changes for round {round_num}, stage {stage_num}")
+                return True
             
             self.logger.info(f"Publishing rewards for round {round_num}, stage {stage_num}")
             
             # Convert rewards data to RewardsMessage format
-            rewards_message = self._create_rewards_message(rewards_data, round_num, stage_num)
+            rewards_message = self._create_rewards_message(changed, round_num, stage_num)
             
-            # Publish to Kinesis
-            self.kinesis_client.put_rewards(rewards_message)
+            # Publish to Kinesis, and wait for delivery before recording it as published.
+            self.kinesis_client.put_rewards(rewards_message, wait=True)
+            self.emitted_scores[(round_num, stage_num)] = {**emitted, **changed}
             
             self.logger.info(f"Successfully published rewards for round {round_num}, stage {stage_num}")
+            return True
             
         except Exception as e:
             self.logger.error(f"Error publishing rewards for round {round_num}, stage {stage_num}: {e}")
+            return False
     
 
     def _create_rewards_message(self, rewards_data: Dict[str, Any], round_num: int, stage_num: int) -> RewardsMessage:
@@ -233,82 +389,18 @@ class GossipDHTPublisher(BaseDHTPublisher):
     A class that polls the DHT for gossip data and publishes it to Kinesis.
     """
     
-    def _poll_once(self):
+    def _poll_once(self, snapshot: Optional[DHTSnapshot] = None):
         """Perform a single poll of the DHT for gossip data."""
-        MESSAGE_TARGET = 200
-        NODE_TARGET = 20
-        STAGE_MESSAGE_FNS = [stage1_message, stage2_message, stage3_message]
-
-        round_gossip = []
-
         try:
-            # Get current round and stage from coordinator
-            new_round, new_stage = self.coordinator.get_round_and_stage()
-            rewards = self._get_rewards_data(new_round, new_stage)
-
-            if not rewards:
-                raise ValueError("missing rewards")
-
-            # Get a random sample of nodes
-            all_nodes = rewards.keys()
-            nodes = random.sample(
-                list(all_nodes), min(NODE_TARGET, len(all_nodes))
-            )
-            node_gossip_count = defaultdict(int)
-            node_gossip_limit = max(1, MESSAGE_TARGET / len(nodes))
+            snapshot = self._begin_poll(snapshot)
+            self.logger.info(f"Polled for round/stage: round={snapshot.round}, stage={snapshot.stage}")
 
-            self.logger.info(f"Polled for round/stage: round={new_round}, stage={new_stage}")
+            # The sweep over sampled peers' outputs is shared with the cache.
+            round_gossip = snapshot.gossip()
 
-            start_round = max(0, new_round - 3)
-            
             # Update the last polled time
             self.last_polled = datetime.now(timezone.utc)
 
-            for r, s, node_key in itertools.product(
-                reversed(range(start_round, new_round + 1)),  # Most recent first
-                reversed(range(0, 3)),
-                nodes,
-            ):
-                if r == new_round and s > new_stage:
-                    continue
-                if node_gossip_count[node_key] > node_gossip_limit:
-                    break
-
-                outputs = self._get_outputs_data(node_key, r, s)
-                if outputs is None:
-                    continue
-
-                sorted_outputs = sorted(list(outputs.items()), key=lambda t: t[1][0])
-                self.logger.info(f">>> Sorted outputs: {sorted_outputs}")
-
-                for question, (ts, outputs) in sorted_outputs:
-                    # Generate a unique-ish ID for each message
-                    gossip_id = hashlib.md5(
-                        f"{node_key}_{r}_{s}_{question}".encode()
-                    ).hexdigest()
-
-                    message = f"Cannot render output for unknown stage {s}"
-                    if s < len(STAGE_MESSAGE_FNS):
-                        message = STAGE_MESSAGE_FNS[s](
-                            node_key, question, ts, outputs
-                        )
-                    
-                    round_gossip.append(
-                        (
-                            ts,
-                            {
-                                "id": gossip_id,
-                                "message": message,
-                                "node": get_name_from_peer_id(node_key),
-                                "nodeId": node_key,
-                            },
-                        )
-                    )
-                    node_gossip_count[node_key] += 1
-                    if node_gossip_count[node_key] > node_gossip_limit:
-                        break
-                            
-
             self._publish_gossip(round_gossip)
                 
         except Exception as e:
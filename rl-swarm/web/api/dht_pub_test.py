@@ -1,9 +1,11 @@
+import json
 import unittest
 from unittest.mock import MagicMock, patch, call
 import time
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 import threading
 import sys
+import tempfile
 from pathlib import Path
 
 # Add the parent directory to the Python path
@@ -15,7 +17,9 @@ sys.path.append(str(parent_dir))
 # This allows us to test the DHTPublisher class without needing the actual hivemind_exp module.
 
 from web.api.dht_pub import BaseDHTPublisher, RewardsDHTPublisher, GossipDHTPublisher
-from web.api.kinesis import RewardsMessage, RewardsMessageData
+from web.api.dht_snapshot import DHTPoller, DHTSnapshot
+from web.api.kinesis import KinesisError, RewardsMessage, RewardsMessageData
+from hivemind_exp.dht_utils import outputs_key, rewards_key
 
 
 class TestRewardsDHTPublisher(unittest.TestCase):
@@ -263,6 +267,146 @@ class TestRewardsDHTPublisher(unittest.TestCase):
         self.assertEqual(message.data[1].round, round_num)
         self.assertEqual(message.data[1].stage, stage_num)
 
+    def test_publish_rewards_only_changed_peers(self):
+        """Test that repeated publishes of a stage only emit changed peers."""
+        rewards = {"peer_id_1": 0.5, "peer_id_2": 0.3}
+        self.publisher._get_rewards_data = MagicMock(side_effect=lambda r, s: dict(rewards))
+        self.publisher._get_peer_name_from_id = MagicMock(side_effect=lambda peer_id: peer_id)
+
+        self.publisher._publish_rewards(1, 1)
+        self.assertEqual(len(self.mock_kinesis.put_rewards.call_args[0][0].data), 2)
+
+        # Nothing changed: nothing is published.
+        self.publisher._publish_rewards(1, 1)
+        self.assertEqual(self.mock_kinesis.put_rewards.call_count, 1)
+
+        rewards["peer_id_2"] = 0.8
+        rewards["peer_id_3"] = 0.1
+        self.publisher._publish_rewards(1, 1)
+        message = self.mock_kinesis.put_rewards.call_args[0][0]
+        self.assertEqual(
+            {(d.peer_id, d.amount) for d in message.data},
+            {("peer_id_2", 0.8), ("peer_id_3", 0.1)},
+        )
+
+    def test_publish_rewards_undelivered_is_retried(self):
+        """Test that rewards are only recorded as emitted once Kinesis delivered them."""
+        self.publisher._get_rewards_data = MagicMock(return_value={"peer_id_1": 0.5})
+        self.publisher._get_peer_name_from_id = MagicMock(side_effect=lambda peer_id: peer_id)
+        self.mock_kinesis.put_rewards.side_effect = KinesisError("flush failed")
+
+        self.assertFalse(self.publisher._publish_rewards(1, 1))
+        self.assertEqual(self.publisher.emitted_scores, {})
+        self.assertEqual(self.mock_kinesis.put_rewards.call_args[1], {"wait": True})
+
+        self.mock_kinesis.put_rewards.side_effect = None
+        self.assertTrue(self.publisher._publish_rewards(1, 1))
+        self.assertEqual(self.publisher.emitted_scores, {(1, 1): {"peer_id_1": 0.5}})
+
+    def test_poll_once_backfills_missed_stages(self):
+        """Test that stages skipped between polls are published in order."""
+        self.coordinator.get_round_and_stage.return_value = (2, 1)
+        self.publisher.current_round = 1
+        self.publisher.current_stage = 1
+        self.publisher._publish_rewards = MagicMock(return_value=True)
+
+        self.publisher._poll_once()
+
+        self.assertEqual(
+            self.publisher._publish_rewards.call_args_list,
+            [call(1, 1), call(1, 2), call(2, 0), call(2, 1)],
+        )
+        self.assertEqual((self.publisher.published_round, self.publisher.published_stage), (2, 0))
+
+    def test_poll_once_backfill_failure_resumes(self):
+        """Test that a failed backfill is retried from the failed stage."""
+        self.coordinator.get_round_and_stage.return_value = (2, 1)
+        self.publisher.current_round = 1
+        self.publisher.current_stage = 1
+        self.publisher._publish_rewards = MagicMock(side_effect=[True, False, True])
+
+        self.publisher._poll_once()
+
+        self.assertEqual((self.publisher.current_round, self.publisher.current_stage), (1, 2))
+        self.assertEqual((self.publisher.published_round, self.publisher.published_stage), (1, 1))
+
+    def test_state_survives_restart(self):
+        """Test that published stages and emitted scores are restored from disk."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            state_path = str(Path(tmp_dir) / "state.json")
+            publisher = RewardsDHTPublisher(
+                dht=self.mock_dht,
+                kinesis_client=self.mock_kinesis,
+                logger=self.mock_logger,
+                coordinator=self.coordinator,
+                state_path=state_path,
+            )
+            publisher._get_rewards_data = MagicMock(return_value={"peer_id_1": 0.5})
+            publisher._get_peer_name_from_id = MagicMock(return_value="name1")
+
+            self.coordinator.get_round_and_stage.return_value = (1, 0)
+            publisher._poll_once()
+            self.coordinator.get_round_and_stage.return_value = (1, 1)
+            publisher._poll_once()
+            self.assertEqual(self.mock_kinesis.put_rewards.call_count, 2)
+
+            restarted = RewardsDHTPublisher(
+                dht=self.mock_dht,
+                kinesis_client=self.mock_kinesis,
+                logger=self.mock_logger,
+                coordinator=self.coordinator,
+                state_path=state_path,
+            )
+            restarted._get_rewards_data = publisher._get_rewards_data
+            restarted._get_peer_name_from_id = publisher._get_peer_name_from_id
+
+            self.assertEqual((restarted.published_round, restarted.published_stage), (1, 0))
+            self.assertEqual((restarted.current_round, restarted.current_stage), (1, 1))
+
+            # Already published: nothing is sent again after the restart.
+            restarted._poll_once()
+            self.assertEqual(self.mock_kinesis.put_rewards.call_count, 2)
+
+    def test_malformed_state_starts_fresh(self):
+        """Test that a state file with missing or malformed keys is ignored."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            state_path = Path(tmp_dir) / "state.json"
+            for state in (
+                {"published": [1, 0]},
+                {"published": [1, 0], "current": [1, 1], "emitted": {"1-1": {}}},
+            ):
+                state_path.write_text(json.dumps(state))
+                publisher = RewardsDHTPublisher(
+                    dht=self.mock_dht,
+                    kinesis_client=self.mock_kinesis,
+                    logger=self.mock_logger,
+                    coordinator=self.coordinator,
+                    state_path=str(state_path),
+                )
+                self.assertEqual((publisher.published_round, publisher.published_stage), (-1, -1))
+                self.assertEqual(publisher.emitted_scores, {})
+
+    def test_saved_state_drops_stages_behind_backfill_window(self):
+        """Test that emitted scores older than the backfill window are not persisted."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            state_path = Path(tmp_dir) / "state.json"
+            publisher = RewardsDHTPublisher(
+                dht=self.mock_dht,
+                kinesis_client=self.mock_kinesis,
+                logger=self.mock_logger,
+                coordinator=self.coordinator,
+                state_path=str(state_path),
+                max_backfill_stages=3,
+            )
+            publisher.current_round, publisher.current_stage = 5, 0
+            publisher.emitted_scores = {(3, 2): {"a": 1.0}, (4, 0): {"a": 1.0}, (5, 0): {"a": 1.0}}
+            publisher._save_state()
+
+            self.assertEqual(
+                json.loads(state_path.read_text())["emitted"],
+                {"4/0": {"a": 1.0}, "5/0": {"a": 1.0}},
+            )
+
 
 class TestGossipDHTPublisher(unittest.TestCase):
     """Tests for the GossipDHTPublisher class."""
@@ -313,38 +457,36 @@ class TestGossipDHTPublisher(unittest.TestCase):
 
         # Set up mocks
         self.coordinator.get_round_and_stage.return_value = (1, 1)
-        self.publisher._get_rewards_data = MagicMock(return_value=None)
+        fetch = MagicMock(return_value=None)
 
         # Poll once
-        self.publisher._poll_once()
+        self.publisher._poll_once(DHTSnapshot(1, 1, fetch))
         
-        # Check that get_round_and_stage was called on the coordinator
-        self.coordinator.get_round_and_stage.assert_called_once()
+        # Check that the rewards were read from the snapshot
+        fetch.assert_any_call(rewards_key(1, 1))
         
         # Check that the logger was called
         self.mock_logger.error.assert_any_call("Error polling for round/stage: missing rewards")
 
     def test_poll_once_with_rewards(self):
         """Test gossip polling when there is rewards data."""
-        # Set up mocks
-        self.coordinator.get_round_and_stage.return_value = (1, 1)
+        # Set up mocks: rewards but no outputs
         rewards_data = {"peer_id_1": 0.5, "peer_id_2": 0.3}
-        self.publisher._get_rewards_data = MagicMock(return_value=rewards_data)
-        
-        # Mock the _get_outputs_data method to return None (no outputs)
-        self.publisher._get_outputs_data = MagicMock(return_value=None)
+        values = {rewards_key(1, 1): rewards_data}
+        fetch = MagicMock(side_effect=values.get)
         
         # Mock the _publish_gossip method
         self.mock_kinesis.put_gossip = MagicMock()
         
         # Poll once
-        self.publisher._poll_once()
+        self.publisher._poll_once(DHTSnapshot(1, 1, fetch))
         
-        # Check that get_round_and_stage was called on the coordinator
-        self.coordinator.get_round_and_stage.assert_called_once()
+        # Check that the coordinator was not queried: the snapshot has the round/stage
+        self.coordinator.get_round_and_stage.assert_not_called()
         
-        # Check that _get_rewards_data was called with the correct arguments
-        self.publisher._get_rewards_data.assert_called_once_with(1, 1)
+        # Check that outputs of both peers were read once for each round/stage
+        fetch.assert_any_call(outputs_key("peer_id_1", 1, 0))
+        self.assertEqual(fetch.call_count, len(set(c[0][0] for c in fetch.call_args_list)))
         
         # Check that _publish_gossip was called
         self.mock_kinesis.put_gossip.assert_not_called()
@@ -356,6 +498,22 @@ class TestGossipDHTPublisher(unittest.TestCase):
         # Check that last_polled was updated
         self.assertIsNotNone(self.publisher.last_polled)
 
+    def test_on_snapshot_throttled(self):
+        """Test that shared snapshots are only polled once per poll interval."""
+        self.publisher.poll_interval_seconds = 60
+        self.publisher._poll_once = MagicMock()
+
+        first = DHTSnapshot(1, 1, MagicMock())
+        second = DHTSnapshot(1, 1, MagicMock())
+        second.polled_at = first.polled_at + timedelta(seconds=10)
+        third = DHTSnapshot(1, 1, MagicMock())
+        third.polled_at = first.polled_at + timedelta(seconds=61)
+
+        for snapshot in (first, second, third):
+            self.publisher.on_snapshot(snapshot)
+
+        self.assertEqual(self.publisher._poll_once.call_args_list, [call(first), call(third)])
+
     def test_poll_once_error(self):
         """Test polling when there's an error."""
         # Set up the coordinator mock to raise an exception
@@ -395,5 +553,75 @@ class TestGossipDHTPublisher(unittest.TestCase):
         self.mock_logger.info.assert_any_call("Successfully published gossip")
 
 
+class TestDHTPoller(unittest.TestCase):
+    """Tests for the DHTPoller class."""
+
+    def setUp(self):
+        self.coordinator = MagicMock()
+        self.coordinator.get_round_and_stage.return_value = (1, 1)
+        self.mock_logger = MagicMock()
+        self.poller = DHTPoller(MagicMock(), self.coordinator, self.mock_logger)
+
+    def test_subscribers_share_snapshot(self):
+        """Test that every subscriber receives the same snapshot and keys are fetched once."""
+        fetch = MagicMock(return_value={"peer_id_1": 0.5})
+        received = []
+
+        def subscriber(snapshot):
+            snapshot.fetch = fetch
+            received.append(snapshot)
+            snapshot.current_rewards()
+
+        self.poller.subscribe(subscriber)
+        self.poller.subscribe(lambda snapshot: received.append(snapshot.current_rewards()))
+        self.poller.poll_once()
+
+        self.coordinator.get_round_and_stage.assert_called_once()
+        self.assertEqual(received[1], {"peer_id_1": 0.5})
+        fetch.assert_called_once_with(rewards_key(1, 1))
+
+    def test_failing_subscriber_does_not_stop_others(self):
+        """Test that an exception in one subscriber is logged and others still run."""
+        second = MagicMock()
+        self.poller.subscribe(MagicMock(side_effect=Exception("boom")))
+        self.poller.subscribe(second)
+
+        snapshot = self.poller.poll_once()
+
+        second.assert_called_once_with(snapshot)
+        self.assertEqual(self.mock_logger.error.call_count, 1)
+
+    def test_background_subscriber_does_not_block_poll(self):
+        """Test that a slow background subscriber neither delays nor queues up polls."""
+        release = threading.Event()
+        received = []
+
+        def slow_subscriber(snapshot):
+            release.wait(timeout=5)
+            received.append(snapshot)
+
+        fast = MagicMock()
+        self.poller.subscribe(slow_subscriber, background=True)
+        self.poller.subscribe(fast)
+
+        first = self.poller.poll_once()
+        second = self.poller.poll_once()  # Skipped by the busy subscriber.
+        self.assertEqual(fast.call_args_list, [call(first), call(second)])
+
+        release.set()
+        self.poller._running[slow_subscriber].result(timeout=5)
+        third = self.poller.poll_once()
+        self.poller._running[slow_subscriber].result(timeout=5)
+        self.assertEqual(received, [first, third])
+
+    def test_coordinator_error_reuses_last_round_and_stage(self):
+        """Test that a coordinator failure reuses the previous round/stage."""
+        self.assertIsNotNone(self.poller.poll_once())
+
+        self.coordinator.get_round_and_stage.side_effect = Exception("rpc down")
+        snapshot = self.poller.poll_once()
+        self.assertEqual((snapshot.round, snapshot.stage), (1, 1))
+
+
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
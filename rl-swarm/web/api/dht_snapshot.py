@@ -0,0 +1,262 @@
+import hashlib
+import itertools
+import logging
+import random
+import threading
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable
+
+from hivemind_exp.dht_utils import get_dht_value, outputs_key, rewards_key
+from hivemind_exp.name_utils import get_names_from_peer_ids
+from hivemind_exp.wire_utils import decode_stage_outputs
+
+from .gossip_utils import stage1_message, stage2_message, stage3_message
+
+GOSSIP_MESSAGE_TARGET = 200
+GOSSIP_NODE_TARGET = 20
+GOSSIP_PAST_ROUNDS = 3
+GOSSIP_TIMEOUT_SECONDS = 10
+STAGE_MESSAGE_FNS = [stage1_message, stage2_message, stage3_message]
+
+
+def previous_round_and_stage(round_num, stage_num):
+    stage_num -= 1
+    if stage_num < 0:
+        stage_num = 2
+        round_num -= 1
+
+    return max(0, round_num), max(0, stage_num)
+
+
+class DHTSnapshot:
+    """
+    Values read from the DHT during one poll cycle for a fixed round and stage.
+
+    Every key is fetched at most once per snapshot, and the gossip sweep is
+    computed once, so all consumers of a snapshot share the same DHT traffic.
+    """
+
+    def __init__(
+        self,
+        round_num: int,
+        stage_num: int,
+        fetch: Callable[[str], Any],
+        logger: logging.Logger | None = None,
+    ):
+        self.round = round_num
+        self.stage = stage_num
+        self.fetch = fetch
+        self.logger = logger or logging.getLogger(__name__)
+        self.polled_at = datetime.now(timezone.utc)
+
+        self._values = {}
+        self._gossip = None
+        self._lock = threading.RLock()
+
+    @classmethod
+    def for_dht(cls, dht, round_num, stage_num, beam_size=100, logger=None):
+        return cls(
+            round_num,
+            stage_num,
+            lambda key: get_dht_value(dht, key=key, beam_size=beam_size),
+            logger,
+        )
+
+    @classmethod
+    def take(cls, dht, coordinator, beam_size=100, logger=None):
+        """Reads the current round and stage from the coordinator."""
+        round_num, stage_num = coordinator.get_round_and_stage()
+        return cls.for_dht(dht, round_num, stage_num, beam_size, logger)
+
+    def get(self, key: str) -> Any | None:
+        with self._lock:
+            if key not in self._values:
+                self._values[key] = self.fetch(key)
+            return self._values[key]
+
+    def rewards(self, round_num: int, stage_num: int) -> dict[str, Any] | None:
+        return self.get(rewards_key(round_num, stage_num))
+
+    def outputs(self, node_key: str, round_num: int, stage_num: int) -> dict[str, Any] | None:
+        return decode_stage_outputs(self.get(outputs_key(node_key, round_num, stage_num)))
+
+    def current_rewards(self) -> dict[str, Any] | None:
+        return self.rewards(self.round, self.stage)
+
+    def previous_rewards(self) -> dict[str, Any] | None:
+        return self.rewards(*previous_round_and_stage(self.round, self.stage))
+
+    def gossip(self) -> list[tuple[float, dict[str, Any]]]:
+        """
+        Samples recent outputs of the current peers and renders them as gossip.
+
+        Returns:
+            A list of (timestamp, message) pairs, computed once per snapshot.
+        """
+        with self._lock:
+            if self._gossip is None:
+                self._gossip = self._collect_gossip()
+            return self._gossip
+
+    def _collect_gossip(self):
+        rewards = self.current_rewards()
+        if not rewards:
+            raise ValueError("missing rewards")
+
+        round_gossip = []
+        start_time = datetime.now()
+
+        all_nodes = rewards.keys()
+        nodes = random.sample(
+            list(all_nodes), min(GOSSIP_NODE_TARGET, len(all_nodes))
+        )  # Sample uniformly
+        node_gossip_count = defaultdict(int)
+        node_gossip_limit = max(1, GOSSIP_MESSAGE_TARGET / len(nodes))
+        node_names = dict(zip(nodes, get_names_from_peer_ids(nodes)))
+
+        start_round = max(0, self.round - GOSSIP_PAST_ROUNDS)
+        for r, s, node_key in itertools.product(
+            reversed(range(start_round, self.round + 1)),  # Most recent first
+            reversed(range(0, 3)),
+            nodes,
+        ):
+            # Stop gap to make sure gossip collection doesn't stall the poller.
+            if (datetime.now() - start_time).total_seconds() > GOSSIP_TIMEOUT_SECONDS:
+                self.logger.warning(">>> gossip collection timed out after %ds", GOSSIP_TIMEOUT_SECONDS)
+                break
+
+            if r == self.round and s > self.stage:
+                continue
+
+            if node_gossip_count[node_key] > node_gossip_limit:
+                break
+
+            if outputs := self.outputs(node_key, r, s):
+                sorted_outputs = sorted(list(outputs.items()), key=lambda t: t[1][0])
+                for question, (ts, outputs) in sorted_outputs:
+                    gossip_id = hashlib.md5(
+                        f"{node_key}_{r}_{s}_{question}".encode()
+                    ).hexdigest()
+                    if s < len(STAGE_MESSAGE_FNS):
+                        message = STAGE_MESSAGE_FNS[s](node_key, question, ts, outputs)
+                    else:
+                        message = f"Cannot render output for unknown stage {s}"
+                    round_gossip.append(
+                        (
+                            ts,
+                            {
+                                "id": gossip_id,
+                                "message": message,
+                                "node": node_names[node_key],
+                                "nodeId": node_key,
+                            },
+                        )
+                    )
+                    node_gossip_count[node_key] += 1
+                    if node_gossip_count[node_key] > node_gossip_limit:
+                        break
+
+        self.logger.info(
+            ">>> completed gossip with %d messages in %.2fs",
+            len(round_gossip),
+            (datetime.now() - start_time).total_seconds(),
+        )
+        return round_gossip
+
+
+class DHTPoller:
+    """
+    Polls the coordinator and DHT once per cycle and hands the resulting
+    DHTSnapshot to every subscriber, in subscription order.
+
+    Background subscribers run on a thread of their own, so a slow one (e.g. a
+    Kinesis publisher) does not hold up the next poll. A snapshot that arrives
+    while one is still busy with the previous snapshot is skipped for it.
+    """
+
+    def __init__(self, dht, coordinator, logger, poll_interval_seconds=10, beam_size=100):
+        self.dht = dht
+        self.coordinator = coordinator
+        self.logger = logger
+        self.poll_interval_seconds = poll_interval_seconds
+        self.beam_size = beam_size
+
+        self.subscribers: list[Callable[[DHTSnapshot], None]] = []
+        self.last_snapshot: DHTSnapshot | None = None
+
+        self._executors: dict[Callable, ThreadPoolExecutor] = {}
+        self._running: dict[Callable, Future] = {}
+
+        self._stop_event = threading.Event()
+        self._poll_thread = None
+
+    def subscribe(self, callback: Callable[[DHTSnapshot], None], background: bool = False):
+        self.subscribers.append(callback)
+        if background:
+            self._executors[callback] = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="dht-subscriber"
+            )
+
+    def start(self):
+        if self._poll_thread:
+            self.logger.warning("DHTPoller is already running")
+            return
+
+        self._poll_thread = threading.Thread(target=self._poll_loop, daemon=True)
+        self._poll_thread.start()
+        self.logger.info("DHTPoller started")
+
+    def stop(self):
+        if not self._poll_thread:
+            return
+
+        self._stop_event.set()
+        self._poll_thread.join(timeout=5)
+        self._poll_thread = None
+        for executor in self._executors.values():
+            executor.shutdown(wait=False, cancel_futures=True)
+        self.logger.info("DHTPoller stopped")
+
+    def _poll_loop(self):
+        while not self._stop_event.is_set():
+            self.poll_once()
+            self._stop_event.wait(self.poll_interval_seconds)
+
+    def poll_once(self) -> DHTSnapshot | None:
+        try:
+            round_num, stage_num = self.coordinator.get_round_and_stage()
+        except Exception as e:
+            if not self.last_snapshot:
+                self.logger.error(f"Could not get round and stage: {e}")
+                return None
+            round_num, stage_num = self.last_snapshot.round, self.last_snapshot.stage
+            self.logger.warning(
+                f"Could not get round and stage, reusing {round_num}/{stage_num}: {e}"
+            )
+
+        self.logger.info(f"Polled for round/stage: round={round_num}, stage={stage_num}")
+        snapshot = DHTSnapshot.for_dht(
+            self.dht, round_num, stage_num, self.beam_size, self.logger
+        )
+        for callback in self.subscribers:
+            if executor := self._executors.get(callback):
+                running = self._running.get(callback)
+                if running and not running.done():
+                    self.logger.warning(
+                        f"DHT snapshot subscriber {callback} is still busy, skipping this snapshot"
+                    )
+                    continue
+                self._running[callback] = executor.submit(self._notify, callback, snapshot)
+            else:
+                self._notify(callback, snapshot)
+
+        self.last_snapshot = snapshot
+        return snapshot
+
+    def _notify(self, callback: Callable[[DHTSnapshot], None], snapshot: DHTSnapshot):
+        try:
+            callback(snapshot)
+        except Exception as e:
+            self.logger.error(f"DHT snapshot subscriber {callback} failed: {e}")
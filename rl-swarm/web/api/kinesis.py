@@ -1,11 +1,29 @@
 import boto3
 import json
 import logging
-from botocore.exceptions import ClientError
-from typing import Dict, Any, List, Literal
+import random
+import threading
+import time
+from collections import deque
+from botocore.exceptions import BotoCoreError, ClientError
+from typing import Dict, Any, List, Literal, Optional
 from datetime import datetime, timezone
 from pydantic import BaseModel, Field, ConfigDict, field_serializer
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# PutRecords service limits.
+MAX_RECORDS_PER_REQUEST = 500
+MAX_RECORD_BYTES = 1024 * 1024  # Data + partition key.
+MAX_REQUEST_BYTES = 5 * 1024 * 1024
+
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_RETRY_BACKOFF_SECONDS = 0.1
+DEFAULT_MAX_BUFFER_BYTES = 64 * 1024 * 1024
+
 class KinesisError(Exception):
     """Base exception for Kinesis operations"""
     pass
@@ -62,20 +80,113 @@ class GossipMessage(BaseModel):
     type: Literal["gossip"] = "gossip"
     data: List[GossipMessageData]
 
+class KinesisMetrics:
+    """Throughput and latency counters for a single stream."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.records_sent = 0
+        self.bytes_sent = 0
+        self.failed_records = 0
+        self.retries = 0
+        self.dropped_records = 0
+        self.total_latency_seconds = 0.0
+        self.last_latency_seconds = 0.0
+        self.started_at = time.monotonic()
+
+    def record_request(self, records: int, size: int, failed: int, latency: float):
+        with self.lock:
+            self.requests += 1
+            self.records_sent += records - failed
+            self.bytes_sent += size
+            self.failed_records += failed
+            self.total_latency_seconds += latency
+            self.last_latency_seconds = latency
+
+    def record_retry(self):
+        with self.lock:
+            self.retries += 1
+
+    def record_dropped(self, records: int):
+        with self.lock:
+            self.dropped_records += records
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            elapsed = max(time.monotonic() - self.started_at, 1e-9)
+            return {
+                "requests": self.requests,
+                "records_sent": self.records_sent,
+                "bytes_sent": self.bytes_sent,
+                "failed_records": self.failed_records,
+                "retries": self.retries,
+                "dropped_records": self.dropped_records,
+                "records_per_second": self.records_sent / elapsed,
+                "bytes_per_second": self.bytes_sent / elapsed,
+                "avg_latency_seconds": (
+                    self.total_latency_seconds / self.requests if self.requests else 0.0
+                ),
+                "last_latency_seconds": self.last_latency_seconds,
+            }
+
+
 class Kinesis:
-    def __init__(self, stream_name: str = ""):
+    """
+    Buffered Kinesis producer.
+
+    Messages are split into records that fit within the per-record limit,
+    buffered, and sent with PutRecords in requests that respect the service
+    limits. Only the entries that fail are retried, with exponential backoff.
+
+    By default every put flushes synchronously and raises KinesisError on
+    failure. With a flush_interval, puts only enqueue and a background thread
+    flushes the buffer, batching records across polls; puts made with
+    wait=True still send their message synchronously.
+    """
+
+    def __init__(
+        self,
+        stream_name: str = "",
+        region_name: str = "us-west-2",
+        endpoint_url: Optional[str] = None,
+        flush_interval: Optional[float] = None,
+        aggregate: bool = False,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        retry_backoff: float = DEFAULT_RETRY_BACKOFF_SECONDS,
+        max_buffer_bytes: int = DEFAULT_MAX_BUFFER_BYTES,
+        use_orjson: bool = False,
+    ):
         self.stream_name = stream_name
         self.logger = logging.getLogger(__name__)
-        
+        if use_orjson and orjson is None:
+            self.logger.warning("orjson is not installed, falling back to pydantic JSON encoding")
+        self.use_orjson = use_orjson and orjson is not None
+        self.aggregate = aggregate
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.max_buffer_bytes = max_buffer_bytes
+        self.metrics: Dict[str, KinesisMetrics] = {stream_name: KinesisMetrics()}
+
+        # Buffered (partition_key, message_type, [encoded entries]) tuples.
+        self.buffer = deque()
+        self.buffer_bytes = 0
+        self.buffer_lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.flush_event = threading.Event()
+        self.stop_event = threading.Event()
+        self.flush_thread = None
+
         # If no stream name is provided, use no-op implementation
         if not stream_name:
             self.logger.info("No Kinesis stream name provided, using no-op implementation")
             self.kinesis = None
             return
-            
-        # Initialize Kinesis client if stream name is provided
-        self.kinesis = boto3.client('kinesis', region_name='us-west-2')
-        
+
+        # Initialize Kinesis client if stream name is provided. An endpoint URL
+        # may be given to target a local stub (e.g. moto).
+        self.kinesis = boto3.client('kinesis', region_name=region_name, endpoint_url=endpoint_url)
+
         # Verify stream exists
         try:
             self.kinesis.describe_stream(StreamName=stream_name)
@@ -84,31 +195,208 @@ class Kinesis:
             self.logger.error(f"Failed to connect to Kinesis stream {stream_name}: {str(e)}")
             raise KinesisError(f"Stream {stream_name} not found or not accessible")
 
-    def _put_record(self, data: Dict[str, Any], partition_key: str) -> None:
-        """Put a record to Kinesis stream"""
+        if flush_interval is not None:
+            self.flush_thread = threading.Thread(
+                target=self._flush_loop, args=(flush_interval,), daemon=True
+            )
+            self.flush_thread.start()
+
+    def get_metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Returns throughput/latency counters keyed by stream name."""
+        return {stream: metrics.snapshot() for stream, metrics in self.metrics.items()}
+
+    def close(self) -> None:
+        """Stops the background flusher, if any, and flushes remaining records."""
+        if self.flush_thread:
+            self.stop_event.set()
+            self.flush_event.set()
+            self.flush_thread.join()
+            self.flush_thread = None
+        self.flush()
+
+    def _flush_loop(self, interval: float) -> None:
+        while not self.stop_event.is_set():
+            self.flush_event.wait(interval)
+            self.flush_event.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                self.logger.error(f"Background flush to Kinesis failed: {str(e)}")
+
+    def _encode_entries(self, message: BaseModel) -> List[bytes]:
+        """Encodes each entry of a message exactly once; records are assembled from these bytes."""
+        if self.use_orjson:
+            # Field serializers run in model_dump, so timestamps keep the RFC3339 format.
+            return [orjson.dumps(entry.model_dump(by_alias=True)) for entry in message.data]
+        return [entry.model_dump_json(by_alias=True).encode() for entry in message.data]
+
+    def _pack_records(self, partition_key: str, message_type: str, entries: List[bytes]) -> List[Dict[str, Any]]:
+        """Packs encoded entries into message records no larger than MAX_RECORD_BYTES."""
+        prefix = b'{"type":' + json.dumps(message_type).encode() + b',"data":['
+        suffix = b']}'
+        overhead = len(prefix) + len(suffix) + len(partition_key.encode())
+
+        records = []
+        chunk, chunk_size = [], overhead
+        for entry in entries:
+            size = len(entry) + (1 if chunk else 0)  # "," separator.
+            if overhead + len(entry) > MAX_RECORD_BYTES:
+                self.logger.error(
+                    f"Dropping {message_type} entry of {len(entry)} bytes: exceeds Kinesis record limit"
+                )
+                self.metrics[self.stream_name].record_dropped(1)
+                continue
+            if chunk and chunk_size + size > MAX_RECORD_BYTES:
+                records.append(prefix + b",".join(chunk) + suffix)
+                chunk, chunk_size = [], overhead
+                size = len(entry)
+            chunk.append(entry)
+            chunk_size += size
+
+        if chunk or not entries:
+            records.append(prefix + b",".join(chunk) + suffix)
+
+        return [{"Data": record, "PartitionKey": partition_key} for record in records]
+
+    def _enqueue(self, message: BaseModel, partition_key: str) -> None:
+        entries = self._encode_entries(message)
+        size = sum(len(entry) for entry in entries)
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug(
+                f"Buffering {message.type} record with partition key {partition_key}: "
+                f"[{b','.join(entries).decode()}]"
+            )
+        with self.buffer_lock:
+            self.buffer.append((partition_key, message.type, entries, size))
+            self.buffer_bytes += size
+
+            # Bound memory if the stream can't keep up: drop the oldest messages.
+            while self.buffer_bytes > self.max_buffer_bytes and len(self.buffer) > 1:
+                _, _, dropped, dropped_size = self.buffer.popleft()
+                self.buffer_bytes -= dropped_size
+                self.metrics[self.stream_name].record_dropped(len(dropped))
+                self.logger.warning(f"Kinesis buffer full, dropped {len(dropped)} entries")
+
+            if self.buffer_bytes >= MAX_REQUEST_BYTES:
+                self.flush_event.set()
+
+    def _drain(self) -> List[Dict[str, Any]]:
+        with self.buffer_lock:
+            messages = list(self.buffer)
+            self.buffer.clear()
+            self.buffer_bytes = 0
+
+        if self.aggregate:
+            # Merge messages of the same type into as few records as possible.
+            grouped = {}
+            for partition_key, message_type, entries, _ in messages:
+                grouped.setdefault((partition_key, message_type), []).extend(entries)
+            messages = [(k, t, entries, 0) for (k, t), entries in grouped.items()]
+
+        records = []
+        for partition_key, message_type, entries, _ in messages:
+            records.extend(self._pack_records(partition_key, message_type, entries))
+        return records
+
+    def _chunk_requests(self, records: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """Splits records into PutRecords requests within the count and size limits."""
+        requests, request, request_size = [], [], 0
+        for record in records:
+            size = len(record["Data"]) + len(record["PartitionKey"].encode())
+            if request and (
+                len(request) >= MAX_RECORDS_PER_REQUEST
+                or request_size + size > MAX_REQUEST_BYTES
+            ):
+                requests.append(request)
+                request, request_size = [], 0
+            request.append(record)
+            request_size += size
+        if request:
+            requests.append(request)
+        return requests
+
+    def _put_records(self, records: List[Dict[str, Any]]) -> None:
+        """Sends a single PutRecords request, retrying only the failed entries."""
+        metrics = self.metrics[self.stream_name]
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                metrics.record_retry()
+                time.sleep(self.retry_backoff * (2 ** (attempt - 1)) * (1 + random.random()))
+
+            size = sum(len(r["Data"]) + len(r["PartitionKey"].encode()) for r in records)
+            start = time.monotonic()
+            try:
+                response = self.kinesis.put_records(StreamName=self.stream_name, Records=records)
+            except (ClientError, BotoCoreError) as e:
+                # BotoCoreError covers connection failures and timeouts.
+                metrics.record_request(len(records), size, len(records), time.monotonic() - start)
+                self.logger.warning(
+                    f"PutRecords to {self.stream_name} failed (attempt {attempt + 1}): {str(e)}"
+                )
+                last_error = str(e)
+                continue
+
+            failed = [
+                record
+                for record, result in zip(records, response.get("Records", []))
+                if result.get("ErrorCode")
+            ]
+            metrics.record_request(len(records), size, len(failed), time.monotonic() - start)
+            self.logger.info(
+                f"Put {len(records) - len(failed)}/{len(records)} records to Kinesis stream: {self.stream_name}"
+            )
+            if not failed:
+                return
+
+            last_error = next(
+                result.get("ErrorMessage") or result.get("ErrorCode")
+                for result in response.get("Records", [])
+                if result.get("ErrorCode")
+            )
+            records = failed
+
+        metrics.record_dropped(len(records))
+        raise KinesisError(
+            f"Failed to put {len(records)} records to Kinesis after {self.max_retries} retries: {last_error}"
+        )
+
+    def flush(self) -> None:
+        """Sends all buffered records to the stream."""
+        if not self.kinesis:
+            return
+
+        with self.flush_lock:
+            self._send(self._drain())
+
+    def _send(self, records: List[Dict[str, Any]]) -> None:
+        errors = []
+        for request in self._chunk_requests(records):
+            try:
+                self._put_records(request)
+            except KinesisError as e:
+                errors.append(str(e))
+        if errors:
+            raise KinesisError("; ".join(errors))
+
+    def _put_record(self, message: BaseModel, partition_key: str, wait: bool = False) -> None:
+        """Put a message to Kinesis stream"""
         # No-op if no stream name was provided
         if not self.kinesis:
-            self.logger.debug(f"No-op: received record {data} with partition key {partition_key}")
+            self.logger.debug("No-op: received %s record with partition key %s", message.type, partition_key)
             return
-            
+
         try:
-            self.logger.debug(f"Preparing to put record to Kinesis stream: {self.stream_name}")
-            self.logger.debug(f"Partition key: {partition_key}")
-            self.logger.debug(f"Data: {json.dumps(data, cls=DateTimeEncoder)}")
-            
-            response = self.kinesis.put_record(
-                StreamName=self.stream_name,
-                Data=json.dumps(data, cls=DateTimeEncoder),
-                PartitionKey=partition_key
-            )
-            
-            self.logger.info(
-                f"Successfully put record to Kinesis stream: {self.stream_name}. "
-                f"SequenceNumber: {response.get('SequenceNumber')}, "
-                f"ShardId: {response.get('ShardId')}"
-            )
-        except ClientError as e:
-            self.logger.error(f"Failed to put record to Kinesis: {str(e)}", exc_info=True)
+            if wait and self.flush_thread:
+                # Bypass the buffer, so a failure is reported to this caller.
+                entries = self._encode_entries(message)
+                self._send(self._pack_records(partition_key, message.type, entries))
+                return
+
+            self._enqueue(message, partition_key)
+            if not self.flush_thread:
+                self.flush()
+        except KinesisError as e:
+            self.logger.error(f"Failed to put record to Kinesis: {str(e)}")
             raise KinesisError(f"Failed to put record to Kinesis: {str(e)}")
         except Exception as e:
             self.logger.error(f"Unexpected error putting record to Kinesis: {str(e)}", exc_info=True)
@@ -118,19 +406,17 @@ class Kinesis:
         """Put gossip data to Kinesis stream"""
         try:
             self.logger.info("Preparing to put gossip data to Kinesis")
-            self.logger.debug(f"Gossip data: {json.dumps(data.model_dump(by_alias=True), cls=DateTimeEncoder)}")
-            self._put_record(data.model_dump(by_alias=True), 'swarm-gossip')
+            self._put_record(data, 'swarm-gossip')
             self.logger.info("Successfully put gossip data to Kinesis")
         except Exception as e:
             self.logger.error(f"Failed to put gossip data: {str(e)}", exc_info=True)
             raise KinesisError(f"Failed to put gossip data: {str(e)}")
 
-    def put_rewards(self, data: RewardsMessage) -> None:
-        """Put rewards data to Kinesis stream"""
+    def put_rewards(self, data: RewardsMessage, wait: bool = False) -> None:
+        """Put rewards data to Kinesis stream; with wait, return only once it was delivered"""
         try:
             self.logger.info("Preparing to put rewards data to Kinesis")
-            self.logger.debug(f"Rewards data: {json.dumps(data.model_dump(by_alias=True), cls=DateTimeEncoder)}")
-            self._put_record(data.model_dump(by_alias=True), 'swarm-rewards')
+            self._put_record(data, 'swarm-rewards', wait=wait)
             self.logger.info("Successfully put rewards data to Kinesis")
         except Exception as e:
             self.logger.error(f"Failed to put rewards data: {str(e)}", exc_info=True)
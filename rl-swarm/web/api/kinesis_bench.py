@@ -0,0 +1,73 @@
+"""
+Measures the per-batch cost of serializing gossip messages for Kinesis.
+
+Compares the previous path, which dumped each message to JSON three times
+(two debug log lines and the payload), against encoding each entry once and
+assembling records from those bytes.
+
+    python -m web.api.kinesis_bench --entries 200 --iterations 200
+"""
+
+import argparse
+import json
+import timeit
+from datetime import datetime, timezone
+
+from .kinesis import (
+    DateTimeEncoder,
+    GossipMessage,
+    GossipMessageData,
+    Kinesis,
+    orjson,
+)
+
+
+def make_batch(entries):
+    now = datetime.now(timezone.utc)
+    return GossipMessage(
+        data=[
+            GossipMessageData(
+                id=f"{i:032x}",
+                peerId=f"QmPeer{i}",
+                peerName="thorny fishy meerkat",
+                message="The answer is 42. " * 20,
+                timestamp=now,
+            )
+            for i in range(entries)
+        ]
+    )
+
+
+def legacy_serialize(message):
+    json.dumps(message.model_dump(by_alias=True), cls=DateTimeEncoder)  # put_gossip debug
+    data = message.model_dump(by_alias=True)
+    json.dumps(data, cls=DateTimeEncoder)  # _put_record debug
+    return json.dumps(data, cls=DateTimeEncoder).encode()  # payload
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--entries", type=int, default=200)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    message = make_batch(args.entries)
+    candidates = {
+        "legacy (3x json.dumps)": lambda: legacy_serialize(message),
+    }
+    for name, use_orjson in [("pydantic (1x)", False), ("orjson (1x)", True)]:
+        if use_orjson and orjson is None:
+            continue
+        kinesis = Kinesis("", use_orjson=use_orjson)
+        candidates[name] = lambda k=kinesis: k._pack_records(
+            "swarm-gossip", message.type, k._encode_entries(message)
+        )
+
+    print(f"{args.entries} entries per batch, {args.iterations} iterations")
+    for name, fn in candidates.items():
+        per_batch = timeit.timeit(fn, number=args.iterations) / args.iterations
+        print(f"{name:>24}: {per_batch * 1000:.3f} ms/batch")
+
+
+if __name__ == "__main__":
+    main()
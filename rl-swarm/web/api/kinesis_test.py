@@ -2,9 +2,19 @@ import pytest
 from unittest.mock import Mock, patch
 from datetime import datetime, timezone
 import json
-from botocore.exceptions import ClientError
+from botocore.exceptions import ClientError, EndpointConnectionError
 
-from .kinesis import Kinesis, RewardsMessage, RewardsMessageData, GossipMessage, GossipMessageData, KinesisError
+from .kinesis import (
+    MAX_RECORD_BYTES,
+    MAX_RECORDS_PER_REQUEST,
+    MAX_REQUEST_BYTES,
+    Kinesis,
+    RewardsMessage,
+    RewardsMessageData,
+    GossipMessage,
+    GossipMessageData,
+    KinesisError,
+)
 
 # Hardcoded UTC time for testing
 TEST_TIME = datetime(2024, 3, 21, 12, 34, 56, 789000, tzinfo=timezone.utc)
@@ -24,10 +34,13 @@ def mock_kinesis_client():
             }
         }
         
-        # Mock put_record response
-        mock_kinesis.put_record.return_value = {
-            'SequenceNumber': '1234567890',
-            'ShardId': 'shard-000000000001'
+        # Mock put_records response: every record succeeds.
+        mock_kinesis.put_records.side_effect = lambda StreamName, Records: {
+            'FailedRecordCount': 0,
+            'Records': [
+                {'SequenceNumber': '1234567890', 'ShardId': 'shard-000000000001'}
+                for _ in Records
+            ]
         }
         
         # Set the mock client to return our mock kinesis instance
@@ -38,7 +51,26 @@ def mock_kinesis_client():
 @pytest.fixture
 def kinesis_instance(mock_kinesis_client):
     """Create a Kinesis instance with mocked client"""
-    return Kinesis("test-stream")
+    return Kinesis("test-stream", retry_backoff=0)
+
+def make_gossip_message(n, message="Hello world"):
+    return GossipMessage(data=[
+        GossipMessageData(
+            id=f"msg{i}",
+            peerId="peer1",
+            peerName="Peer 1",
+            message=message,
+            timestamp=TEST_TIME
+        )
+        for i in range(n)
+    ])
+
+def sent_records(mock_kinesis_client):
+    return [
+        record
+        for call in mock_kinesis_client.put_records.call_args_list
+        for record in call[1]['Records']
+    ]
 
 def test_kinesis_initialization(mock_kinesis_client):
     """Test Kinesis client initialization"""
@@ -75,14 +107,16 @@ def test_put_rewards(kinesis_instance, mock_kinesis_client):
     kinesis_instance.put_rewards(rewards_message)
     
     # Verify the client was called correctly
-    mock_kinesis_client.put_record.assert_called_once()
-    call_args = mock_kinesis_client.put_record.call_args[1]
+    mock_kinesis_client.put_records.assert_called_once()
+    call_args = mock_kinesis_client.put_records.call_args[1]
     
     assert call_args['StreamName'] == "test-stream"
-    assert call_args['PartitionKey'] == "swarm-rewards"
+    assert len(call_args['Records']) == 1
+    record = call_args['Records'][0]
+    assert record['PartitionKey'] == "swarm-rewards"
     
     # Verify the data was serialized correctly
-    data = json.loads(call_args['Data'])
+    data = json.loads(record['Data'])
     assert data['type'] == "rewards"
     assert len(data['data']) == 1
     assert data['data'][0]['peerId'] == "peer1"
@@ -110,14 +144,16 @@ def test_put_gossip(kinesis_instance, mock_kinesis_client):
     kinesis_instance.put_gossip(gossip_message)
     
     # Verify the client was called correctly
-    mock_kinesis_client.put_record.assert_called_once()
-    call_args = mock_kinesis_client.put_record.call_args[1]
+    mock_kinesis_client.put_records.assert_called_once()
+    call_args = mock_kinesis_client.put_records.call_args[1]
     
     assert call_args['StreamName'] == "test-stream"
-    assert call_args['PartitionKey'] == "swarm-gossip"
+    assert len(call_args['Records']) == 1
+    record = call_args['Records'][0]
+    assert record['PartitionKey'] == "swarm-gossip"
     
     # Verify the data was serialized correctly
-    data = json.loads(call_args['Data'])
+    data = json.loads(record['Data'])
     assert data['type'] == "gossip"
     assert len(data['data']) == 1
     assert data['data'][0]['id'] == "msg1"
@@ -129,9 +165,9 @@ def test_put_gossip(kinesis_instance, mock_kinesis_client):
 def test_put_record_error(kinesis_instance, mock_kinesis_client):
     """Test error handling when putting a record"""
     # Set up the mock to raise an exception
-    mock_kinesis_client.put_record.side_effect = ClientError(
+    mock_kinesis_client.put_records.side_effect = ClientError(
         {'Error': {'Code': 'InternalFailure', 'Message': 'Internal server error'}},
-        'PutRecord'
+        'PutRecords'
     )
     
     # Create test data with hardcoded time
@@ -151,6 +187,165 @@ def test_put_record_error(kinesis_instance, mock_kinesis_client):
     with pytest.raises(KinesisError, match="Failed to put record to Kinesis"):
         kinesis_instance.put_rewards(rewards_message)
 
+    # Initial attempt plus retries, then the records are dropped.
+    assert mock_kinesis_client.put_records.call_count == kinesis_instance.max_retries + 1
+    assert kinesis_instance.get_metrics()["test-stream"]["dropped_records"] == 1
+
+def test_put_records_retries_only_failed_entries(kinesis_instance, mock_kinesis_client):
+    """Test that only entries that failed in a PutRecords response are retried"""
+    responses = [
+        {
+            'FailedRecordCount': 1,
+            'Records': [
+                {'SequenceNumber': '1', 'ShardId': 'shard-1'},
+                {'ErrorCode': 'ProvisionedThroughputExceededException', 'ErrorMessage': 'Slow down'},
+            ]
+        },
+        {
+            'FailedRecordCount': 0,
+            'Records': [{'SequenceNumber': '2', 'ShardId': 'shard-1'}]
+        },
+    ]
+    mock_kinesis_client.put_records.side_effect = lambda StreamName, Records: responses.pop(0)
+
+    # Two messages of one entry each, buffered and then flushed together.
+    kinesis_instance._enqueue(make_gossip_message(1), 'swarm-gossip')
+    kinesis_instance._enqueue(make_gossip_message(2), 'swarm-gossip')
+    kinesis_instance.flush()
+
+    calls = mock_kinesis_client.put_records.call_args_list
+    assert len(calls) == 2
+    assert len(calls[0][1]['Records']) == 2
+    assert calls[1][1]['Records'] == [calls[0][1]['Records'][1]]
+
+    metrics = kinesis_instance.get_metrics()["test-stream"]
+    assert metrics['requests'] == 2
+    assert metrics['records_sent'] == 2
+    assert metrics['failed_records'] == 1
+    assert metrics['retries'] == 1
+
+def test_put_records_retries_connection_errors(kinesis_instance, mock_kinesis_client):
+    """Test that botocore connection failures are retried and counted like other failures"""
+    succeed = mock_kinesis_client.put_records.side_effect
+    outcomes = [EndpointConnectionError(endpoint_url="https://kinesis"), None]
+
+    def put_records(StreamName, Records):
+        if error := outcomes.pop(0):
+            raise error
+        return succeed(StreamName, Records)
+
+    mock_kinesis_client.put_records.side_effect = put_records
+    kinesis_instance._enqueue(make_gossip_message(1), 'swarm-gossip')
+    kinesis_instance.flush()
+
+    metrics = kinesis_instance.get_metrics()["test-stream"]
+    assert metrics['records_sent'] == 1
+    assert metrics['retries'] == 1
+
+    # Every attempt fails: the records are counted as dropped.
+    mock_kinesis_client.put_records.side_effect = EndpointConnectionError(endpoint_url="https://kinesis")
+    kinesis_instance._enqueue(make_gossip_message(1), 'swarm-gossip')
+    with pytest.raises(KinesisError):
+        kinesis_instance.flush()
+    assert kinesis_instance.get_metrics()["test-stream"]["dropped_records"] == 1
+
+def test_put_gossip_splits_oversized_message(kinesis_instance, mock_kinesis_client):
+    """Test that a message larger than the record limit is split into valid records"""
+    # ~1.6MB of gossip in total, each entry well under the limit.
+    kinesis_instance.put_gossip(make_gossip_message(200, message="x" * 8000))
+
+    records = sent_records(mock_kinesis_client)
+    assert len(records) == 2
+    ids = []
+    for record in records:
+        assert len(record['Data']) + len(record['PartitionKey']) <= MAX_RECORD_BYTES
+        data = json.loads(record['Data'])
+        assert data['type'] == "gossip"
+        ids.extend(entry['id'] for entry in data['data'])
+    assert ids == [f"msg{i}" for i in range(200)]
+
+def test_put_records_respects_request_limits(kinesis_instance, mock_kinesis_client):
+    """Test that buffered records are chunked by count and total size"""
+    for _ in range(MAX_RECORDS_PER_REQUEST + 10):
+        kinesis_instance._enqueue(make_gossip_message(1), 'swarm-gossip')
+    kinesis_instance.flush()
+
+    calls = mock_kinesis_client.put_records.call_args_list
+    assert [len(call[1]['Records']) for call in calls] == [MAX_RECORDS_PER_REQUEST, 10]
+
+    # Records near the size limit are split across requests by bytes.
+    mock_kinesis_client.put_records.reset_mock()
+    for _ in range(6):
+        kinesis_instance._enqueue(
+            make_gossip_message(1, message="x" * (MAX_RECORD_BYTES - 1000)),
+            'swarm-gossip'
+        )
+    kinesis_instance.flush()
+
+    for call in mock_kinesis_client.put_records.call_args_list:
+        assert sum(len(r['Data']) + len(r['PartitionKey']) for r in call[1]['Records']) <= MAX_REQUEST_BYTES
+    assert len(sent_records(mock_kinesis_client)) == 6
+
+def test_put_records_aggregation(mock_kinesis_client):
+    """Test that small messages of the same type are aggregated into one record"""
+    kinesis = Kinesis("test-stream", aggregate=True, retry_backoff=0)
+    for i in range(3):
+        kinesis._enqueue(make_gossip_message(i + 1), 'swarm-gossip')
+    kinesis.flush()
+
+    records = sent_records(mock_kinesis_client)
+    assert len(records) == 1
+    assert len(json.loads(records[0]['Data'])['data']) == 6
+
+def test_background_flush(mock_kinesis_client):
+    """Test that puts are non-blocking with a flush interval and flushed on close"""
+    kinesis = Kinesis("test-stream", flush_interval=60, retry_backoff=0)
+    kinesis.put_gossip(make_gossip_message(1))
+    kinesis.put_gossip(make_gossip_message(1))
+    mock_kinesis_client.put_records.assert_not_called()
+
+    kinesis.close()
+    assert len(sent_records(mock_kinesis_client)) == 2
+
+def test_put_rewards_wait_bypasses_background_flush(mock_kinesis_client):
+    """Test that a waited put is sent immediately and reports delivery failures"""
+    kinesis = Kinesis("test-stream", flush_interval=60, retry_backoff=0)
+    rewards_message = RewardsMessage(data=[
+        RewardsMessageData(
+            peerId="peer1", peerName="Peer 1", amount=1.0, round=1, stage=0, timestamp=TEST_TIME
+        )
+    ])
+
+    kinesis.put_rewards(rewards_message, wait=True)
+    assert len(sent_records(mock_kinesis_client)) == 1
+
+    mock_kinesis_client.put_records.side_effect = ClientError(
+        {'Error': {'Code': 'InternalFailure', 'Message': 'Internal server error'}},
+        'PutRecords'
+    )
+    with pytest.raises(KinesisError):
+        kinesis.put_rewards(rewards_message, wait=True)
+    kinesis.close()
+
+def test_put_records_against_moto(monkeypatch):
+    """Test the producer end to end against a local moto Kinesis"""
+    moto = pytest.importorskip("moto")
+    import boto3
+
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+
+    with moto.mock_aws():
+        boto3.client('kinesis', region_name='us-west-2').create_stream(
+            StreamName='test-stream', ShardCount=1
+        )
+        kinesis = Kinesis("test-stream", retry_backoff=0)
+        kinesis.put_gossip(make_gossip_message(3))
+
+        metrics = kinesis.get_metrics()["test-stream"]
+        assert metrics['records_sent'] == 1
+        assert metrics['failed_records'] == 0
+
 def test_kinesis_no_op_initialization():
     """Test Kinesis client initialization with no stream name (no-op mode)"""
     kinesis = Kinesis("")
@@ -179,7 +374,7 @@ def test_kinesis_no_op_put_rewards(kinesis_instance, mock_kinesis_client):
     no_op_kinesis.put_rewards(rewards_message)
     
     # Verify the client was not called
-    mock_kinesis_client.put_record.assert_not_called()
+    mock_kinesis_client.put_records.assert_not_called()
 
 def test_kinesis_no_op_put_gossip(kinesis_instance, mock_kinesis_client):
     """Test putting gossip data in no-op mode"""
@@ -202,4 +397,15 @@ def test_kinesis_no_op_put_gossip(kinesis_instance, mock_kinesis_client):
     no_op_kinesis.put_gossip(gossip_message)
     
     # Verify the client was not called
-    mock_kinesis_client.put_record.assert_not_called()
+    mock_kinesis_client.put_records.assert_not_called()
+
+def test_orjson_encoding_matches_pydantic(kinesis_instance):
+    """Test that the orjson encoder produces the same entries and timestamp format"""
+    pytest.importorskip("orjson")
+    orjson_kinesis = Kinesis("", use_orjson=True)
+    message = make_gossip_message(3)
+
+    default_entries = [json.loads(e) for e in kinesis_instance._encode_entries(message)]
+    orjson_entries = [json.loads(e) for e in orjson_kinesis._encode_entries(message)]
+    assert orjson_entries == default_entries
+    assert orjson_entries[0]['timestamp'] == "2024-03-21T12:34:56.789000Z"
@@ -1,15 +1,13 @@
 import argparse
 import logging
 import os
-import time
 from datetime import datetime, timedelta
-from threading import Thread
 
 import aiofiles
 from hivemind_exp.chain_utils import ModalSwarmCoordinator, setup_web3
 import httpx
 import uvicorn
-from fastapi import FastAPI, HTTPException, Request, Response, Query
+from fastapi import Depends, FastAPI, HTTPException, Request, Response, Query
 from fastapi.responses import HTMLResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
 import json
@@ -20,6 +18,7 @@ from hivemind_exp.name_utils import *
 from . import global_dht
 from .kinesis import Kinesis
 from .dht_pub import RewardsDHTPublisher, GossipDHTPublisher
+from .dht_snapshot import DHTPoller
 
 # UI is served from the filesystem
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -102,58 +101,76 @@ def get_round_and_stage():
     }
 
 
-@app.get("/api/leaderboard")
-def get_leaderboard():
-    leaderboard = global_dht.dht_cache.get_leaderboard()
-    res = dict(leaderboard)
+# Upper bound for the limit query parameter of paginated endpoints.
+MAX_PAGE_SIZE = 1000
+
+
+def leaderboard_page_params(
+    offset: int = Query(0, ge=0),
+    limit: int | None = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    around: str | None = Query(None),
+    min_score: float | None = Query(None),
+):
+    return {
+        "offset": offset,
+        "limit": limit,
+        "around": around,
+        "min_score": min_score,
+    }
 
-    if res is not None:
-        return {
-            "leaders": res.get("leaders", []),
-            "total": res.get("total", 0),
-        }
+
+@app.get("/api/leaderboard")
+def get_leaderboard(page: dict = Depends(leaderboard_page_params)):
+    leaders, total, offset = global_dht.dht_cache.get_leaderboard_page(**page)
+    return {
+        "leaders": leaders,
+        "total": total,
+        "offset": offset,
+    }
 
 
 @app.get("/api/leaderboard-cumulative")
-def get_leaderboard_cumulative():
-    leaderboard = global_dht.dht_cache.get_leaderboard_cumulative()
-    res = dict(leaderboard)
-
-    if res is not None:
-        return {
-            "leaders": res.get("leaders", []),
-            "total": res.get("total", 0),
-        }
-    else:
-        return {
-            "leaders": [],
-            "total": 0,
-        }
+def get_leaderboard_cumulative(page: dict = Depends(leaderboard_page_params)):
+    leaders, total, offset = global_dht.dht_cache.get_leaderboard_page(
+        cumulative=True, **page
+    )
+    return {
+        "leaders": leaders,
+        "total": total,
+        "offset": offset,
+    }
 
 
 @app.get("/api/rewards-history")
-def get_rewards_history():
-    leaderboard = global_dht.dht_cache.get_leaderboard()
-    res = dict(leaderboard)
+def get_rewards_history(page: dict = Depends(leaderboard_page_params)):
+    history, total, offset = global_dht.dht_cache.get_rewards_history_page(**page)
+    return {
+        "leaders": history,
+        "total": total,
+        "offset": offset,
+    }
+
 
-    if res is not None:
-        return {
-            "leaders": res.get("rewardsHistory", []),
-        }
+@app.get("/api/rewards-history/{peer_id}")
+def get_peer_rewards_history(peer_id: str):
+    history = global_dht.dht_cache.get_peer_history(peer_id)
+    if history is None:
+        raise HTTPException(status_code=404, detail="peer not found")
+
+    return history
 
 
 @app.get("/api/name-to-id")
 def get_id_from_name(name: str = Query("")):
-	leaderboard = global_dht.dht_cache.get_leaderboard()
-	leader_ids = [leader["id"] for leader in leaderboard["leaders"]] or []
+    # Generated names can collide; ids lists every match, oldest first.
+    peer_ids = global_dht.dht_cache.get_peer_ids_for_name(name)
+    return {
+        "id": peer_ids[0] if peer_ids else None,
+        "ids": peer_ids,
+    }
 
-	peer_id = search_peer_ids_for_name(leader_ids, name)
-	return {
-		"id": peer_id,
-	}
 
-@app.post("/api/id-to-name")
-async def id_to_name(request: Request):
+async def read_json_list(request: Request, item_name: str, max_items=1000):
     # Check request body size (100KB limit)
     content_length = request.headers.get("content-length")
     if content_length and int(content_length) > 100 * 1024:  # 100KB in bytes
@@ -168,7 +185,7 @@ async def id_to_name(request: Request):
         if not isinstance(body, list):
             raise HTTPException(
                 status_code=400,
-                detail="Request body must be a list of peer IDs"
+                detail=f"Request body must be a list of {item_name}s"
             )
     except json.JSONDecodeError as e:
         raise HTTPException(
@@ -182,23 +199,34 @@ async def id_to_name(request: Request):
         )
 
     # Validate input size
-    if len(body) > 1000:  # Limit number of IDs that can be processed
+    if len(body) > max_items:  # Limit number of items that can be processed
         raise HTTPException(
             status_code=400,
-            detail="Too many peer IDs. Maximum is 1000."
+            detail=f"Too many {item_name}s. Maximum is {max_items}."
         )
 
-    # Process each ID
-    id_to_name_map = {}
+    return body
+
+
+@app.post("/api/names-to-ids")
+async def names_to_ids(request: Request):
+    body = await read_json_list(request, "name")
+    names = [name for name in body if isinstance(name, str)]
+    return global_dht.dht_cache.get_peer_ids_for_names(names)
+
+
+@app.post("/api/id-to-name")
+async def id_to_name(request: Request):
+    body = await read_json_list(request, "peer ID")
+
+    peer_ids = []
     for peer_id in body:
-        try:
-            name = get_name_from_peer_id(peer_id)
-            if name is not None:
-                id_to_name_map[peer_id] = name
-        except Exception as e:
-            logger.error(f"Error looking up name for peer ID {peer_id}: {str(e)}")
+        if isinstance(peer_id, str):
+            peer_ids.append(peer_id)
+        else:
+            logger.error(f"Error looking up name for peer ID {peer_id}: not a string")
 
-    return id_to_name_map
+    return dict(zip(peer_ids, get_names_from_peer_ids(peer_ids)))
 
 @app.get("/api/gossip")
 def get_gossip():
@@ -263,18 +291,6 @@ def parse_arguments():
     return parser.parse_args()
 
 
-def populate_cache():
-    logger.info("populate_cache initialized")
-    try:
-        while True:
-            logger.info("pulling latest dht data...")
-            global_dht.dht_cache.poll_dht()
-            time.sleep(10)
-            logger.info("dht polled")
-    except Exception as e:
-        logger.error("uncaught exception while polling dht", e)
-
-
 def main(args):
     coordinator = ModalSwarmCoordinator("", web3=setup_web3()) # Only allows contract calls
     initial_peers = coordinator.get_bootnodes()
@@ -283,23 +299,32 @@ def main(args):
     logger.info(f"initializing DHT with peers {initial_peers}")
 
     kinesis_stream = os.getenv("KINESIS_STREAM", "")
-    kinesis_client = Kinesis(kinesis_stream)
+    kinesis_client = Kinesis(
+        kinesis_stream,
+        endpoint_url=os.getenv("KINESIS_ENDPOINT_URL") or None,
+        # Batch records across polls; publishers only enqueue.
+        flush_interval=float(os.getenv("KINESIS_FLUSH_INTERVAL", "5")),
+        aggregate=os.getenv("KINESIS_AGGREGATE", "") == "1",
+    )
 
     global_dht.setup_global_dht(initial_peers, coordinator, logger, kinesis_client)
 
-    thread = Thread(target=populate_cache)
-    thread.daemon = True
-    thread.start()
+    # A single poller reads the coordinator and DHT once per cycle and shares
+    # the snapshot with the cache and the Kinesis publishers. The publishers
+    # run in the background, so Kinesis latency never delays a cache refresh.
+    poller = DHTPoller(global_dht.dht, coordinator, logger, poll_interval_seconds=10)
+    poller.subscribe(global_dht.dht_cache.on_snapshot)
 
-    # Start publishing to kinesis. This will eventually replace the populate_cache thread.
     logger.info("Starting rewards publisher")
     rewards_publisher = RewardsDHTPublisher(
         dht=global_dht.dht,
         kinesis_client=kinesis_client,
         logger=logger,
-        poll_interval_seconds=300,  # 5 minute
+        poll_interval_seconds=60,  # Only changed rewards are published.
+        coordinator=coordinator,
+        state_path=os.getenv("REWARDS_PUBLISHER_STATE", "rewards_publisher_state.json"),
     )
-    rewards_publisher.start()
+    poller.subscribe(rewards_publisher.on_snapshot, background=True)
 
     logger.info("Starting gossip publisher")
     gossip_publisher = GossipDHTPublisher(
@@ -307,8 +332,11 @@ def main(args):
         kinesis_client=kinesis_client,
         logger=logger,
         poll_interval_seconds=150,  # 2.5 minute
+        coordinator=coordinator,
     )
-    gossip_publisher.start()
+    poller.subscribe(gossip_publisher.on_snapshot, background=True)
+
+    poller.start()
 
     logger.info(f"initializing server on port {port}")
     server.run()
@@ -1,16 +1,79 @@
-from collections import defaultdict
-import hashlib
+import bisect
 import itertools
 from datetime import datetime, timezone
-import random
 import os
 from .gossip_utils import *
 
 from hivemind_exp.dht_utils import *
-from hivemind_exp.name_utils import get_name_from_peer_id
-from .gossip_utils import stage1_message, stage2_message, stage3_message
+from hivemind_exp.name_utils import (
+    PeerNameIndex,
+    get_name_from_peer_id,
+    get_names_from_peer_ids,
+)
+from .dht_snapshot import DHTSnapshot, previous_round_and_stage
 from .kinesis import GossipMessage, GossipMessageData, RewardsMessage, RewardsMessageData
 
+# Number of entries returned around a peer when no limit is given.
+DEFAULT_AROUND_WINDOW = 10
+
+# Rounds of rewards keys scanned for peer names on the first poll.
+NAME_INDEX_BACKFILL_ROUNDS = 3
+
+
+def build_rank_index(leaders, score_key):
+    """
+    Builds a rank index over a leaderboard that is already sorted by descending score.
+
+    Args:
+        leaders: Sorted list of leaderboard entries
+        score_key: Name of the entry field holding the score
+
+    Returns:
+        A dict with the rank of every peer ID and the negated scores in rank order,
+        so score thresholds can be resolved with a binary search.
+    """
+    return {
+        "ranks": {leader["id"]: rank for rank, leader in enumerate(leaders)},
+        "neg_scores": [-float(leader[score_key]) for leader in leaders],
+    }
+
+
+def select_leaders(leaders, index, offset=0, limit=None, around=None, min_score=None):
+    """
+    Selects a page of a ranked leaderboard using its rank index.
+
+    Args:
+        leaders: Sorted list of leaderboard entries
+        index: Rank index built by build_rank_index for the same list
+        offset: Rank of the first returned entry; ignored when around is set
+        limit: Maximum number of returned entries; None returns the rest of the list
+        around: Peer ID to center the page on
+        min_score: Only entries scoring at least this much are returned
+
+    Returns:
+        A tuple of (page, total, offset), where total is the number of entries
+        passing the score filter and offset is the rank of the first page entry.
+    """
+    total = len(leaders)
+    if min_score is not None:
+        total = bisect.bisect_right(index["neg_scores"], -float(min_score))
+
+    if around is not None:
+        rank = index["ranks"].get(around)
+        if rank is None or rank >= total:
+            return [], total, 0
+
+        if limit is None:
+            limit = DEFAULT_AROUND_WINDOW
+        offset = max(0, min(rank - limit // 2, total - limit))
+
+    end = total if limit is None else min(total, offset + limit)
+    page = [
+        dict(leader, rank=rank)
+        for rank, leader in enumerate(leaders[offset:end], start=offset)
+    ]
+    return page, total, offset
+
 
 class Cache:
     def __init__(self, dht, coordinator, manager, logger, kinesis_client):
@@ -27,9 +90,17 @@ class Cache:
         self.leaderboard = self.manager.dict()
         self.leaderboard_v2 = self.manager.dict() # Cumulative rewards leaderboard.
 
+        # Rank indices over the leaderboards; rebuilt by the poller.
+        self.leaderboard_index = build_rank_index([], "score")
+        self.leaderboard_v2_index = build_rank_index([], "cumulativeScore")
+
         self.rewards_history = self.manager.dict()
         self.gossips = self.manager.dict()
 
+        # Name -> peer IDs for every peer seen in rewards keys.
+        self.name_index = PeerNameIndex()
+        self.name_index_backfilled = False
+
         self.current_round = self.manager.Value("i", -1)
         self.current_stage = self.manager.Value("i", -1)
 
@@ -44,63 +115,129 @@ class Cache:
     def get_leaderboard_cumulative(self):
         return dict(self.leaderboard_v2)
 
+    def get_leaderboard_page(self, cumulative=False, **kwargs):
+        """Returns a page of the (cumulative) leaderboard; see select_leaders for kwargs."""
+        with self.lock:
+            if cumulative:
+                leaderboard, index = self.leaderboard_v2, self.leaderboard_v2_index
+            else:
+                leaderboard, index = self.leaderboard, self.leaderboard_index
+
+        return select_leaders(leaderboard.get("leaders", []), index, **kwargs)
+
+    def get_rewards_history_page(self, **kwargs):
+        """Returns the rewards history of the peers on a page of the leaderboard."""
+        with self.lock:
+            leaderboard, index = self.leaderboard, self.leaderboard_index
+
+        leaders, total, offset = select_leaders(
+            leaderboard.get("leaders", []), index, **kwargs
+        )
+        # History entries are stored in the same order as the leaders.
+        history = leaderboard.get("rewardsHistory", [])[offset : offset + len(leaders)]
+        return history, total, offset
+
+    def get_peer_history(self, peer_id):
+        """Returns the rewards and cumulative score history of a single peer, if known."""
+        with self.lock:
+            values = self.rewards_history.get(peer_id)
+            rank = self.leaderboard_v2_index["ranks"].get(peer_id)
+            entry = None
+            if rank is not None:
+                entry = self.leaderboard_v2["leaders"][rank]
+
+        if values is None and entry is None:
+            return None
+
+        return {
+            "id": peer_id,
+            "nickname": get_name_from_peer_id(peer_id),
+            "values": values or [],
+            "cumulativeValues": entry["scoreHistory"] if entry else [],
+        }
+
     def get_gossips(self, since_round=0):
         return dict(self.gossips)
 
     def get_last_polled(self):
         return self.last_polled
 
-    def poll_dht(self):
-        try:
-            self._get_round_and_stage()
-            self._get_leaderboard()
-            self._get_leaderboard_v2()
-            self._get_gossip()
+    def get_peer_ids_for_name(self, name):
+        return self.name_index.lookup(name)
 
-            with self.lock:
-                self.last_polled = datetime.now()
-        except Exception as e:
-            self.logger.error("cache failed to poll dht: %s", e)
-
-    def _get_dht_value(self, beam_size=100, **kwargs):
-        return get_dht_value(self.dht, beam_size=beam_size, **kwargs)
+    def get_peer_ids_for_names(self, names):
+        return self.name_index.lookup_many(names)
 
-    def _get_round_and_stage(self):
+    def poll_dht(self):
+        """Polls the coordinator and DHT directly, outside of a shared DHTPoller."""
         try:
             r, s = self.coordinator.get_round_and_stage()
-            self.logger.info(f"cache polled round and stage: r={r}, s={s}")
-            with self.lock:
-                self.current_round.value = r
-                self.current_stage.value = s
         except ValueError as e:
             self.logger.warning(
                 "could not get current round or stage; default to -1: %s", e
             )
+            r, s = self.current_round.value, self.current_stage.value
 
-    def _previous_round_and_stage(self):
-        r = self.current_round.value
-        s = self.current_stage.value
+        self.on_snapshot(DHTSnapshot.for_dht(self.dht, r, s, logger=self.logger))
 
-        s -= 1
-        if s < 0:
-            s = 2
-            r -= 1
+    def on_snapshot(self, snapshot: DHTSnapshot):
+        try:
+            self._get_round_and_stage(snapshot)
+            self._backfill_name_index(snapshot)
+            self._get_leaderboard(snapshot)
+            self._get_leaderboard_v2(snapshot)
+            self._get_gossip(snapshot)
 
-        return max(0, r), max(0, s)
+            with self.lock:
+                self.last_polled = datetime.now()
+        except Exception as e:
+            self.logger.error("cache failed to poll dht: %s", e)
 
-    def _current_rewards(self) -> dict[str, Any] | None:
+    def _get_round_and_stage(self, snapshot):
+        r, s = snapshot.round, snapshot.stage
+        self.logger.info(f"cache polled round and stage: r={r}, s={s}")
+        with self.lock:
+            self.current_round.value = r
+            self.current_stage.value = s
+
+    def _previous_round_and_stage(self):
+        return previous_round_and_stage(
+            self.current_round.value, self.current_stage.value
+        )
+
+    def _get_rewards(self, snapshot, round_num, stage) -> dict[str, Any] | None:
+        rewards = snapshot.rewards(round_num, stage)
+        if rewards:
+            self.name_index.add(rewards.keys())
+        return rewards
+
+    def _current_rewards(self, snapshot) -> dict[str, Any] | None:
         # Basically a proxy for the reachable peer group.
-        curr_round = self.current_round.value
-        curr_stage = self.current_stage.value
-        return self._get_dht_value(key=rewards_key(curr_round, curr_stage))
+        return self._get_rewards(snapshot, snapshot.round, snapshot.stage)
+
+    def _previous_rewards(self, snapshot):
+        return self._get_rewards(snapshot, *previous_round_and_stage(snapshot.round, snapshot.stage))
+
+    def _backfill_name_index(self, snapshot):
+        # Index peers from recent rounds that may have left the leaderboard.
+        if self.name_index_backfilled or snapshot.round < 0:
+            return
 
-    def _previous_rewards(self):
-        return self._get_dht_value(key=rewards_key(*self._previous_round_and_stage()))
+        curr_round = snapshot.round
+        start_round = max(0, curr_round - NAME_INDEX_BACKFILL_ROUNDS)
+        for r, s in itertools.product(range(start_round, curr_round + 1), range(3)):
+            try:
+                self._get_rewards(snapshot, r, s)
+            except Exception as e:
+                self.logger.warning("could not index peer names for r=%d s=%d: %s", r, s, e)
 
+        self.name_index_backfilled = True
+        self.logger.info("indexed %d peer names", len(self.name_index))
 
-    def _get_leaderboard_v2(self):
+
+    def _get_leaderboard_v2(self, snapshot):
         try:
-            rewards = self._current_rewards()
+            rewards = self._current_rewards(snapshot)
             if not rewards:
                 return None
 
@@ -117,12 +254,14 @@ class Cache:
 
                 # Process each peer's rewards
                 current_time = int(datetime.now().timestamp())
+                new_peer_ids = [p for p in rewards if p not in existing_entries]
+                nicknames = dict(zip(new_peer_ids, get_names_from_peer_ids(new_peer_ids)))
                 for peer_id, score in rewards.items():
                     if peer_id not in existing_entries:
                         # First time seeing this peer
                         existing_entries[peer_id] = {
                             "id": peer_id,
-                            "nickname": get_name_from_peer_id(peer_id),
+                            "nickname": nicknames[peer_id],
                             "recordedRound": curr_round,
                             "recordedStage": curr_stage,
                             "cumulativeScore": float(score),  # Initial score
@@ -170,6 +309,9 @@ class Cache:
                     "leaders": sorted_leaders,
                     "total": len(sorted_leaders)
                 }
+                self.leaderboard_v2_index = build_rank_index(
+                    sorted_leaders, "cumulativeScore"
+                )
 
                 # Convert to RewardsMessage format and send to Kinesis
                 # self._send_rewards_to_kinesis(sorted_leaders, curr_round, curr_stage)
@@ -231,9 +373,9 @@ class Cache:
             self.logger.error(f"!!! Failed to send gossip to Kinesis: {e}")
                 
 
-    def _get_leaderboard(self):
+    def _get_leaderboard(self, snapshot):
         try:
-            if rewards := self._current_rewards():
+            if rewards := self._current_rewards(snapshot):
                 # Sorted list of (node_key, reward) pairs.
                 raw = list(
                     sorted(rewards.items(), key=lambda t: (t[1], t[0]), reverse=True)
@@ -242,14 +384,15 @@ class Cache:
                 raw = []
 
             # Create entries for all participants
+            nicknames = get_names_from_peer_ids([t[0] for t in raw])
             all_entries = [
                 {
                     "id": str(t[0]),
-                    "nickname": get_name_from_peer_id(t[0]),
+                    "nickname": nickname,
                     "score": t[1],
                     "values": [],
                 }
-                for t in raw
+                for t, nickname in zip(raw, nicknames)
             ]
             self.logger.info(">>> lb_entries length: %d", len(all_entries))
 
@@ -288,86 +431,16 @@ class Cache:
                     "total": len(raw),
                     "rewardsHistory": current_history,
                 }
+                self.leaderboard_index = build_rank_index(all_entries, "score")
         except Exception as e:
             self.logger.warning("could not get leaderboard data: %s", e)
 
-    def _get_gossip(self):
-        MESSAGE_TARGET = 200
-        NODE_TARGET = 20
-        STAGE_MESSAGE_FNS = [stage1_message, stage2_message, stage3_message]
-
-        round_gossip = []
-        start_time = datetime.now()
+    def _get_gossip(self, snapshot):
         try:
-            curr_round = self.current_round.value
-            curr_stage = self.current_stage.value
-            rewards = self._current_rewards()
-            if not rewards:
-                raise ValueError("missing rewards")
-
-            all_nodes = rewards.keys()
-            nodes = random.sample(
-                list(all_nodes), min(NODE_TARGET, len(all_nodes))
-            )  # Sample uniformly
-            node_gossip_count = defaultdict(int)
-            node_gossip_limit = max(1, MESSAGE_TARGET / len(nodes))
-
-            start_round = max(0, curr_round - 3)
-            for r, s, node_key in itertools.product(
-                reversed(range(start_round, curr_round + 1)),  # Most recent first
-                reversed(range(0, 3)),
-                nodes,
-            ):
-                # Check if we've exceeded 10 seconds
-                # Adding this as a stop gap to make sure the gossip collection doesn't stop other data from being polled.
-                if (datetime.now() - start_time).total_seconds() > 10:
-                    self.logger.warning(">>> gossip collection timed out after 10s")
-                    break
-
-                if r == curr_round and s > curr_stage:
-                    continue
-
-                if node_gossip_count[node_key] > node_gossip_limit:
-                    break
-
-                if outputs := self._get_dht_value(key=outputs_key(node_key, r, s)):
-                    sorted_outputs = sorted(
-                        list(outputs.items()), key=lambda t: t[1][0]
-                    )
-                    for question, (ts, outputs) in sorted_outputs:
-                        gossip_id = hashlib.md5(
-                            f"{node_key}_{r}_{s}_{question}".encode()
-                        ).hexdigest()
-                        if s < len(STAGE_MESSAGE_FNS):
-                            message = STAGE_MESSAGE_FNS[s](
-                                node_key, question, ts, outputs
-                            )
-                        else:
-                            message = f"Cannot render output for unknown stage {s}"
-                        round_gossip.append(
-                            (
-                                ts,
-                                {
-                                    "id": gossip_id,
-                                    "message": message,
-                                    "node": get_name_from_peer_id(node_key),
-                                    "nodeId": node_key,
-                                },
-                            )
-                        )
-                        node_gossip_count[node_key] += 1
-                        if node_gossip_count[node_key] > node_gossip_limit:
-                            break
-
+            round_gossip = snapshot.gossip()
         except Exception as e:
             self.logger.warning("could not get gossip: %s", e)
-        finally:
-            elapsed = (datetime.now() - start_time).total_seconds()
-            self.logger.info(
-                ">>> completed gossip with %d messages in %.2fs",
-                len(round_gossip),
-                elapsed,
-            )
+            round_gossip = []
 
         # self._send_gossip_to_kinesis(round_gossip)
 
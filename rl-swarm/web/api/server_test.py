@@ -115,6 +115,76 @@ class TestServer(unittest.TestCase):
             },
         )
 
+    def test_get_leaderboard_paged(self):
+        scores = {f"node_{i}": float(i) for i in range(10)}
+        for n, score in scores.items():
+            self.dht.store(
+                key=rewards_key(3, 0),
+                subkey=n,
+                value=score,
+                expiration_time=get_dht_time() + 5,
+            )
+        self.dht_cache.poll_dht()
+
+        response = self.client.get("/api/leaderboard?offset=2&limit=3")
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body["total"], 10)
+        self.assertEqual(body["offset"], 2)
+        self.assertEqual(
+            [(l["id"], l["rank"]) for l in body["leaders"]],
+            [("node_7", 2), ("node_6", 3), ("node_5", 4)],
+        )
+
+        response = self.client.get("/api/leaderboard?around=node_0&limit=4")
+        body = response.json()
+        self.assertEqual(body["offset"], 6)
+        self.assertEqual(
+            [l["id"] for l in body["leaders"]],
+            ["node_3", "node_2", "node_1", "node_0"],
+        )
+
+        response = self.client.get("/api/leaderboard-cumulative?min_score=7")
+        body = response.json()
+        self.assertEqual(body["total"], 3)
+        self.assertEqual(
+            [l["id"] for l in body["leaders"]], ["node_9", "node_8", "node_7"]
+        )
+
+        response = self.client.get("/api/rewards-history?limit=2")
+        self.assertEqual(
+            [h["id"] for h in response.json()["leaders"]], ["node_9", "node_8"]
+        )
+
+        response = self.client.get("/api/rewards-history/node_4")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["values"][-1]["y"], 4.0)
+
+        response = self.client.get("/api/rewards-history/unknown")
+        self.assertEqual(response.status_code, 404)
+
+    def test_name_to_id(self):
+        # Only seen in an older round; found through the backfilled index.
+        self.dht.store(
+            key=rewards_key(1, 2),
+            subkey="node_1",
+            value=1.0,
+            expiration_time=get_dht_time() + 5,
+        )
+        self.dht_cache.poll_dht()
+
+        response = self.client.get("/api/name-to-id?name=deadly energetic raven")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"id": "node_1", "ids": ["node_1"]})
+
+        response = self.client.post(
+            "/api/names-to-ids", json=["deadly energetic raven", "unknown"]
+        )
+        self.assertEqual(
+            response.json(),
+            {"deadly energetic raven": ["node_1"], "unknown": []},
+        )
+
 
 if __name__ == "__main__":
     unittest.main()